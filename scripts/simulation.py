@@ -29,9 +29,10 @@
 ## \todo make it more general with respects to objects and robot
 
 import time, sys, os, argparse, rospy, traceback
+import numpy as np
 import agimus_hpp.ros_tools as ros_tools
 from std_msgs.msg import String
-from std_srvs.srv import Empty
+from std_srvs.srv import Empty, Trigger, TriggerResponse
 from geometry_msgs.msg import TransformStamped
 from dynamic_graph_bridge_msgs.msg import Vector
 import tf2_ros
@@ -71,16 +72,22 @@ class PublishObjectPose (object):
     ## Constructor
     #  \param parent name of parent frame,
     #  \param child name of child frame
-    def __init__ (self, parent, child):
-        self.broadcaster = tf2_ros.TransformBroadcaster()
+    #  \param broadcaster a tf2_ros.TransformBroadcaster. If None, a new one
+    #         is created.
+    def __init__ (self, parent, child, broadcaster = None):
+        if broadcaster is None:
+            broadcaster = tf2_ros.TransformBroadcaster()
+        self.broadcaster = broadcaster
         self.ts = TransformStamped()
         self.ts.header.frame_id = parent
         self.ts.child_frame_id = child
 
-    ## publish pose between parent and child frames
+    ## Set the pose between parent and child frames
     #  \param q pose as a 7 dimensional vector (x,y,z,X,Y,Z,W)
-    def broadcast (self, q):
-        self.ts.header.stamp = rospy.Time.now()
+    #  \param stamp the time stamp of the transform
+    #  \return the TransformStamped message.
+    def transform (self, q, stamp):
+        self.ts.header.stamp = stamp
         self.ts.transform.translation.x = q[0]
         self.ts.transform.translation.y = q[1]
         self.ts.transform.translation.z = q[2]
@@ -88,7 +95,12 @@ class PublishObjectPose (object):
         self.ts.transform.rotation.y = q[4]
         self.ts.transform.rotation.z = q[5]
         self.ts.transform.rotation.w = q[6]
-        res = self.broadcaster.sendTransform (self.ts)
+        return self.ts
+
+    ## publish pose between parent and child frames
+    #  \param q pose as a 7 dimensional vector (x,y,z,X,Y,Z,W)
+    def broadcast (self, q):
+        res = self.broadcaster.sendTransform (self.transform (q, rospy.Time.now()))
 
 ## Create dictionary mapping transition names to id's in hpp_idl graph
 def createGraphDict (client):
@@ -130,12 +142,15 @@ class Simulation (object):
         self.objects = { j.split('/',1)[0] for j in joints }
         self.objects.remove (self.robotName)
         self.objectPose = {}
+        # Ranks of the configuration of the objects
+        self.objectIndices = []
         # Compute objects position
         for jn in joints:
             obj = jn.split('/',1)[0]
             if obj in self.objects:
                 iq = self.rankInConfiguration[jn]
                 nq = hpp.robot.getJointConfigSize(jn)
+                self.objectIndices.extend (range(iq,iq+nq))
                 if obj not in self.objectPose:
                     self.objectPose[obj] = qinit[iq:iq+nq]
                 else:
@@ -150,7 +165,8 @@ class Simulation (object):
         # Assert that first joint name ends by "root_joint"
         assert self.sot_joint_names[0].endswith("root_joint")
 
-        self.sot2hpp_slices = []
+        sot2hpp_src = []
+        sot2hpp_dst = []
         hpp = self.client.hpp()
         # Special case for the root joint
         rjt = hpp.robot.getJointType(self.robotName + "/root_joint")
@@ -170,16 +186,40 @@ class Simulation (object):
             else:
                 hrk = self.rankInConfiguration[hj]
                 hsz = hpp.robot.getJointConfigSize(hj)
-                hslice = slice(hrk,hrk+hsz)
-                sslice = slice(srk,srk+hsz)
-                self.sot2hpp_slices.append ((sslice, hslice))
+                sot2hpp_src.extend (range(srk,srk+hsz))
+                sot2hpp_dst.extend (range(hrk,hrk+hsz))
                 srk += hsz
+        # The conversion is a single gather: q[sot2hpp_dst] = data[sot2hpp_src]
+        self.sot2hpp_src = np.array (sot2hpp_src, dtype=int)
+        self.sot2hpp_dst = np.array (sot2hpp_dst, dtype=int)
+        self.sot2hpp_buffer = np.zeros (len(sot2hpp_src))
 
     def __init__ (self):
-        from threading import Lock
+        from threading import Lock, Condition, Thread
         # Client to HPP
         self.client = HppClient (context = "simulation")
         self.mutex = Lock()
+        # Maximal rate of the projections, in Hz. 0 means no limit.
+        rate = rospy.get_param ("~projection_rate", 0.)
+        self.projectionPeriod = 1. / rate if rate > 0 else 0.
+        # Whether the configuration should be projected. Protected by
+        # projectionCondition, as well as projectionMetrics.
+        self.projectionRequested = False
+        self.projectionCondition = Condition (Lock())
+        self.projectionMetrics = {
+                "projections": 0,
+                "failures": 0,
+                # requests replaced by a later one before being processed.
+                "dropped": 0,
+                # results discarded because the transition changed meanwhile.
+                "stale": 0,
+                "latency_last": 0.,
+                "latency_max": 0.,
+                "latency_total": 0.,
+                "lock_waits": 0,
+                "lock_wait_max": 0.,
+                "lock_wait_total": 0.,
+                }
         # Initialize configuration of robot and objects from HPP
         hpp = self.client.hpp()
         self.q = hpp.problem.getInitialConfig()
@@ -189,20 +229,27 @@ class Simulation (object):
 
         self.initializeObjects (self.q)
         self.initializeSoT2HPPconversion()
+        # The configuration is updated in place by getRobotState.
+        self.q = np.array (self.q)
+        self.objectIndices = np.array (self.objectIndices, dtype=int)
 
         self.transitionName = ""
         self.q_rhs = None
+        self.transitionId = None
         self.objectPublisher = dict ()
+        # All the object poses are sent in one TFMessage.
+        self.broadcaster = tf2_ros.TransformBroadcaster()
         # Create an object publisher by object
         prefix = rospy.get_param ('tf_prefix', 'sim_')
         for o in self.objects:
             self.objectPublisher [o] = PublishObjectPose \
-                                       ('world', prefix+o+'/base_link')
-            self.objectPublisher [o].broadcast (self.objectPose [o])
+                                       ('world', prefix+o+'/base_link',
+                                        self.broadcaster)
 
             pose = self.objectPose [o]
             r = self.rankInConfiguration [o + '/root_joint']
             self.q [r:r+7] = pose
+        self.broadcastObjectPoses (self.objectPose)
         # Create subscribers
         self.subscribers = ros_tools.createSubscribers (self, "/agimus",
                                                         self.subscriberDict)
@@ -210,51 +257,146 @@ class Simulation (object):
         # Create mapping from transition names to graph component id in HPP
         self.graphDict = createGraphDict (self.client)
 
-    def getRobotState (self, msg) :
+        self.projectionThread = Thread (target = self.projectionLoop,
+                name = "projection")
+        self.projectionThread.daemon = True
+        self.projectionThread.start()
+        self.metricsService = rospy.Service ("~get_projection_metrics",
+                Trigger, self.getProjectionMetrics)
+
+    ## Acquire the mutex and record the waiting time.
+    def _acquireMutex (self):
+        start = time.time()
         self.mutex.acquire()
+        wait = time.time() - start
+        with self.projectionCondition:
+            m = self.projectionMetrics
+            m["lock_waits"] += 1
+            m["lock_wait_total"] += wait
+            m["lock_wait_max"] = max (m["lock_wait_max"], wait)
+
+    ## Publish the poses of the objects in one TFMessage
+    #  \param objectPose dictionary from object names to poses.
+    def broadcastObjectPoses (self, objectPose):
+        stamp = rospy.Time.now()
+        self.broadcaster.sendTransform ([
+            self.objectPublisher [o].transform (pose, stamp)
+            for o, pose in objectPose.items() ])
+
+    def getRobotState (self, msg) :
         try:
             # Convert RPY to quaternion
             rjq = self.sot2hpp_rootJointConversion (msg.data [:6])
+            np.take (msg.data, self.sot2hpp_src, out=self.sot2hpp_buffer)
+        except Exception:
+            rospy.logerr(traceback.format_exc())
+            return
+        self._acquireMutex()
+        try:
             self.q[:len(rjq)] = rjq
-            for sslice, hslice in self.sot2hpp_slices:
-                self.q[hslice] = msg.data[sslice]
-            # update poses of objects
-            for o in self.objects:
-                pose = self.objectPose [o]
-                self.objectPublisher [o].broadcast (pose)
+            self.q[self.sot2hpp_dst] = self.sot2hpp_buffer
+            objectPose = dict (self.objectPose)
         except Exception:
             rospy.logerr(traceback.format_exc())
+            return
         finally:
             self.mutex.release()
+        # update poses of objects
+        self.broadcastObjectPoses (objectPose)
 
     def computeObjectPositions (self, msg) :
         if msg.data == "" : return
-        self.mutex.acquire()
+        self._acquireMutex()
         try:
             transitionChanged = msg.data != self.transitionName
             self.transitionName = msg.data
             # if transition changed, record configuration for transition constraint
             # right hand side
             if transitionChanged:
-                self.q_rhs = self.q
+                self.q_rhs = self.q.copy()
                 self.transitionId = self.graphDict [self.transitionName]
                 print ("new transition: " + self.transitionName)
                 print ("q_rhs = " + str (self.q_rhs))
-            elif self.q_rhs:
+            elif self.q_rhs is not None:
                 # if transition has not changed and right hand side has been stored,
-                # apply transition constraints
-                res, self.q, err = \
-                  self.client.manip ().graph.applyEdgeLeafConstraints \
-                  (self.transitionId, self.q_rhs, self.q)
-                self.q = list (self.q)
-                for o in self.objects:
-                    r = self.rankInConfiguration [o + '/root_joint']
-                    self.objectPose [o] = self.q [r:r + 7]
+                # apply transition constraints. This is done by projectionLoop,
+                # on the latest configuration.
+                with self.projectionCondition:
+                    if self.projectionRequested:
+                        self.projectionMetrics["dropped"] += 1
+                    self.projectionRequested = True
+                    self.projectionCondition.notify()
         except Exception as e:
             rospy.logerr(e)
         finally:
             self.mutex.release()
 
+    ## Apply the constraints of the current transition to the configuration
+    #
+    #  The projection is requested by computeObjectPositions. It runs outside
+    #  the mutex so that getRobotState is not blocked by the call to HPP.
+    #  Only the configuration of the objects is updated with the result.
+    def projectionLoop (self):
+        while not rospy.is_shutdown():
+            with self.projectionCondition:
+                if not self.projectionRequested:
+                    self.projectionCondition.wait (0.1)
+                    continue
+                self.projectionRequested = False
+            self._acquireMutex()
+            try:
+                q_rhs = self.q_rhs
+                transitionId = self.transitionId
+                q = self.q.tolist()
+            finally:
+                self.mutex.release()
+            start = time.time()
+            try:
+                res, q, err = \
+                  self.client.manip ().graph.applyEdgeLeafConstraints \
+                  (transitionId, q_rhs.tolist(), q)
+            except Exception as e:
+                rospy.logerr(e)
+                with self.projectionCondition:
+                    self.projectionMetrics["failures"] += 1
+                continue
+            latency = time.time() - start
+            q = np.array (q)
+            self._acquireMutex()
+            try:
+                # q_rhs is replaced when the transition changes.
+                stale = q_rhs is not self.q_rhs
+                if not stale:
+                    self.q[self.objectIndices] = q[self.objectIndices]
+                    for o in self.objects:
+                        r = self.rankInConfiguration [o + '/root_joint']
+                        self.objectPose [o] = tuple (q [r:r + 7])
+            finally:
+                self.mutex.release()
+            with self.projectionCondition:
+                m = self.projectionMetrics
+                m["projections"] += 1
+                m["stale"] += stale
+                m["latency_last"] = latency
+                m["latency_total"] += latency
+                m["latency_max"] = max (m["latency_max"], latency)
+            if self.projectionPeriod > 0:
+                time.sleep (max (0., start + self.projectionPeriod - time.time()))
+
+    ## Metrics of the projections
+    #  \return a dictionary. Durations are in seconds.
+    def projectionStatistics (self):
+        with self.projectionCondition:
+            m = dict (self.projectionMetrics)
+        m["latency_mean"] = m["latency_total"] / m["projections"] if m["projections"] > 0 else 0.
+        m["lock_wait_mean"] = m["lock_wait_total"] / m["lock_waits"] if m["lock_waits"] > 0 else 0.
+        return m
+
+    ## Service returning projectionStatistics, in JSON.
+    def getProjectionMetrics (self, req):
+        import json
+        return TriggerResponse (True, json.dumps (self.projectionStatistics()))
+
 ## Create a simulation node that computes the pose of objects from the
 #  robot configuration in the Stack of Tasks.
 
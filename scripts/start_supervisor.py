@@ -38,6 +38,7 @@ from dynamic_graph_bridge_msgs.srv import RunCommand
 from dynamic_graph_bridge_msgs.msg import Vector
 from os.path import isfile
 from eigenpy import Quaternion, toEulerAngles
+from agimus_sot.timing import startup
 
 def usage():
     rospy.logerr ("Parameters are input (required, a python script), prefix (optional, a string) and"
@@ -49,6 +50,16 @@ rospy.init_node ('start_supervisor')
 input                                = rospy.get_param("~input",None)
 prefix                               = rospy.get_param("~prefix","")
 simulateTorqueFeedbackForEndEffector = rospy.get_param("~simulate_torque_feedback",False)
+# Send the script in chunks of top-level statements instead of line by line.
+bulkUpload                           = rospy.get_param("~bulk_upload",False)
+# Minimal number of lines per chunk. 0 sends the whole script at once.
+bulkChunkLines                       = rospy.get_param("~bulk_chunk_lines",0)
+# File where the startup report is written, in JSON.
+startupReport                        = rospy.get_param("~startup_report","")
+# Fix the number of slots of the supervisor before starting the dynamic graph,
+# keeping this many free slots for the actions added afterwards.
+# A negative value does not fix it. See Supervisor.lockSlots
+supervisorSlotHeadroom               = rospy.get_param("~supervisor_slot_headroom",64)
 
 if not input:
     usage()
@@ -90,6 +101,59 @@ def launchScript(code,title):
                 _runCommandPrint (answer)
     rospy.loginfo("...done with "+title)
 
+## Split a script into chunks of consecutive top-level statements.
+# \param minLines minimal number of lines of a chunk. If 0, the script is
+#        a single chunk.
+# \return a list of (first line, last line), starting at 1.
+def splitScript(lines, minLines):
+    import ast
+    if minLines <= 0:
+        return [ (1, len(lines)), ]
+    try:
+        tree = ast.parse ("\n".join(lines))
+    except SyntaxError:
+        # Let the interpreter of the SoT report the error.
+        return [ (1, len(lines)), ]
+    def start (stmt):
+        decorators = getattr(stmt, "decorator_list", [])
+        return decorators[0].lineno if decorators else stmt.lineno
+    chunks = []
+    first = 1
+    for stmt in tree.body[1:]:
+        if start(stmt) - first >= minLines:
+            chunks.append ((first, start(stmt)-1))
+            first = start(stmt)
+    chunks.append ((first, len(lines)))
+    return chunks
+
+## Run a script in chunks, one call to run_command per chunk.
+#
+# Each chunk is compiled with the name of the script file and preceded by
+# empty lines, so that the line numbers of the errors are those of the
+# script.
+def launchScriptBulk(lines,title,filename,minLines):
+    rospy.loginfo(title)
+    for first, last in splitScript (lines, minLines):
+        chunk = "\n" * (first-1) + "\n".join(lines[first-1:last])
+        with startup.phase ("chunk", first=first, last=last) as p:
+            answer = runCommandClient("exec(compile({0!r}, {1!r}, 'exec'))"
+                    .format(chunk, filename))
+        rospy.loginfo ("lines {0} to {1}: {2:.3f} s".format(first, last, p["duration"]))
+        _runCommandPrint (answer)
+    rospy.loginfo("...done with "+title)
+
+## Log the startup report and write it to file \c startupReport, if set.
+def writeStartupReport(ri):
+    import json
+    report = ri.startupReport ()
+    for p in report["phases"]:
+        if "duration" in p:
+            rospy.loginfo ("{0}: {1:.3f} s {2}".format(p["name"], p["duration"], p["counts"]))
+    if startupReport:
+        with open (startupReport, "w") as f:
+            json.dump (report, f, indent=2, sort_keys=True)
+        rospy.loginfo ("Startup report written in " + startupReport)
+
 def makeRosInterface():
     from agimus_sot.ros_interface import RosInterface
     import rospy
@@ -98,13 +162,14 @@ def makeRosInterface():
 
 # Waiting for services
 try:
-    rospy.loginfo("Waiting for run_command")
-    rospy.wait_for_service('/run_command')
-    rospy.loginfo("...ok")
+    with startup.phase ("wait_for_services"):
+        rospy.loginfo("Waiting for run_command")
+        rospy.wait_for_service('/run_command')
+        rospy.loginfo("...ok")
 
-    rospy.loginfo("Waiting for start_dynamic_graph")
-    rospy.wait_for_service('/start_dynamic_graph')
-    rospy.loginfo("...ok")
+        rospy.loginfo("Waiting for start_dynamic_graph")
+        rospy.wait_for_service('/start_dynamic_graph')
+        rospy.loginfo("...ok")
 
     runCommandClient = rospy.ServiceProxy('/run_command', RunCommand)
     runCommandStartDynamicGraph = rospy.ServiceProxy('/start_dynamic_graph', Empty)
@@ -115,13 +180,19 @@ try:
     code = ["globalDemoDict = {}".format(demo)]
     launchScript(code,'define dictionary demoDict')
 
-    initCode = ["simulateTorqueFeedbackForEndEffector = "+str(simulateTorqueFeedbackForEndEffector),] \
-            + open( input, "r").read().split("\n")
+    initCode = ["simulateTorqueFeedbackForEndEffector = "+str(simulateTorqueFeedbackForEndEffector),]
+    script = open( input, "r").read().split("\n")
 
     rospy.loginfo("Stack of Tasks launched")
 
-    launchScript(initCode,'initialize SoT')
-    ri = makeRosInterface ()
+    with startup.phase ("initialize_sot", lines=len(script)):
+        if bulkUpload:
+            launchScript(initCode,'define simulateTorqueFeedbackForEndEffector')
+            launchScriptBulk(script,'initialize SoT',input,bulkChunkLines)
+        else:
+            launchScript(initCode + script,'initialize SoT')
+    with startup.phase ("ros_interface"):
+        ri = makeRosInterface ()
 
     ## \todo this should be moved somewhere else (in agimus).
     ## Initialize pose of robot root_joint
@@ -144,7 +215,20 @@ try:
 
     # request SoT to publish robot state
     ri.publishState (Empty)
-    runCommandStartDynamicGraph()
+    # The switch of the supervisor must not be resized once the real-time
+    # thread computes it.
+    if supervisorSlotHeadroom >= 0:
+        launchScript(["if 'supervisor' in globals(): supervisor.lockSlots({})"
+                      .format(int(supervisorSlotHeadroom))],
+                     'lock the slots of the supervisor')
+    with startup.phase ("start_dynamic_graph"):
+        runCommandStartDynamicGraph()
+    # The startup is over: the phases of the services called afterwards are
+    # not recorded anymore.
+    startup.stop()
+    launchScript(["__import__('agimus_sot.timing', fromlist=['startup']).startup.stop()"],
+                 'stop recording the startup phases of the SoT')
+    writeStartupReport (ri)
 
     del runCommandClient
     del runCommandStartDynamicGraph
@@ -48,9 +48,16 @@ class Action(object):
 
         self.sot = sot
         self.tasks = []
+        ## Names of the entities owned by this action, deleted with it.
+        # \sa Supervisor.releaseActions
+        self.entities = [ sot.name, ]
+        ## Whether a tracer records signals of the entities. If so, they
+        # are never deleted.
+        self.traced = False
         if timer:
             from .tools import insertTimerOnOutput
             self.timer = insertTimerOnOutput (sot.control, "vector")
+            self.entities.append (self.timer.name)
         else:
             self.timer = None
 
@@ -115,3 +122,24 @@ class Action(object):
 
     @property
     def name (self): return self.sot.name
+
+## Recipe to build an Action on demand.
+#
+# Creating an Action creates a SOT and several other entities. When a
+# factory.Factory is in lazy mode (parameter \c "lazyActions"), it only
+# records how to build each action. The Supervisor builds it the first time
+# it is needed.
+class ActionRecipe(object):
+    ## \param name the name of the Action that will be built,
+    ## \param build a function without argument that returns the Action.
+    def __init__ (self, name, build):
+        self.name = name
+        self._build = build
+        self.action = None
+
+    ## Build the Action (only once) and return it.
+    def __call__ (self):
+        if self.action is None:
+            self.action = self._build()
+            assert self.action.name == self.name
+        return self.action
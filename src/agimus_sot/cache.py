@@ -0,0 +1,168 @@
+# Copyright 2018 CNRS - Airbus SAS
+# Author: Joseph Mirabel
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+## \package cache
+# Content-addressed cache of Python objects on disk.
+
+import hashlib, logging, os, time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    _unicode = unicode
+except NameError:
+    _unicode = str
+
+## Canonical string representation of an object, used to compute keys.
+#
+# Dictionaries are sorted by keys, lists and tuples are not distinguished
+# and objects are represented by their class name and the attributes listed
+# in their class attribute \c cacheKeyFields. With Python 2, a unicode
+# string and the str of its UTF-8 encoding have the same representation.
+# \throw TypeError for an object with attributes and no \c cacheKeyFields.
+def canonical (o):
+    if isinstance(o, _unicode) and not isinstance(o, str):
+        o = o.encode ("utf-8")
+    if isinstance(o, dict):
+        return "{" + ",".join (sorted ([ canonical(k) + ":" + canonical(v)
+            for k, v in o.items() ])) + "}"
+    if isinstance(o, (list, tuple)):
+        return "[" + ",".join ([ canonical(v) for v in o ]) + "]"
+    if isinstance(o, (set, frozenset)):
+        return "{" + ",".join (sorted ([ canonical(v) for v in o ])) + "}"
+    if hasattr(o, "tolist"):
+        # numpy arrays
+        return canonical (o.tolist())
+    fields = getattr(type(o), "cacheKeyFields", None)
+    if fields is not None:
+        return type(o).__name__ + canonical (
+                { f: getattr(o, f) for f in fields })
+    if hasattr(o, "__dict__") and not callable(o):
+        raise TypeError ("Cannot compute the cache key of an object of type {}:"
+                " it has no attribute cacheKeyFields".format(type(o).__name__))
+    return repr(o)
+
+## Store values in a directory. Each value is a file whose name is its key.
+#
+# \code{.py}
+# cache = Cache ("/tmp/agimus_sot")
+# key = cache.key (srdf, rules)
+# value = cache.get (key, lambda: expensiveComputation (srdf, rules))
+# print (cache.stats())
+# \endcode
+class Cache(object):
+    ## Increment when the layout of the cached values changes.
+    version = 1
+
+    ## \param directory where the values are stored. It is created if needed.
+    # \param prefix of the file names.
+    def __init__ (self, directory, prefix = ""):
+        self.directory = directory
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        ## Time spent computing values that were not found.
+        self.computeTime = 0.
+        ## Time spent loading values from the disk.
+        self.loadTime = 0.
+        ## Time that was not spent computing values thanks to the cache.
+        self.timeSaved = 0.
+
+    ## Key of a set of objects
+    # \sa canonical
+    def key (self, *objects):
+        return hashlib.sha1 (canonical ((self.version,) + objects)
+                .encode("utf-8")).hexdigest()
+
+    def _path (self, key):
+        return os.path.join (self.directory, self.prefix + key + ".pickle")
+
+    ## Load a value
+    #
+    # A file that cannot be read is removed.
+    # \return a tuple (found, value)
+    def load (self, key):
+        start = time.time()
+        path = self._path(key)
+        if not os.path.isfile (path):
+            return False, None
+        try:
+            with open (path, "rb") as f:
+                computeTime, value = pickle.load (f)
+        except Exception as e:
+            logging.getLogger (__name__).warning (
+                    "Removing cache entry {}: {}".format(path, e))
+            try:
+                os.remove (path)
+            except OSError:
+                pass
+            return False, None
+        duration = time.time() - start
+        self.loadTime += duration
+        self.timeSaved += max (0., computeTime - duration)
+        return True, value
+
+    ## Store a value
+    # \param computeTime the time spent computing the value.
+    def store (self, key, value, computeTime = 0.):
+        if not os.path.isdir (self.directory):
+            os.makedirs (self.directory)
+        # Write to a temporary file and rename so that a concurrent reader
+        # never sees a partially written file.
+        path = self._path(key)
+        tmp = path + "." + str(os.getpid())
+        with open (tmp, "wb") as f:
+            pickle.dump ((computeTime, value), f, pickle.HIGHEST_PROTOCOL)
+        os.rename (tmp, path)
+
+    ## Get a value, computing and storing it if it is not in the cache.
+    # \param compute a function without argument which returns the value.
+    def get (self, key, compute):
+        found, value = self.load (key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        start = time.time()
+        value = compute ()
+        duration = time.time() - start
+        self.computeTime += duration
+        try:
+            self.store (key, value, duration)
+        except (IOError, OSError):
+            # The value is still valid when the directory is not writable.
+            pass
+        return value
+
+    def stats (self):
+        return { "hits": self.hits,
+                 "misses": self.misses,
+                 "computeTime": self.computeTime,
+                 "loadTime": self.loadTime,
+                 "timeSaved": self.timeSaved,
+                 }
@@ -0,0 +1,54 @@
+# Copyright 2018 CNRS - Airbus SAS
+# Author: Joseph Mirabel
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+## \package encoding
+# Encoding of the values returned by the SoT interpreter.
+#
+# Service "/run_command" returns the representation of the value of the
+# command. Instead of evaluating it, ros_interface.RosInterface asks the
+# interpreter for the JSON encoding of the value, which it decodes
+# without evaluating any code. Tuples are decoded as lists.
+#
+# This module must not depend on dynamic_graph: it is imported on both sides.
+
+import ast, json
+
+## Encode a value into a string.
+def encode (value):
+    return json.dumps (value, separators=(',', ':'))
+
+## Decode a value encoded by encode.
+# \param result either the string returned by encode or its
+#        representation, i.e. the result of service "/run_command".
+def decode (result):
+    # The representation of a JSON text always starts with a single quote:
+    # Python only uses double quotes when the text contains a single quote
+    # and no double quote, which JSON does not allow. A text starting with
+    # a double quote is thus a JSON string.
+    if result[:1] == "'" or result[:2] == "u'":
+        # Only parses a string literal.
+        result = ast.literal_eval (result)
+    return json.loads (result)
@@ -26,13 +26,20 @@
 
 from hpp.corbaserver.manipulation.constraint_graph_factory import ConstraintFactoryAbstract, GraphFactoryAbstract
 from .task import Task, Grasp, PreGrasp, PreGraspPostAction, OpFrame, EndEffector
-from .action import Action
+from .action import Action, ActionRecipe
+from .graph_plan import GraphPlanner, makePlan
+from .timing import startup
+from .tools import placements as placementCache
 
 ## Affordance between a gripper and a handle.
 #
 # This class allows to tune the behaviour of the robot when grasping of
 # releasing an object. There are several behaviour already implemented.
 class Affordance(object):
+    ## Attributes of the key of the cache of plans (see cache.canonical)
+    cacheKeyFields = ("gripper", "handle", "controlType", "ref",
+            "controlParams", "simuParams")
+
     ## Constructor
     # \param gripper name of the gripper
     # \param handle  name of the handle
@@ -105,6 +112,9 @@ class Affordance(object):
         return handleFrame.hasVisualTag
 
 class ObjectAffordance(object):
+    ## Attributes of the key of the cache of plans (see cache.canonical)
+    cacheKeyFields = ("object", "handles", "enableVisualFeedback")
+
     ## Constructor
     # \param object name of the object
     # \param handles names of the object's handles
@@ -350,6 +360,8 @@ class TaskFactory(ConstraintFactoryAbstract):
 # factory.parameters["period"] = robot.getTimeStep() # This must be made available for your robot
 # factory.parameters["simulateTorqueFeedback"] = simulateTorqueFeedbackForEndEffector
 # factory.parameters["addTracerToAdmittanceController"] = True
+# # Optionally, build the actions only when the supervisor needs them.
+# factory.parameters["lazyActions"] = True
 #
 # factory.setGrippers (grippers)
 # factory.setObjects (objects, handlesPerObjects, contactPerObjects)
@@ -381,35 +393,14 @@ class TaskFactory(ConstraintFactoryAbstract):
 class Factory(GraphFactoryAbstract):
     class State:
         def __init__ (self, tasks, grasps, factory):
-            self.name = factory._stateName (grasps)
+            plan = factory._statePlan (grasps)
+            self.name = plan["name"]
             self.grasps = grasps
             self.manifold = Task()
-
-            self.objectsAlreadyGrasped = {}
-
-            for ig, ih in enumerate(grasps):
-                gName = factory.grippers[ig]
-                if ih is not None:
-                    gFrame = factory.gripperFrames[gName]
-                    hName = factory.handles[ih]
-                    hFrame = factory.handleFrames[hName]
-                    io = factory.objectFromHandle[ih]
-                    oName = factory.objects[io]
-
-                    # Add task gripper_close
-                    self.manifold += tasks.g (gName, hName, 'gripper_close')
-
-                    # Check if this graph interferes with another grasp
-                    if not gFrame.controllable and oName not in self.objectsAlreadyGrasped:
-                        otherGrasp = self.objectsAlreadyGrasped.get(gFrame.robotName)
-                    else:
-                        otherGrasp = self.objectsAlreadyGrasped.get(oName)
-
-                    self.manifold += tasks.g (gName, hName, 'grasp', otherGrasp)
-                    self.objectsAlreadyGrasped[oName] = (gFrame, hFrame)
-                else:
-                    # Add task gripper_open
-                    self.manifold += tasks.g (gName, None, 'gripper_open')
+            self.objectsAlreadyGrasped = { o: factory._graspFrames (gh)
+                    for o, gh in plan["objectsAlreadyGrasped"].items() }
+            for t in plan["manifold"]:
+                self.manifold += factory._task (t)
 
     def __init__ (self, supervisor):
         super(Factory, self).__init__ ()
@@ -429,6 +420,15 @@ class Factory(GraphFactoryAbstract):
         # - key: name of the transition before which an action must be done
         # - value: sot representing the pre-action
         self.preActions = dict()
+        ## A dictionnary
+        # - key: name of a transition
+        # - value: list of the transitions expected to be run after it.
+        self.successors = dict()
+        ## The plan of the graph, see graph_plan.makePlan
+        self.plan = None
+        self.rules = None
+        ## The cache.Cache of plans, if parameter \c "planCacheDir" is set.
+        self.planCache = None
 
         self.tracers = {}
         self.controllers = {}
@@ -440,12 +440,29 @@ class Factory(GraphFactoryAbstract):
         ## - simulateTorqueFeedback: [boolean, False]
         ##                           do not use torque feedback from the robot
         ##                           but simulate it instead.
+        ## - lazyActions: [boolean, False]
+        ##                only record how to build the actions. They are
+        ##                built by the Supervisor when first needed.
+        ## - prefetchActions: [integer, 0]
+        ##                    in lazy mode, number of transitions built in
+        ##                    advance after a transition is plugged.
+        ## - prewarmActions: [boolean, False]
+        ##                   compute the control of the next actions before
+        ##                   they are selected. See Supervisor.prewarm.
+        ## - planCacheDir: [string, None]
+        ##                 directory where the plans are stored. When the
+        ##                 inputs of the Factory did not change, the plan is
+        ##                 loaded instead of being computed.
         self.parameters = {
                 "addTracerToAdmittanceController": False,
                 "addTimerToSotControl": False,
                 "addTracerToSotControl": False,
                 "addTracerToVisualServoing": False,
                 "simulateTorqueFeedback": False,
+                "lazyActions": False,
+                "prefetchActions": 0,
+                "prewarmActions": False,
+                "planCacheDir": None,
                 }
 
     def _newSoT (self, name):
@@ -461,16 +478,139 @@ class Factory(GraphFactoryAbstract):
         sot. doneSignal = logical_and_entity ("ade_"+sot.name,
                 [ self.supervisor.done_events.controlNormSignal,
                   self.supervisor.done_events.timeEllapsedSignal])
+        sot.entities.append ("ade_"+sot.name)
         sot.errorSignal = False
 
         if self.parameters["addTimerToSotControl"]:
             id = len(self.SoTtracer.signals()) - 1
             self.SoTtracer.add (sot.timer.name + ".timer", "action_"+str(id) + ".timer")
+            sot.traced = True
         if self.parameters["addTracerToSotControl"]:
             id = len(self.SoTtracer.signals()) - 1
             self.SoTtracer.add (sot.controlname, "action_"+str(id) + ".control")
+            sot.traced = True
         return sot
 
+    ## Make an Action, or an action.ActionRecipe if parameter \c "lazyActions" is True.
+    # \param name name of the Action,
+    # \param tasks list of Task to push into the Action,
+    # \param done if not None, a function that takes the Action and returns
+    #        its done signal.
+    def _makeAction (self, name, tasks, done = None):
+        def build ():
+            sot = self._newSoT (name)
+            for t in tasks: t.pushTo (sot)
+            if done is not None:
+                sot.doneSignal = done (sot)
+            return sot
+        if self.parameters["lazyActions"]:
+            return ActionRecipe (name, build)
+        return build ()
+
+    def _timeAndControlNormDone (self, name):
+        from .events import logical_and_entity
+        def done (sot):
+            if name not in sot.entities: sot.entities.append (name)
+            return logical_and_entity(name,
+                [   self.supervisor.done_events.timeEllapsedSignal,
+                    self.supervisor.done_events.controlNormSignal ])
+        return done
+
+    ## Done signal of an action, from its description in the plan.
+    # \sa graph_plan
+    def _done (self, done, name):
+        if done is None:
+            return None
+        if done[0] == "timeAndControlNorm":
+            return self._timeAndControlNormDone ("ade_"+name)
+        if done[0] == "event":
+            from .events import logical_and_entity
+            g, h, what = done[1:]
+            def eventDone (sot):
+                sot.entities.append ("ade_sot_"+sot.name)
+                return logical_and_entity ("ade_sot_"+sot.name,
+                    [ self.tasks.event (g, h, what,
+                        self.supervisor.done_events.controlNormSignal),
+                        self.supervisor.done_events.timeEllapsedSignal])
+            return eventDone
+        raise ValueError ("Unknown done signal " + str(done))
+
+    def _graspFrames (self, grasp):
+        if grasp is None: return None
+        return ( self.gripperFrames[grasp[0]], self.handleFrames[grasp[1]] )
+
+    ## Task from its description in the plan.
+    # \param stateFrom, stateTo the states of the transition, if any.
+    # \sa graph_plan
+    def _task (self, task, stateFrom = None, stateTo = None):
+        if task[0] == "hp": return self.hpTasks
+        if task[0] == "lp": return self.lpTasks
+        if task[0] == "manifold":
+            return stateFrom.manifold if task[1] == "from" else stateTo.manifold
+        if task[0] == "manifold_without_grasp":
+            state = stateFrom if task[1] == "from" else stateTo
+            return Task ([ t for t in state.manifold.tasks if not t.name.startswith(Grasp.name_prefix) ])
+        if task[0] == "g":
+            g, h, what, otherGrasp = task[1:]
+            return self.tasks.g (g, h, what, otherGrasp = self._graspFrames(otherGrasp))
+        if task[0] == "p":
+            o, grasp, what = task[1:]
+            return self.tasks.p (o, self._graspFrames(grasp), what)
+        raise ValueError ("Unknown task " + str(task))
+
+    def setRules (self, rules):
+        self.rules = rules
+        super(Factory, self).setRules (rules)
+
+    def _makePlanner (self):
+        return GraphPlanner (self.grippers, self.objects,
+                [ [ self.handles[ih] for ih in ihs ] for ihs in self.handlesPerObjects ],
+                self.contactsPerObjects, self.envContacts,
+                { g: f.controllable for g, f in self.gripperFrames.items() },
+                { g: f.robotName    for g, f in self.gripperFrames.items() },
+                self.rules)
+
+    ## Compute the plan of the graph of constraints.
+    #
+    # No entity is created.
+    # If parameter \c "planCacheDir" is set, the plan is searched in
+    # the cache. The key depends on the grippers, objects, rules, SRDF
+    # information, affordances and parameters.
+    # \sa graph_plan.makePlan, planCache
+    def makePlan (self):
+        planner = self._makePlanner()
+        compute = lambda: makePlan (planner)
+        if self.parameters["planCacheDir"] is None:
+            return compute ()
+        if self.planCache is None or self.planCache.directory != self.parameters["planCacheDir"]:
+            from .cache import Cache
+            self.planCache = Cache (self.parameters["planCacheDir"], "plan_")
+        rules = None if self.rules is None else \
+                [ (r.grippers, r.handles, r.link) for r in self.rules ]
+        key = self.planCache.key (planner.description(), rules,
+                getattr(self, "srdfFrames", None),
+                getattr(self, "srdfContacts", None),
+                self.affordances, self.objectAffordances,
+                { k: v for k, v in self.parameters.items()
+                    if k != "planCacheDir" })
+        return self.planCache.get (key, compute)
+
+    def _setPlan (self, plan):
+        self.plan = plan
+        self._statePlans = { s["grasps"]: s for s in plan["states"] }
+        self._transitionPlans = { (t["from"], t["to"], t["ig"]): t for t in plan["transitions"] }
+
+    def _statePlan (self, grasps):
+        if self.plan is None or grasps not in self._statePlans:
+            return self._makePlanner().planState (grasps)
+        return self._statePlans[grasps]
+
+    def _transitionPlan (self, graspsFrom, graspsTo, ig):
+        k = (graspsFrom, graspsTo, ig)
+        if self.plan is None or k not in self._transitionPlans:
+            return self._makePlanner().planTransition (*k)
+        return self._transitionPlans[k]
+
     ## Add an Affordance or ObjectAffordance
     def addAffordance (self, aff):
         if isinstance(aff, Affordance):
@@ -490,28 +630,61 @@ class Factory(GraphFactoryAbstract):
             tracer.open (dir, prefix, suffix)
             self.sotrobot.device.after.addSignal(name + ".triger")
             return tracer
-        # init tracers
-        if self.parameters["addTimerToSotControl"] or self.parameters["addTracerToSotControl"]:
-            self.SoTtracer = self.supervisor.SoTtracer = addTrace(
-                    "tracer_of_actions", "sot-control-trace")
-        if self.parameters["addTracerToVisualServoing"]:
-            self.ViStracer = self.supervisor.ViStracer = addTracer (
-                    "visual_servoing_tracer", "visual-servoing-trace")
-        super(Factory, self).generate ()
-
-        self.supervisor.actions = {}
-        self.supervisor.grasps = { (gh, w): t for gh, ts in self.tasks._grasp.items() for w, t in ts.items() }
-        self.supervisor.placements = { (ogh, w): t for ogh, ts in self.tasks._placements.items() for w, t in ts.items() }
-        self.supervisor.hpTasks = self.hpTasks
-        self.supervisor.lpTasks = self.lpTasks
-        self.supervisor.postActions = {}
-        self.supervisor.preActions  = {}
-        self.supervisor.tracers = self.tracers
-        self.supervisor.controllers = self.controllers
-
-        from dynamic_graph import plug
-        self.supervisor.action_indices = dict()
-        for tn,sot in self.actions.items():
+        with startup.phase ("generate") as generate:
+            # init tracers
+            if self.parameters["addTimerToSotControl"] or self.parameters["addTracerToSotControl"]:
+                self.SoTtracer = self.supervisor.SoTtracer = addTrace(
+                        "tracer_of_actions", "sot-control-trace")
+            if self.parameters["addTracerToVisualServoing"]:
+                self.ViStracer = self.supervisor.ViStracer = addTracer (
+                        "visual_servoing_tracer", "visual-servoing-trace")
+            with startup.phase ("plan") as p:
+                self._setPlan (self.makePlan ())
+                p["counts"]["states"] = len(self.plan["states"])
+                p["counts"]["transitions"] = len(self.plan["transitions"])
+            with startup.phase ("states"):
+                for sp in self.plan["states"]:
+                    state = self.makeState (sp["grasps"], sp["priority"])
+                    self.states[sp["grasps"]] = state
+                    self.makeLoopTransition (state)
+            with startup.phase ("transitions"):
+                for tp in self.plan["transitions"]:
+                    self.makeTransition (self.states[tp["from"]], self.states[tp["to"]], tp["ig"])
+
+            self.supervisor.actions = {}
+            self.supervisor.grasps = { (gh, w): t for gh, ts in self.tasks._grasp.items() for w, t in ts.items() }
+            self.supervisor.placements = { (ogh, w): t for ogh, ts in self.tasks._placements.items() for w, t in ts.items() }
+            self.supervisor.hpTasks = self.hpTasks
+            self.supervisor.lpTasks = self.lpTasks
+            self.supervisor.postActions = {}
+            self.supervisor.preActions  = {}
+            self.supervisor.tracers = self.tracers
+            self.supervisor.controllers = self.controllers
+            self.supervisor.successors = self.successors
+            self.supervisor.prefetchActions = self.parameters["prefetchActions"]
+            self.supervisor.prewarmActions = self.parameters["prewarmActions"]
+
+            with startup.phase ("register"):
+                self._registerActions (self.actions.keys())
+            generate["counts"]["actions"] = len(self.actions)
+            generate["counts"]["tasks"] = len(self.supervisor.grasps) + len(self.supervisor.placements)
+            # Reuse of the constant placements of the frames (see tools.PlacementCache)
+            generate["counts"]["placement_hits"] = placementCache.hits
+            generate["counts"]["placement_misses"] = placementCache.misses
+
+    ## Register actions, and their pre and post actions, in the supervisor.
+    def _registerActions (self, names):
+        # Allocate the slots of the switch at once, including those of the
+        # actions built lazily: the slots cannot grow once the graph runs.
+        # See Supervisor.lockSlots
+        n = 0
+        for tn in names:
+            n += len([ a for a in [ self.actions[tn], self.preActions.get(tn) ]
+                + list(self.postActions.get(tn, {}).values())
+                if a is not None ])
+        self.supervisor.reserveSlots (len(self.supervisor.action_indices) + n)
+        for tn in names:
+            sot = self.actions[tn]
             # Pre action
             if tn in self.preActions.keys():
                 self.supervisor.addPreAction (tn, self.preActions[tn])
@@ -521,25 +694,131 @@ class Factory(GraphFactoryAbstract):
             if tn in self.postActions.keys():
                 self.supervisor.addPostActions (tn, self.postActions[tn])
 
+    ## Delete the actions which are not reachable from the mission of the supervisor.
+    #
+    # The references of the factory to these actions are dropped as well.
+    # \sa Supervisor.setMission, Supervisor.releaseActions
+    def releaseActions (self):
+        res = self.supervisor.releaseActions ()
+        for d, sd in [ (self.actions, self.supervisor.actions),
+                       (self.preActions, self.supervisor.preActions),
+                       (self.postActions, self.supervisor.postActions) ]:
+            for k in list(d.keys()):
+                if k not in sd: del d[k]
+        return res
+
+    ## Add an object after the frames were setup.
+    #
+    # The handles of the object are appended to the existing ones so that
+    # the indices of the handles, and thus the existing states and grasps,
+    # are unchanged. Call regenerate to build the corresponding actions.
+    # \param name of the object,
+    # \param handles, contacts names of the handles and contacts of the object,
+    # \param srdfHandles SRDF information of the handles, as in setupFrames,
+    # \param srdfContacts SRDF information of the contacts, as in setupContactFrames.
+    #        Required when \p contacts is not empty.
+    # \throw ValueError if the object exists or if the SRDF information of a
+    #        contact is missing.
+    def addObject (self, name, handles, contacts, srdfHandles, srdfContacts = None):
+        if name in self.objects:
+            raise ValueError ("Object " + name + " already exists")
+        missing = [ c for c in contacts if srdfContacts is None or c not in srdfContacts ]
+        if len(missing) > 0:
+            raise ValueError ("Missing SRDF information of contacts "
+                    + ", ".join (missing) + " of object " + name)
+        self.setObjects (list(self.objects) + [ name, ],
+                [ [ self.handles[ih] for ih in ihs ] for ihs in self.handlesPerObjects ]
+                + [ list(handles), ],
+                [ list(cs) for cs in self.contactsPerObjects ] + [ list(contacts), ])
+        if self.rules is not None:
+            self.setRules (self.rules)
+        self.handlesIdx = { h: i for i,h in enumerate(self.handles) }
+        self.srdfFrames[1].update ({ h: srdfHandles[h] for h in handles })
+        self.handleFrames.update ({ h: OpFrame(srdfHandles [h], self.sotrobot.name, h)
+                               for h in handles })
+        if len(contacts) > 0:
+            srdf = dict(self.srdfContacts)
+            srdf.update (srdfContacts)
+            self.setupContactFrames (srdf)
+
+    ## Build the actions of the graph of constraints that are not built yet.
+    #
+    # To be called after generate and after addObject or addAffordance.
+    # The plan is recomputed and only the new states and transitions are
+    # built. The existing actions, their index in the supervisor switch and
+    # Supervisor.action_indices are left unchanged, so that this can be
+    # called while an action runs.
+    # \note an affordance added after generate only applies to the tasks
+    #       created afterwards.
+    # \note If Supervisor.plugTopicsToRos was already called, the topics of
+    #        the new tasks are plugged. RosInterface.requestHppTopics must be
+    #        called again to publish the new HPP topics.
+    # \return a dictionary with the number of new states, transitions and actions.
+    def regenerate (self):
+        oldStates = set(self._statePlans.keys())
+        oldTransitions = set(self._transitionPlans.keys())
+        oldActions = set(self.actions.keys())
+        plan = self.makePlan ()
+        states = [ sp for sp in plan["states"] if sp["grasps"] not in oldStates ]
+        transitions = [ tp for tp in plan["transitions"]
+                if (tp["from"], tp["to"], tp["ig"]) not in oldTransitions ]
+
+        # Reserve the slots of the new actions before creating any of them so
+        # that, when they do not fit (see Supervisor.lockSlots), the factory
+        # is left unchanged.
+        names = set([ self._loopTransitionName (sp["grasps"]) for sp in states ]
+                + [ a[0] for tp in transitions for a in tp["actions"] ])
+        names.difference_update (oldActions)
+        pre  = set([ a[0] for tp in transitions for a in tp["preActions"] if a[0] in names ])
+        post = set([ a[:2] for tp in transitions for a in tp["postActions"] if a[0] in names ])
+        self.supervisor.reserveSlots (len(self.supervisor.action_indices)
+                + len(names) + len(pre) + len(post))
+
+        self._setPlan (plan)
+        for sp in states:
+            state = self.makeState (sp["grasps"], sp["priority"])
+            self.states[sp["grasps"]] = state
+            self.makeLoopTransition (state)
+        for tp in transitions:
+            self.makeTransition (self.states[tp["from"]], self.states[tp["to"]], tp["ig"])
+
+        self.supervisor.grasps.update ({ (gh, w): t for gh, ts in self.tasks._grasp.items() for w, t in ts.items() })
+        self.supervisor.placements.update ({ (ogh, w): t for ogh, ts in self.tasks._placements.items() for w, t in ts.items() })
+        actions = [ n for n in self.actions.keys() if n not in oldActions ]
+        self._registerActions (actions)
+        if hasattr(self.supervisor, "rosSubscribe"):
+            self.supervisor.plugTopicsToRos ()
+        return { "states": len(states),
+                 "transitions": len(transitions),
+                 "actions": len(actions) }
+
     def setupFrames (self, srdfGrippers, srdfHandles, sotrobot, disabledGrippers = ()):
         self.sotrobot = sotrobot
+        self.srdfFrames = ( { g: srdfGrippers[g] for g in self.grippers },
+                            { h: srdfHandles [h] for h in self.handles  },
+                            tuple(disabledGrippers) )
 
         self.grippersIdx = { g: i for i,g in enumerate(self.grippers) }
         self.handlesIdx  = { h: i for i,h in enumerate(self.handles) }
 
-        self.gripperFrames = { g: OpFrame(srdfGrippers[g], sotrobot.name, g,
-                                          sotrobot.dynamic.model,
-                                          g not in disabledGrippers)
-                               for g in self.grippers }
-        self.handleFrames  = { h: OpFrame(srdfHandles [h], sotrobot.name, h)
-                               for h in self.handles  }
+        with startup.phase ("setupFrames") as p:
+            self.gripperFrames = { g: OpFrame(srdfGrippers[g], sotrobot.name, g,
+                                              sotrobot.dynamic.model,
+                                              g not in disabledGrippers)
+                                   for g in self.grippers }
+            self.handleFrames  = { h: OpFrame(srdfHandles [h], sotrobot.name, h)
+                                   for h in self.handles  }
+            p["counts"]["frames"] = len(self.gripperFrames) + len(self.handleFrames)
 
     def setupContactFrames (self, srdfContacts):
         def addPose(c):
             if 'position' not in c:
                 c.update ({'position': (0,0,0, 0,0,0,1)})
             return c
-        self.contactFrames = { name: OpFrame(addPose(contact), self.sotrobot.name, enabled = True) for name, contact in srdfContacts.items() }
+        self.srdfContacts = srdfContacts
+        with startup.phase ("setupContactFrames") as p:
+            self.contactFrames = { name: OpFrame(addPose(contact), self.sotrobot.name, enabled = True) for name, contact in srdfContacts.items() }
+            p["counts"]["frames"] = len(self.contactFrames)
 
     def makeState (self, grasps, priority):
         # Nothing to do here
@@ -547,155 +826,31 @@ class Factory(GraphFactoryAbstract):
 
     def makeLoopTransition (self, state):
         n = self._loopTransitionName(state.grasps)
-        sot = self._newSoT ('sot_'+n)
-        from .events import logical_and_entity
-        sot. doneSignal = logical_and_entity("ade_sot_"+n,
-                [   self.supervisor.done_events.timeEllapsedSignal,
-                    self.supervisor.done_events.controlNormSignal])
-
-        self.hpTasks.pushTo(sot)
-        state.manifold.pushTo(sot)
-        self.lpTasks.pushTo(sot)
-
-        self.actions[n] = sot
+        self.actions[n] = self._makeAction ('sot_'+n,
+                [ self.hpTasks, state.manifold, self.lpTasks ],
+                self._timeAndControlNormDone ("ade_sot_"+n))
 
+    ## Create the actions of a transition, from its plan.
+    # \sa graph_plan.GraphPlanner.planTransition
     def makeTransition (self, stateFrom, stateTo, ig):
         sf = stateFrom
         st = stateTo
-        names = self._transitionNames(sf, st, ig)
-
-        iobj = self.objectFromHandle [st.grasps[ig]]
-        obj = self.objects[iobj]
-        noPlace = self._isObjectGrasped (sf.grasps, iobj)
-        #TODO compute other grasp on iobj
-        # it must be a grasp or pregrasp task
-        grasp = ( self.gripperFrames[self.grippers[ig]], self.handleFrames[self.handles[st.grasps[ig]]] )
-        if not grasp[0].controllable and obj not in sf.objectsAlreadyGrasped:
-            otherGrasp = sf.objectsAlreadyGrasped.get(grasp[0].robotName)
-        else:
-            otherGrasp = sf.objectsAlreadyGrasped.get(obj)
-
-        # The different cases:
-        pregrasp = True
-        intersec = not noPlace
-        preplace = not noPlace
-
-        # Start here
-        nWaypoints = pregrasp + intersec + preplace
-        nTransitions = 1 + nWaypoints
-
-        # Link waypoints
-        transitions = names[:]
-        assert nWaypoints > 0
-        M = 1 + pregrasp
-        actions = [ ]
-        for i in range(nTransitions):
-            ns = ("{0}_{1}{2}".format(names[0], i, i+1),
-                  "{0}_{2}{1}".format(names[1], i, i+1))
-
-            for n in ns:
-                s = self._newSoT('sot_'+n)
-                from .events import logical_and_entity
-                s. doneSignal = logical_and_entity("ade_sot_"+n,
-                        [   self.supervisor.done_events.timeEllapsedSignal,
-                            self.supervisor.done_events.controlNormSignal ])
-
-                self.hpTasks.pushTo(s)
-
-                if pregrasp and i == 1:
-                    # Add pregrasp task
-                    pregraspT = self.tasks.g (self.grippers[ig], self.handles[st.grasps[ig]], 'pregrasp', otherGrasp = otherGrasp)
-                    pregraspT.pushTo (s)
-                if preplace and i == nTransitions - 2:
-                    # Add preplace task
-                    preplaceT = self.tasks.p (obj, grasp, "preplace")
-                    preplaceT.pushTo (s)
-                if i < M: sf.manifold.pushTo(s)
-                else:     st.manifold.pushTo(s)
-
-                self.lpTasks.pushTo(s)
-                self.actions[n] = s
-                actions.append (n)
-
-        ## Post-actions for transitions from
-        # 1. pregrasp to intersec, intersec (st) reached:
-        #   x "pregrasp" is not kept because it would make the system slightly diverge when
-        #      the object is not perfectly grasped (which is obviously always the case.
-        #   - keep gripper pose
-        #   - "gripper_close"
-        key = actions[2*(M-1)]
-        sot = self._newSoT ("postAction_" + key)
-        self.hpTasks.pushTo (sot)
-        # "gripper_close" is in st.manifold
-        # self.tasks.g (self.grippers[ig], self.handles[st.grasps[ig]], 'gripper_close').pushTo (sot)
-        self.tasks.g (self.grippers[ig], self.handles[st.grasps[ig]], 'pregrasp_postaction', otherGrasp).pushTo (sot)
-        # When current transition adds a grasp on an already grasped object,
-        # then pregrasp_postaction and the grasp constraint in st conflicts
-        for t in st.manifold.tasks:
-            if not t.name.startswith(Grasp.name_prefix):
-                sot.push(t)
-        #st.manifold.pushTo (sot)
-        self.lpTasks.pushTo (sot)
-        from .events import logical_and_entity
-        sot. doneSignal = logical_and_entity ("ade_sot_"+sot.name,
-                [ self.tasks.event (self.grippers[ig], self.handles[st.grasps[ig]],
-                    'done_close',
-                    self.supervisor.done_events.controlNormSignal),
-                    self.supervisor.done_events.timeEllapsedSignal])
-        #TODO add error_events "gripper_closed_failed"
-        if not key in self.postActions.keys():
-            self.postActions[ key ] = dict()
-        self.postActions[ key ] [ st.name ] = sot
-
-        # 2. intersec to pregrasp, pregrasp (sf) reached:
-        # TODO Should this post-action be done ?
-        # Force the re-alignment with planning.
-        key = actions[2*(M-1)+1]
-        sot = self._newSoT ("postAction_" + key)
-        # TODO Any events ?
-        self.hpTasks.pushTo (sot)
-        sf.manifold.pushTo (sot)
-        self.lpTasks.pushTo (sot)
-        if not key in self.postActions.keys():
-            self.postActions[ key ] = dict()
-        self.postActions[ key ] [ sf.name ] = sot
-
-
-        ## Pre-actions for transitions from
-
-        # 1.intersec to pregrasp:
-        #   TODO the gripper releases the grasp. The object may move but it shouldn't
-        #   be important. If it turns out to be, one must replace pregrasp below by
-        #   pregrasp_postaction.
-        #   - "pregrasp": the motion must be relative to the object
-        #   - "gripper_open"
-        key = actions[2*(M-1) + 1]
-        sot = self._newSoT ("preAction_" + key)
-        self.hpTasks.pushTo (sot)
-        # "gripper_open" is in sf.manifold
-        # self.tasks.g (self.grippers[ig], self.handles[st.grasps[ig]], 'gripper_open').pushTo (sot)
-        self.tasks.g (self.grippers[ig], self.handles[st.grasps[ig]], 'pregrasp', otherGrasp).pushTo (sot)
-        sf.manifold.pushTo (sot)
-        self.lpTasks.pushTo (sot)
-        # sot. doneSignal = self.tasks.event (self.grippers[ig], self.handles[st.grasps[ig]],
-                # 'done_open', self.supervisor.done_events.controlNormSignal)
-
-        sot. doneSignal = logical_and_entity ("ade_sot_"+sot.name,
-                [ self.tasks.event (self.grippers[ig], None,
-                    'done_open',
-                    self.supervisor.done_events.controlNormSignal),
-                    self.supervisor.done_events.timeEllapsedSignal])
-        #TODO add error_events "gripper_open_failed"
-        self.preActions[ key ] = sot
-
-        # 2. pregrasp to intersec:
-        #   - "pregrasp": the motion must be relative to the object
-        # Required to force the alignment gripper / handle before the actual grasp.
-        key = actions[2*(M-1)]
-        sot = self._newSoT ("preAction_" + key)
-        self.hpTasks.pushTo (sot)
-        self.tasks.g (self.grippers[ig], self.handles[st.grasps[ig]], 'pregrasp', otherGrasp).pushTo (sot)
-        sf.manifold.pushTo (sot)
-        self.lpTasks.pushTo (sot)
-        # Default events should be fine.
-        self.preActions[ key ] = sot
+        plan = self._transitionPlan (sf.grasps, st.grasps, ig)
+
+        for n, name, tasks, done in plan["actions"]:
+            self.actions[n] = self._makeAction (name,
+                    [ self._task (t, sf, st) for t in tasks ],
+                    self._done (done, name))
+        self.successors.update (plan["successors"])
+
+        for key, state, name, tasks, done in plan["postActions"]:
+            if not key in self.postActions.keys():
+                self.postActions[ key ] = dict()
+            self.postActions[ key ] [ state ] = self._makeAction (name,
+                    [ self._task (t, sf, st) for t in tasks ],
+                    self._done (done, name))
+
+        for key, name, tasks, done in plan["preActions"]:
+            self.preActions[ key ] = self._makeAction (name,
+                    [ self._task (t, sf, st) for t in tasks ],
+                    self._done (done, name))
@@ -0,0 +1,292 @@
+# Copyright 2018 CNRS - Airbus SAS
+# Author: Joseph Mirabel and Alexis Nicolin
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+## \package graph_plan
+#
+# Planning phase of factory.Factory.
+#
+# The plan describes the states, transitions and actions of the graph of
+# constraints with plain Python objects (tuples, lists, dictionaries and
+# strings). It does not create any entity. It can thus be stored on disk
+# (see cache.Cache). factory.Factory then creates the entities from the
+# plan.
+#
+# A task is referred to by a tuple:
+# \li <tt>("hp",)</tt> and <tt>("lp",)</tt>: the high and low priority tasks,
+# \li <tt>("manifold", "from")</tt> and <tt>("manifold", "to")</tt>: the
+#     manifold of the source or target state,
+# \li <tt>("manifold_without_grasp", "to")</tt>: the manifold of the target
+#     state, without the grasp tasks,
+# \li <tt>("g", gripper, handle, what, otherGrasp)</tt>: see
+#     factory.TaskFactory.g. \c otherGrasp is None or a tuple
+#     (gripper name, handle name),
+# \li <tt>("p", object, (gripper, handle), what)</tt>: see
+#     factory.TaskFactory.p.
+#
+# The done signal of an action is referred to by:
+# \li None: default done signal,
+# \li <tt>("timeAndControlNorm",)</tt>: time ellapsed and norm of control
+#     is small,
+# \li <tt>("event", gripper, handle, what)</tt>: the event \c what of the
+#     end-effector task, and time ellapsed.
+
+from hpp.corbaserver.manipulation.constraint_graph_factory import GraphFactoryAbstract
+
+class _PlannedState(object):
+    def __init__ (self, grasps, name):
+        self.grasps = grasps
+        self.name = name
+
+## Enumerate the states and transitions of the graph of constraints.
+#
+# \sa manipulation.constraint_graph_factory.GraphFactoryAbstract
+class GraphPlanner(GraphFactoryAbstract):
+    ## Constructor
+    # \param grippers, objects, handlesPerObjects, contactsPerObjects,
+    #        envContacts, rules see GraphFactoryAbstract. \c handlesPerObjects
+    #        contains handle names.
+    # \param controllable a dictionary: whether each gripper is controllable
+    # \param robotNames a dictionary: the name of the robot of each gripper
+    def __init__ (self, grippers, objects, handlesPerObjects,
+            contactsPerObjects, envContacts, controllable, robotNames,
+            rules = None):
+        super(GraphPlanner, self).__init__ ()
+        self.setGrippers (grippers)
+        self.setObjects (objects, handlesPerObjects, contactsPerObjects)
+        self.environmentContacts (envContacts)
+        if rules is not None:
+            self.setRules (rules)
+        self.controllable = dict(controllable)
+        self.robotNames = dict(robotNames)
+        self.stateList = list()
+        self.transitionList = list()
+        self._statePlans = dict()
+
+    ## Arguments of the constructor, except the rules.
+    def description (self):
+        return ( self.grippers, self.objects,
+                [ [ self.handles[ih] for ih in ihs ] for ihs in self.handlesPerObjects ],
+                self.contactsPerObjects, self.envContacts,
+                self.controllable, self.robotNames )
+
+    def makeState (self, grasps, priority):
+        self.stateList.append ((grasps, priority))
+        return _PlannedState (grasps, self._stateName (grasps))
+
+    def makeLoopTransition (self, state):
+        pass
+
+    def makeTransition (self, stateFrom, stateTo, ig):
+        self.transitionList.append ((stateFrom.grasps, stateTo.grasps, ig))
+
+    ## Plan of a state
+    # \return a dictionary with keys \c "grasps", \c "priority", \c "name",
+    #         \c "loop" (name of the loop transition), \c "manifold" (list
+    #         of tasks) and \c "objectsAlreadyGrasped" (a dictionary whose
+    #         keys are object names and values are (gripper, handle)).
+    def planState (self, grasps, priority = None):
+        if grasps in self._statePlans:
+            return self._statePlans[grasps]
+        objectsAlreadyGrasped = dict()
+        manifold = list()
+        for ig, ih in enumerate(grasps):
+            g = self.grippers[ig]
+            if ih is not None:
+                h = self.handles[ih]
+                o = self.objects[self.objectFromHandle[ih]]
+
+                # Add task gripper_close
+                manifold.append (("g", g, h, "gripper_close", None))
+
+                # Check if this graph interferes with another grasp
+                if not self.controllable[g] and o not in objectsAlreadyGrasped:
+                    otherGrasp = objectsAlreadyGrasped.get(self.robotNames[g])
+                else:
+                    otherGrasp = objectsAlreadyGrasped.get(o)
+
+                manifold.append (("g", g, h, "grasp", otherGrasp))
+                objectsAlreadyGrasped[o] = (g, h)
+            else:
+                # Add task gripper_open
+                manifold.append (("g", g, None, "gripper_open", None))
+        plan = { "grasps": grasps,
+                 "priority": priority,
+                 "name": self._stateName (grasps),
+                 "loop": self._loopTransitionName (grasps),
+                 "manifold": manifold,
+                 "objectsAlreadyGrasped": objectsAlreadyGrasped,
+                 }
+        self._statePlans[grasps] = plan
+        return plan
+
+    ## Plan of a transition
+    # \return a dictionary with keys
+    # \li \c "from", \c "to", \c "ig" the arguments,
+    # \li \c "actions": list of (transition name, action name, tasks, done),
+    # \li \c "successors": dictionary transition name -> next transition names,
+    # \li \c "preActions": list of (transition name, action name, tasks, done),
+    # \li \c "postActions": list of (transition name, reached state name,
+    #     action name, tasks, done).
+    def planTransition (self, graspsFrom, graspsTo, ig):
+        sf = self.planState (graspsFrom)
+        st = self.planState (graspsTo)
+        names = self._transitionNames (
+                _PlannedState (graspsFrom, sf["name"]),
+                _PlannedState (graspsTo  , st["name"]), ig)
+
+        g = self.grippers[ig]
+        h = self.handles[graspsTo[ig]]
+        iobj = self.objectFromHandle [graspsTo[ig]]
+        obj = self.objects[iobj]
+        noPlace = self._isObjectGrasped (graspsFrom, iobj)
+        #TODO compute other grasp on iobj
+        # it must be a grasp or pregrasp task
+        grasp = (g, h)
+        if not self.controllable[g] and obj not in sf["objectsAlreadyGrasped"]:
+            otherGrasp = sf["objectsAlreadyGrasped"].get(self.robotNames[g])
+        else:
+            otherGrasp = sf["objectsAlreadyGrasped"].get(obj)
+
+        # The different cases:
+        pregrasp = True
+        intersec = not noPlace
+        preplace = not noPlace
+
+        # Start here
+        nWaypoints = pregrasp + intersec + preplace
+        nTransitions = 1 + nWaypoints
+
+        # Link waypoints
+        assert nWaypoints > 0
+        M = 1 + pregrasp
+        actions = [ ]
+        for i in range(nTransitions):
+            ns = ("{0}_{1}{2}".format(names[0], i, i+1),
+                  "{0}_{2}{1}".format(names[1], i, i+1))
+
+            for n in ns:
+                tasks = [ ("hp",), ]
+                if pregrasp and i == 1:
+                    # Add pregrasp task
+                    tasks.append (("g", g, h, "pregrasp", otherGrasp))
+                if preplace and i == nTransitions - 2:
+                    # Add preplace task
+                    tasks.append (("p", obj, grasp, "preplace"))
+                if i < M: tasks.append (("manifold", "from"))
+                else:     tasks.append (("manifold", "to"))
+                tasks.append (("lp",))
+                actions.append ((n, 'sot_'+n, tasks, ("timeAndControlNorm",)))
+
+        # Order in which the actions are expected to be run.
+        # actions[2*i] goes forward and actions[2*i+1] goes backward.
+        successors = dict()
+        for i in range(nTransitions - 1):
+            successors[actions[2*i][0]] = [ actions[2*(i+1)][0], ]
+            successors[actions[2*(i+1)+1][0]] = [ actions[2*i+1][0], ]
+
+        postActions = [ ]
+        ## Post-actions for transitions from
+        # 1. pregrasp to intersec, intersec (st) reached:
+        #   x "pregrasp" is not kept because it would make the system slightly diverge when
+        #      the object is not perfectly grasped (which is obviously always the case.
+        #   - keep gripper pose
+        #   - "gripper_close"
+        # "gripper_close" is in st.manifold
+        # When current transition adds a grasp on an already grasped object,
+        # then pregrasp_postaction and the grasp constraint in st conflicts
+        key = actions[2*(M-1)][0]
+        postActions.append ((key, st["name"], "postAction_" + key,
+            [ ("hp",),
+              ("g", g, h, "pregrasp_postaction", otherGrasp),
+              ("manifold_without_grasp", "to"),
+              ("lp",), ],
+            #TODO add error_events "gripper_closed_failed"
+            ("event", g, h, "done_close")))
+
+        # 2. intersec to pregrasp, pregrasp (sf) reached:
+        # TODO Should this post-action be done ?
+        # Force the re-alignment with planning.
+        # TODO Any events ?
+        key = actions[2*(M-1)+1][0]
+        postActions.append ((key, sf["name"], "postAction_" + key,
+            [ ("hp",), ("manifold", "from"), ("lp",), ], None))
+
+        preActions = [ ]
+        ## Pre-actions for transitions from
+
+        # 1.intersec to pregrasp:
+        #   TODO the gripper releases the grasp. The object may move but it shouldn't
+        #   be important. If it turns out to be, one must replace pregrasp below by
+        #   pregrasp_postaction.
+        #   - "pregrasp": the motion must be relative to the object
+        #   - "gripper_open"
+        # "gripper_open" is in sf.manifold
+        key = actions[2*(M-1) + 1][0]
+        preActions.append ((key, "preAction_" + key,
+            [ ("hp",), ("g", g, h, "pregrasp", otherGrasp),
+              ("manifold", "from"), ("lp",), ],
+            #TODO add error_events "gripper_open_failed"
+            ("event", g, None, "done_open")))
+
+        # 2. pregrasp to intersec:
+        #   - "pregrasp": the motion must be relative to the object
+        # Required to force the alignment gripper / handle before the actual grasp.
+        # Default events should be fine.
+        key = actions[2*(M-1)][0]
+        preActions.append ((key, "preAction_" + key,
+            [ ("hp",), ("g", g, h, "pregrasp", otherGrasp),
+              ("manifold", "from"), ("lp",), ],
+            None))
+
+        return { "from": graspsFrom,
+                 "to": graspsTo,
+                 "ig": ig,
+                 "actions": actions,
+                 "successors": successors,
+                 "preActions": preActions,
+                 "postActions": postActions,
+                 }
+
+## Compute the plan of the graph of constraints.
+# \param planner a GraphPlanner
+# \return a dictionary with keys \c "states" (list of state plans) and
+#         \c "transitions" (list of transition plans)
+# \sa GraphPlanner.planState, GraphPlanner.planTransition
+#
+# \note The plan is computed serially, in the current process. Planning
+#       a transition only builds a few tuples, and the frames have few
+#       distinct placements (see tools.PlacementCache): for 3 grippers and
+#       3 objects with 2 handles each, the plan takes about 3% of
+#       factory.Factory.generate. Starting worker processes and sending
+#       them the planner costs more than that. The expensive part of the
+#       generation is the creation of the entities, which must stay in the
+#       process of the SoT.
+def makePlan (planner):
+    planner.generate ()
+    states = [ planner.planState (grasps, priority)
+            for grasps, priority in planner.stateList ]
+    transitions = [ planner.planTransition (*t) for t in planner.transitionList ]
+    return { "states": states, "transitions": transitions }
@@ -29,7 +29,7 @@ from dynamic_graph import plug
 from agimus_sot.sot import SafeGainAdaptive, ObjectLocalization
 from agimus_sot.task import Task, SotTask, FeaturePose
 from agimus_sot.tools import _createOpPoint, assertEntityDoesNotExist, \
-    matrixHomoInverse, matrixHomoProduct, entityIfMatrixHomo
+    matrixHomoInverse, matrixHomoProduct, entityIfMatrixHomo, placements
 
 class PreGrasp (Task):
     name_prefix = "pregrasp"
@@ -106,7 +106,7 @@ class PreGrasp (Task):
         self.addHppJointTopic (gripper.fullLink, signalGetters = [ self.oMjaDes_inv.sin, ],)
         # Plug it to FeaturePose
         self.faMfbDes = matrixHomoProduct (name + "_faMfbDes",
-            gripper.lMf.inverse(), # jgMg^-1
+            placements.inverse (gripper), # jgMg^-1
             self.oMjaDes_inv.sout, # oMjg^-1 -> HPP joint
             None,                  # oMlh -> HPP joint
             handle.lMf,            # lhMh
@@ -140,11 +140,11 @@ class PreGrasp (Task):
 
         self._plugRobotLink (sotrobot, self.gripper.link,
                 self.feature.oMja, self.feature.jaJja)
-        self.feature.jaMfa.value = self.gripper.lMf.homogeneous
+        self.feature.jaMfa.value = placements.homogeneous (self.gripper)
 
         self.addHppJointTopic (self.handle.fullLink)
         self._plugObjectLink (sotrobot, self.handle.fullLink, self.feature.oMjb)
-        self.feature.jbMfb.value = self.handle.lMf.homogeneous
+        self.feature.jbMfb.value = placements.homogeneous (self.handle)
         self.feature.jbJjb.value = np.zeros((6, sotrobot.dynamic.getDimension()))
 
         # Compute desired pose between gripper and handle.
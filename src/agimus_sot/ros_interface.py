@@ -24,10 +24,92 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import sys, threading
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
 import rospy
 from std_srvs.srv import Trigger, TriggerResponse, SetBool, SetBoolResponse, Empty, EmptyResponse
 from agimus_sot_msgs.srv import PlugSot, PlugSotResponse, GetJointNames, ReadQueue, WaitForMinQueueSize, WaitForMinQueueSizeResponse, SetPose
 from dynamic_graph_bridge_msgs.srv import RunCommand
+from .timing import startup
+
+if sys.version_info[0] < 3:
+    # "raise type, value, traceback" is a syntax error with Python 3.
+    exec ("def _reraise (excInfo):\n    raise excInfo[0], excInfo[1], excInfo[2]\n")
+else:
+    def _reraise (excInfo):
+        raise excInfo[1].with_traceback (excInfo[2])
+
+## A result which will be available later.
+class Future(object):
+    def __init__ (self):
+        self._done = threading.Event()
+        self._result = None
+        self._excInfo = None
+
+    ## \param excInfo None or the value of sys.exc_info() when the function raised.
+    def _set (self, result, excInfo):
+        self._result = result
+        self._excInfo = excInfo
+        self._done.set()
+
+    def done (self):
+        return self._done.is_set()
+
+    ## Wait for the result and return it.
+    # If the function raised an exception, it is raised again here, with
+    # the traceback of the worker thread.
+    def result (self, timeout = None):
+        if not self._done.wait (timeout) and not self._done.is_set():
+            raise RuntimeError ("Timeout while waiting for a result")
+        if self._excInfo is not None:
+            _reraise (self._excInfo)
+        return self._result
+
+## Run functions in worker threads.
+#
+# Functions are submitted to a lane. Each lane has its own threads, so
+# that a function which waits for a long time in one lane does not delay
+# the functions of the other lanes.
+#
+# \code{.py}
+# executor = Executor ({ "fast": 1, "wait": 1 })
+# future = executor.submit ("wait", supervisor.waitForQueue, 10, 5.)
+# success, msg = future.result()
+# \endcode
+class Executor(object):
+    ## \param lanes a dictionary: lane name -> number of threads
+    def __init__ (self, lanes):
+        self._queues = dict()
+        self._threads = list()
+        for lane, n in lanes.items():
+            self._queues[lane] = Queue.Queue()
+            for i in range(n):
+                t = threading.Thread (target = self._work,
+                        args = (self._queues[lane],),
+                        name = "agimus_sot_" + lane + "_" + str(i))
+                t.daemon = True
+                t.start()
+                self._threads.append (t)
+
+    def _work (self, queue):
+        while True:
+            future, function, args = queue.get()
+            try:
+                result = function (*args)
+            except Exception:
+                future._set (None, sys.exc_info())
+            else:
+                future._set (result, None)
+
+    ## Call \c function(*args) in a thread of \c lane
+    # \return a Future
+    def submit (self, lane, function, *args):
+        future = Future()
+        self._queues[lane].put ((future, function, args))
+        return future
 
 def wait_for_service (srv, time = 0.2):
     try:
@@ -38,6 +120,112 @@ def wait_for_service (srv, time = 0.2):
         rospy.wait_for_service(srv)
         rospy.logwarn("Service {0} found.".format(srv))
 
+## Name of the topic where HPP publishes a target.
+# It must match the topics subscribed by supervisor.Supervisor.plugTopicsToRos.
+# \param kind either "hppjoint" or "hppcom",
+# \param name the name of the joint or of the center of mass.
+def hppTopicName (kind, name, velocity):
+    if kind == "hppjoint":
+        topic = "velocity/op_frame" if velocity else "op_frame"
+        return "/hpp/target/" + topic + '/' + name
+    topic = "velocity/com" if velocity else "com"
+    if name == "":
+        return "/hpp/target/" + topic
+    return "/hpp/target/" + topic + '/' + name
+
+## Topics among \p topics to which a subscriber is connected.
+#
+# The subscribers of each topic are given by the ROS master. Their
+# connections are read with the slave API of each subscriber node.
+def connectedTopics (master, topics):
+    try:
+        from xmlrpc.client import ServerProxy
+    except ImportError:
+        from xmlrpclib import ServerProxy
+    import rosgraph
+    connected = set()
+    try:
+        publishers, subscribers, services = master.getSystemState()
+        # The QueueMonitor of this node also subscribes to the topics.
+        nodes = set ([ n for t, ns in subscribers if t in topics for n in ns
+            if n != rospy.get_name() ])
+        for node in nodes:
+            code, msg, connections = ServerProxy (master.lookupNode (node)) \
+                    .getBusInfo (rospy.get_name())
+            for c in connections:
+                # [ id, destination, direction, transport, topic, connected, ... ]
+                if c[2] == 'i' and c[4] in topics and (len(c) < 6 or c[5]):
+                    connected.add (c[4])
+    except (IOError, OSError, rosgraph.MasterException) as e:
+        rospy.logwarn ("Could not read the connections: {}".format(e))
+    return connected
+
+## Count the messages received on the topics of HPP.
+#
+# The node subscribes to the topics to which the RosQueuedSubscribe entity
+# of the supervisor subscribes. Each message wakes up the threads in wait,
+# so that waiting for the queues sends no command to the SoT.
+# The count is an estimate of the size of the queues of the SoT: check the
+# queues once afterwards with supervisor.Supervisor.waitForQueue.
+class QueueMonitor(object):
+    def __init__ (self):
+        self._condition = threading.Condition()
+        self._subscribers = dict()
+        self._counts = dict()
+        ## Time (in seconds) each topic took to receive enough messages,
+        # during the latest call to wait.
+        self.fillTimes = dict()
+
+    ## Subscribe to the topics which are not subscribed yet.
+    def subscribe (self, topics):
+        for t in topics:
+            if t in self._subscribers: continue
+            with self._condition:
+                self._counts[t] = 0
+            self._subscribers[t] = rospy.Subscriber (t, rospy.AnyMsg,
+                    self._received, t)
+
+    def _received (self, msg, topic):
+        with self._condition:
+            self._counts[topic] += 1
+            self._condition.notify_all()
+
+    def _notify (self):
+        with self._condition:
+            self._condition.notify_all()
+
+    ## Forget the messages received so far.
+    # To be called when the queues of the SoT are cleared or read.
+    def reset (self):
+        with self._condition:
+            for t in self._counts:
+                self._counts[t] = 0
+
+    ## Wait until each topic received \p n messages since the latest reset.
+    # \return the topics which did not after \p timeout seconds.
+    def wait (self, n, timeout):
+        import time
+        start = time.time()
+        self.fillTimes = dict()
+        # Condition.wait with a timeout polls with Python 2. A timer wakes
+        # up this thread instead.
+        timer = threading.Timer (timeout, self._notify)
+        timer.daemon = True
+        timer.start()
+        try:
+            with self._condition:
+                while True:
+                    elapsed = time.time() - start
+                    for t, c in self._counts.items():
+                        if c >= n and t not in self.fillTimes:
+                            self.fillTimes[t] = elapsed
+                    missing = [ t for t, c in self._counts.items() if c < n ]
+                    if len(missing) == 0 or elapsed >= timeout:
+                        return missing
+                    self._condition.wait ()
+        finally:
+            timer.cancel()
+
 ## Ros interface for \ref supervisor.Supervisor.
 #
 # There are two ways of communicating with SoT.
@@ -52,20 +240,48 @@ class RosInterface(object):
     #
     # \todo Service "run_command" should be used only when supervisor is None.
     def __init__ (self, supervisor = None):
-        rospy.Service('plug_sot', PlugSot, self.plugSot)
-        rospy.Service('run_post_action', PlugSot, self.runPostAction)
-        rospy.Service('run_pre_action', PlugSot, self.runPreAction)
-        rospy.Service('request_hpp_topics', Trigger, self.requestHppTopics)
-        rospy.Service('clear_queues', Trigger, self.clearQueues)
-        rospy.Service('wait_for_min_queue_size', WaitForMinQueueSize, self.waitForMinQueueSize)
-        rospy.Service('read_queue', ReadQueue, self.readQueue)
-        rospy.Service('stop_reading_queue', Empty, self.stopReadingQueue)
-        rospy.Service('publish_state', Empty, self.publishState)
-        rospy.Service('set_base_pose', SetPose, self.setBasePose)
-        rospy.Service('get_joint_names', GetJointNames, self.getJointNames)
-        wait_for_service ("/run_command")
+        with startup.phase ("wait_for_run_command"):
+            wait_for_service ("/run_command")
         self._runCommand = rospy.ServiceProxy ('/run_command', RunCommand)
         self.supervisor = supervisor
+        ## Duration, in seconds, of the latest calls to runBatch.
+        self.batchLatencies = []
+        ## Executor of the services.
+        # rospy calls each service in the thread of the connection of the
+        # client, which waits for the response. The executor bounds the
+        # number of callbacks running at once, per lane. Each service which
+        # may wait for a long time has its own lane: read_queue,
+        # wait_for_min_queue_size and run_batch, and request_hpp_topics
+        # which waits for the services of HPP. So, a long wait never delays
+        # the other services, which run concurrently in lane "fast".
+        # Commands sent to the SoT interpreter are still handled one at a
+        # time by the interpreter.
+        # Lane "hpp" is used to call the services of HPP concurrently.
+        self.executor = Executor ({ "fast": 4, "read_queue": 1,
+            "wait_for_min_queue_size": 2, "run_batch": 1,
+            "topics": 1, "hpp": 4 })
+        ## Messages received on the topics of HPP, to wait for the queues.
+        self.queueMonitor = QueueMonitor()
+
+        self._service('plug_sot', PlugSot, self.plugSot)
+        self._service('run_post_action', PlugSot, self.runPostAction)
+        self._service('run_pre_action', PlugSot, self.runPreAction)
+        self._service('request_hpp_topics', Trigger, self.requestHppTopics, "topics")
+        self._service('clear_queues', Trigger, self.clearQueues)
+        self._service('wait_for_min_queue_size', WaitForMinQueueSize, self.waitForMinQueueSize, "wait_for_min_queue_size")
+        self._service('read_queue', ReadQueue, self.readQueue, "read_queue")
+        self._service('stop_reading_queue', Empty, self.stopReadingQueue)
+        self._service('publish_state', Empty, self.publishState)
+        self._service('set_base_pose', SetPose, self.setBasePose)
+        self._service('get_joint_names', GetJointNames, self.getJointNames)
+        self._service('get_profile', Trigger, self.getProfile)
+        self._service('run_batch', RunCommand, self.runBatchService, "run_batch")
+        self._service('get_startup_report', Trigger, self.getStartupReport)
+
+    ## Advertise a service whose callback is run by \ref executor.
+    def _service (self, name, type, callback, lane = "fast"):
+        return rospy.Service (name, type,
+                lambda req: self.executor.submit (lane, callback, req).result())
 
     def _isNotError (self, runCommandAnswer):
         if len(runCommandAnswer.standarderror) != 0:
@@ -83,6 +299,80 @@ class RosInterface(object):
             rospy.logerr (answer.standarderror)
         return answer
 
+    ## Evaluate an expression in the SoT interpreter and return its value.
+    #
+    # The value is transferred with encoding.encode and decoded without
+    # evaluating any code.
+    # \return a tuple (success, value or error message)
+    def _remoteValue (self, expr):
+        from .encoding import decode
+        answer = self.runCommand ("__import__('agimus_sot.encoding', fromlist=['encode']).encode({})".format(expr))
+        success, msg = self._isNotError (answer)
+        if not success:
+            return False, msg
+        return True, decode (answer.result)
+
+    ## Wait for the queues to be of a given size.
+    #
+    # The messages received by \ref queueMonitor are waited for first. Then,
+    # the queues of the SoT are checked with a single call to
+    # supervisor.Supervisor.waitForQueue, which waits for the remaining time
+    # only if some messages are not in the queues of the SoT yet.
+    # \return a tuple (success, message)
+    def _waitForQueue (self, minQueueSize, timeout):
+        import time
+        start = time.time()
+        self.queueMonitor.wait (minQueueSize, timeout)
+        remaining = max (0., timeout - (time.time() - start))
+        if self.supervisor is not None:
+            return self.supervisor.waitForQueue (minQueueSize, remaining)
+        success, res = self._remoteValue ("supervisor.waitForQueue({},{})"
+                .format(minQueueSize, remaining))
+        if not success:
+            return False, res
+        return tuple(res)
+
+    ## Run several supervisor operations with a single call.
+    #
+    # In remote mode, this costs a single call to "/run_command".
+    # \param operations see supervisor.Supervisor.runBatch
+    # \return the list of results.
+    def runBatch (self, operations):
+        import time
+        start = time.time()
+        if self.supervisor is not None:
+            results = self.supervisor.runBatch (operations)
+        else:
+            success, results = self._remoteValue ("supervisor.runBatch({!r})".format(list(operations)))
+            if not success:
+                results = [ (False, results), ]
+        latency = time.time() - start
+        self.batchLatencies = self.batchLatencies[-99:] + [ latency, ]
+        rospy.loginfo ("Ran {} of {} operations in {:.1f} ms".format(
+            len(results), len(operations), 1000 * latency))
+        return results
+
+    ## Service "run_batch".
+    #
+    # The input is a Python literal of the list of operations, for instance
+    # <tt>[("runPreAction", ("t",)), ("plugSot", ("t", False))]</tt>.
+    # The result is the list of results, encoded with encoding.encode.
+    # \sa runBatch
+    def runBatchService (self, req):
+        import ast
+        from dynamic_graph_bridge_msgs.srv import RunCommandResponse
+        rsp = RunCommandResponse()
+        try:
+            operations = ast.literal_eval (req.input)
+        except (ValueError, SyntaxError) as e:
+            rsp.result = "None"
+            rsp.standarderror = "Invalid list of operations: " + str(e)
+            return rsp
+        from .encoding import encode
+        rsp.result = encode (self.runBatch (operations))
+        rsp.standardoutput = "{:.1f} ms".format(1000 * self.batchLatencies[-1])
+        return rsp
+
     def runPreAction (self, req):
         rsp = PlugSotResponse()
         rsp.msg = "Successfully called supervisor."
@@ -96,11 +386,11 @@ class RosInterface(object):
                 rsp.msg = str(e)
                 return rsp
         else:
-            answer = self.runCommand ("supervisor.runPreAction('{}')".format(req.transition_name))
-            rsp.success, rsp.msg = self._isNotError (answer)
+            rsp.success, res = self._remoteValue ("supervisor.runPreAction({!r})".format(req.transition_name))
             if rsp.success:
-                rsp.success, rsp.start_time, rsp.msg = eval(answer.result)
+                rsp.success, rsp.start_time, rsp.msg = res
             else:
+                rsp.msg = res
                 return rsp
         return rsp
 
@@ -116,11 +406,11 @@ class RosInterface(object):
                 rsp.msg = str(e)
                 return rsp
         else:
-            answer = self.runCommand ("supervisor.plugSot('{}', False)".format(req.transition_name))
-            rsp.success, rsp.msg = self._isNotError (answer)
+            rsp.success, res = self._remoteValue ("supervisor.plugSot({!r}, False)".format(req.transition_name))
             if rsp.success:
-                rsp.success, rsp.start_time, rsp.msg = eval(answer.result)
+                rsp.success, rsp.start_time, rsp.msg = res
             else:
+                rsp.msg = res
                 return rsp
         return rsp
 
@@ -137,26 +427,38 @@ class RosInterface(object):
                 return rsp
             return rsp
         else:
-            answer = self.runCommand ("supervisor.runPostAction('{}')".format(req.transition_name))
-            rsp.success, rsp.msg = self._isNotError (answer)
+            rsp.success, res = self._remoteValue ("supervisor.runPostAction({!r})".format(req.transition_name))
             if rsp.success:
-                rsp.success, rsp.start_time, rsp.msg = eval(answer.result)
+                rsp.success, rsp.start_time, rsp.msg = res
+            else:
+                rsp.msg = res
         return rsp
 
     def getJointNames(self, req):
         if self.supervisor is not None:
             names = self.supervisor.getJointList()
         else:
-            answer = self.runCommand ("supervisor.getJointList()")
-
-            success, message = self._isNotError (answer)
-            if success:
-                names = eval(answer.result)
-            else:
-                rospy.logerr("Could not get the joint names\n" + message)
+            success, names = self._remoteValue ("supervisor.getJointList()")
+            if not success:
+                rospy.logerr("Could not get the joint names\n" + names)
+                names = []
         return (names,)
 
+    ## Computation time of the control, per action.
+    # The message of the response is a JSON dictionary.
+    # \sa supervisor.Supervisor.profile
+    def getProfile(self, req):
+        import json
+        if self.supervisor is not None:
+            profile = self.supervisor.profile()
+        else:
+            success, profile = self._remoteValue ("supervisor.profile()")
+            if not success:
+                return TriggerResponse (False, profile)
+        return TriggerResponse (True, json.dumps(profile))
+
     def clearQueues(self, req):
+        self.queueMonitor.reset()
         if self.supervisor is not None:
             self.supervisor.clearQueues()
         else:
@@ -167,15 +469,23 @@ class RosInterface(object):
     def readQueue(self, req):
         from agimus_sot_msgs.srv import ReadQueueResponse
         rsp = ReadQueueResponse()
+        # Wait without blocking the SoT interpreter. Then, the queues
+        # are large enough and readQueue does not wait.
+        rsp.success, rsp.message = self._waitForQueue (req.minQueueSize, req.timeout)
+        if not rsp.success:
+            rospy.logerr (rsp.message)
+            rsp.start_time = -1
+            rsp.message = "Timeout reached"
+            return rsp
         if self.supervisor is not None:
-            rsp.success, rsp.start_time = self.supervisor.readQueue(req.delay, req.minQueueSize, req.duration, req.timeout)
+            rsp.success, rsp.start_time = self.supervisor.readQueue(req.delay, req.minQueueSize, req.duration, 0)
         else:
-            cmd = "supervisor.readQueue({},{},{},{})".format(req.delay, req.minQueueSize, req.duration, req.timeout)
-            answer = self.runCommand (cmd)
-            rsp.success, rsp.message = self._isNotError (answer)
+            cmd = "supervisor.readQueue({},{},{},{})".format(req.delay, req.minQueueSize, req.duration, 0)
+            rsp.success, res = self._remoteValue (cmd)
             if rsp.success:
-                rsp.success, rsp.start_time = eval(answer.result)
+                rsp.success, rsp.start_time = res
             else:
+                rsp.message = res
                 return rsp
         if not rsp.success:
             rsp.message = "Timeout reached"
@@ -184,15 +494,7 @@ class RosInterface(object):
     def waitForMinQueueSize(self, req):
         from agimus_sot_msgs.srv import WaitForMinQueueSizeResponse
         rsp = WaitForMinQueueSizeResponse()
-        if self.supervisor is not None:
-            rsp.success, rsp.message = self.supervisor.waitForQueue(req.minQueueSize, req.timeout)
-        else:
-            cmd = "supervisor.waitForQueue({},{})".format(req.minQueueSize, req.timeout)
-            answer = self.runCommand (cmd)
-            rospy.loginfo(answer.standarderror)
-            rsp.success, rsp.message = self._isNotError (answer)
-            if rsp.success:
-                rsp.success, rsp.message = eval(answer.result)
+        rsp.success, rsp.message = self._waitForQueue(req.minQueueSize, req.timeout)
         return rsp
 
     def stopReadingQueue(self, req):
@@ -204,16 +506,55 @@ class RosInterface(object):
         return EmptyResponse ()
 
     def publishState(self, req):
+        with startup.phase ("publishState"):
+            if self.supervisor is not None:
+                self.supervisor.publishState ()
+            else:
+                cmd = "supervisor.publishState()"
+                answer = self.runCommand (cmd)
+        return EmptyResponse ()
+
+    ## Report of the startup.
+    #
+    # In remote mode, the phases of the SoT interpreter are prefixed with
+    # "sot/".
+    # \return a dictionary, see timing.PhaseTimer.report
+    def startupReport (self):
         if self.supervisor is not None:
-            self.supervisor.publishState ()
+            return startup.report()
+        from .timing import PhaseTimer
+        timer = PhaseTimer()
+        timer.extend (startup.phases)
+        success, phases = self._remoteValue ("__import__('agimus_sot.timing', fromlist=['startup']).startup.phases")
+        if success:
+            timer.extend (phases, "sot/")
         else:
-            cmd = "supervisor.publishState()"
-            answer = self.runCommand (cmd)
-        return EmptyResponse ()
+            rospy.logerr ("Could not get the startup phases of the SoT: " + str(phases))
+        return timer.report()
+
+    ## Startup report, encoded in JSON.
+    # \sa startupReport
+    def getStartupReport(self, req):
+        import json
+        return TriggerResponse (True, json.dumps (self.startupReport()))
 
+    ## Ask HPP to publish the topics read by the SoT.
+    #
+    # \return success False when a topic is not connected after
+    #         \ref hppTopicsTimeout seconds. The message lists these topics.
     def requestHppTopics(self, req):
-        for srv in ['add_center_of_mass', 'add_center_of_mass_velocity', 'add_operational_frame', 'add_operational_frame_velocity',]:
-            wait_for_service("/hpp/target/" + srv)
+        with startup.phase ("requestHppTopics") as phase:
+            return self._requestHppTopics (phase)
+
+    ## Time, in seconds, to wait until the SoT is connected to the topics of HPP.
+    hppTopicsTimeout = 5.
+
+    def _requestHppTopics(self, phase):
+        services = ['add_center_of_mass', 'add_center_of_mass_velocity', 'add_operational_frame', 'add_operational_frame_velocity',]
+        with startup.phase ("wait_for_services"):
+            futures = [ self.executor.submit ("hpp", wait_for_service, "/hpp/target/" + srv)
+                    for srv in services ]
+            for f in futures: f.result()
 
         from agimus_sot_msgs.srv import SetString
         handlers = {
@@ -222,23 +563,52 @@ class RosInterface(object):
                 'hppjoint': rospy.ServiceProxy ('/hpp/target/add_operational_frame', SetString),
                 'vel_hppjoint': rospy.ServiceProxy ('/hpp/target/add_operational_frame_velocity', SetString),
                 }
-        if self.supervisor is not None:
-            topics = self.supervisor.topics()
-        else:
-            cmd = "{ n: { k: v for k, v in t.items() if k in ['hppjoint', 'hppcom', 'velocity'] } for n, t in supervisor.topics().items() }"
-            answer = self.runCommand (cmd)
-            topics = eval(answer.result)
-        for n, t in topics.items():
-            for k in ['hppjoint', 'hppcom']:
-                if k in t.keys():
-                    kk = k if not t["velocity"] else ("vel_" + k)
-                    handlers[kk] (t[k])
-                    rospy.loginfo("Requested " + kk + " " + t[k])
-        # This sleep is mandatory to let some time to ROS to connect
-        # topic publisher and susbcriber. Otherwise, the first message is dropped.
-        rospy.sleep(1)
+        with startup.phase ("topics"):
+            if self.supervisor is not None:
+                topics = self.supervisor.topics()
+            else:
+                cmd = "{ n: { k: v for k, v in t.items() if k in ['hppjoint', 'hppcom', 'velocity'] } for n, t in supervisor.topics().items() }"
+                success, topics = self._remoteValue (cmd)
+                if not success:
+                    return TriggerResponse (False, topics)
+        # All the requests are sent at once.
+        with startup.phase ("request"):
+            futures = []
+            names = set()
+            for n, t in topics.items():
+                for k in ['hppjoint', 'hppcom']:
+                    if k in t.keys():
+                        kk = k if not t["velocity"] else ("vel_" + k)
+                        futures.append (self.executor.submit ("hpp", handlers[kk], t[k]))
+                        names.add (hppTopicName (k, t[k], t["velocity"]))
+                        rospy.loginfo("Requested " + kk + " " + t[k])
+            for f in futures: f.result()
+            phase["counts"]["topics"] = len(names)
+        # Wait until the subscribers of the SoT are connected to the
+        # publishers. Otherwise, the first message is dropped.
+        self.queueMonitor.subscribe (names)
+        with startup.phase ("wait_for_connections"):
+            missing = self._waitForConnections (names, self.hppTopicsTimeout)
+        if len(missing) > 0:
+            msg = "Topics not connected after {} seconds: {}".format(
+                    self.hppTopicsTimeout, ", ".join (sorted (missing)))
+            rospy.logerr (msg)
+            return TriggerResponse (False, msg)
         return TriggerResponse (True, "ok")
 
+    ## Wait until a subscriber is connected to each topic.
+    # \return the topics which are not connected after \p timeout seconds.
+    def _waitForConnections (self, topics, timeout):
+        import rosgraph, time
+        master = rosgraph.Master (rospy.get_name())
+        start = time.time()
+        missing = set(topics)
+        while len(missing) > 0 and time.time() - start < timeout:
+            missing -= connectedTopics (master, missing)
+            if len(missing) > 0:
+                time.sleep (0.01)
+        return missing
+
     def setBasePose (self, req):
         pose = [ req.x, req.y, req.z, req.roll, req.pitch, req.yaw ]
         if self.supervisor is not None:
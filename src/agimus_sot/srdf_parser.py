@@ -24,7 +24,9 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import xml.etree.ElementTree as ET
+import numpy as np
 
 def _read_name (xml):
     return str(xml.attrib["name"])
@@ -32,8 +34,16 @@ def _read_name (xml):
 def _read_clearance (xml):
     return float(xml.attrib.get('clearance', 0))
 
-def _read_mask (xml):
-    masksTag = xml.findall('mask')
+## Group the children of an element by tag, in one pass.
+# \return a dictionary from tag to the list of children.
+def _children (xml):
+    children = dict()
+    for child in xml:
+        children.setdefault (child.tag, []).append (child)
+    return children
+
+def _read_mask (children):
+    masksTag = children.get('mask', ())
     if len(masksTag) > 1:
         raise ValueError ("Handle needs at most one tag mask")
     elif len(masksTag) == 1:
@@ -44,12 +54,12 @@ def _read_mask (xml):
         raise ValueError ("Tag mask must contain 6 booleans")
     return tuple (mask)
 
-def _read_joints (xml):
-    jointTags = xml.findall('joint')
+def _read_joints (children):
+    jointTags = children.get('joint', ())
     return tuple ( [ jt.attrib["name"] for jt in jointTags ] )
 
-def _read_position (xml):
-    positionsTag = xml.findall('position')
+def _read_position (children):
+    positionsTag = children.get('position', ())
     if len(positionsTag) != 1:
         raise ValueError ("Gripper needs exactly one tag position")
     try:
@@ -96,38 +106,97 @@ def _read_position (xml):
     assert len(xyz_xyzw) == 7
     return tuple (xyz_xyzw)
 
-def _read_link (xml):
-    linksTag = xml.findall('link')
+def _read_link (children):
+    linksTag = children.get('link', ())
     if len(linksTag) != 1:
         raise ValueError ("Gripper needs exactly one tag link")
     return str(linksTag[0].attrib['name'])
 
-def _read_points (xml):
-    pointsTag = xml.findall('point')
+## Shapes of a contact, in compressed sparse row format.
+#
+# Shape \c i is made of the points of indices
+# \c indices[offsets[i]:offsets[i+1]]. Indexing and iterating give the
+# arrays of indices of each shape, so that it can be used as a list of
+# shapes.
+class ContactShapes(object):
+    def __init__ (self, offsets, indices):
+        self.offsets = np.asarray (offsets, dtype=int)
+        self.indices = np.asarray (indices, dtype=int)
+
+    ## Build from a list of lists of indices.
+    @classmethod
+    def fromList (cls, shapes):
+        offsets = np.zeros (len(shapes)+1, dtype=int)
+        offsets[1:] = np.cumsum ([ len(shape) for shape in shapes ])
+        indices = np.concatenate ([ np.asarray (shape, dtype=int) for shape in shapes ]) \
+                if len(shapes) > 0 else np.zeros (0, dtype=int)
+        return cls (offsets, indices)
+
+    def __len__ (self):
+        return len(self.offsets) - 1
+
+    def __getitem__ (self, i):
+        if i < 0: i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError ("shape index out of range")
+        return self.indices[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__ (self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__ (self, other):
+        if isinstance(other, (list, tuple)):
+            other = ContactShapes.fromList (other)
+        elif not isinstance(other, ContactShapes):
+            return NotImplemented
+        return np.array_equal (self.offsets, other.offsets) \
+                and np.array_equal (self.indices, other.indices)
+
+    def __ne__ (self, other):
+        res = self.__eq__ (other)
+        if res is NotImplemented: return res
+        return not res
+
+    __hash__ = None
+
+    def tolist (self):
+        return [ shape.tolist() for shape in self ]
+
+    def __repr__ (self):
+        return "ContactShapes.fromList ({})".format (self.tolist())
+
+def _read_points (children):
+    pointsTag = children.get('point', ())
     if len(pointsTag) != 1:
         raise ValueError ("Contact needs exactly one tag point")
     vals = pointsTag[0].text.split()
     if len(vals) % 3 != 0:
         raise ValueError ("point tag must contain 3*N floating point numbers. Current size is " + str(len(vals)) + ".")
-    return [ tuple([ float(v) for v in vals[i:i+3]]) for i in range(0,len(vals),3) ]
+    return np.array (vals, dtype=np.float64).reshape (-1, 3)
 
-def _read_shapes (xml):
-    shapesTag = xml.findall('shape')
+def _read_shapes (children):
+    shapesTag = children.get('shape', ())
     if len(shapesTag) != 1:
         raise ValueError ("Contact needs exactly one tag point")
-    indices = [ int(v) for v in shapesTag[0].text.split() ]
-    shapes = list()
+    values = np.array (shapesTag[0].text.split(), dtype=int)
+    # values is N0 i_0 ... i_N0-1 N1 ...: keep the indices, remove the sizes.
+    offsets = [ 0, ]
+    keep = np.ones (len(values), dtype=bool)
     i = 0
-    while i < len(indices):
-        N = indices[i]
-        shapes.append(indices[i+1:i+1+N])
+    while i < len(values):
+        N = values[i]
+        keep[i] = False
+        offsets.append (offsets[-1] + N)
         i += N+1
-    return shapes
+    if i != len(values):
+        raise ValueError ("shape tag is not a list of sizes followed by indices.")
+    return ContactShapes (offsets, values[keep])
 
 # Torque constants should not appear in gripper tag.
 # There should be one value for each actuated joint.
-def _read_torque_constant (xml):
-    tcTags = xml.findall('torque_constant')
+def _read_torque_constant (children):
+    tcTags = children.get('torque_constant', ())
     if len(tcTags) > 1:
         raise ValueError ("Gripper needs at most one tag torque_constant")
     elif len(tcTags) == 1:
@@ -135,45 +204,93 @@ def _read_torque_constant (xml):
     else:
         return None
 
+def _read_gripper (xml, prefix):
+    children = _children (xml)
+    g = { "robot":     prefix,
+          "name":      _read_name (xml),
+          "clearance": _read_clearance (xml),
+          "link":      _read_link (children),
+          "position":  _read_position (children),
+          "joints":    _read_joints (children),
+          }
+    tc = _read_torque_constant (children)
+    if tc is not None: g["torque_constant"] = tc
+    return g
+
+def _read_handle (xml, prefix):
+    children = _children (xml)
+    return { "robot":     prefix,
+             "name":      _read_name (xml),
+             "clearance": _read_clearance (xml),
+             "link":      _read_link (children),
+             "position":  _read_position (children),
+             "mask":      _read_mask (children),
+             }
+
+def _read_contact (xml, prefix):
+    children = _children (xml)
+    return { "robot":  prefix,
+             "name":   _read_name (xml),
+             "link":   _read_link (children),
+             "points": _read_points (children),
+             "shapes": _read_shapes (children),
+             }
+
+## For each tag, the key of the result and the function reading the element.
+_readers = {
+        "gripper": ("grippers", _read_gripper),
+        "handle":  ("handles",  _read_handle),
+        "contact": ("contacts", _read_contact),
+        }
+
+## Read an element if it is a gripper, a handle or a contact.
+# \return whether the element was read.
+def _read_element (xml, prefix, res):
+    try:
+        key, read = _readers[xml.tag]
+    except KeyError:
+        return False
+    d = read (xml, prefix)
+    n = d["name"]
+    res[key][ prefix + "/" + n if prefix is not None else n] = d
+    return True
+
 def _parse_tree (root, prefix = None):
-    grippers = {}
-    for xml in root.iter('gripper'):
-        n = _read_name (xml)
-        g = { "robot":     prefix,
-              "name":      n,
-              "clearance": _read_clearance (xml),
-              "link":      _read_link (xml),
-              "position":  _read_position (xml),
-              "joints":    _read_joints (xml),
-              }
-        tc = _read_torque_constant (xml)
-        if tc is not None: g["torque_constant"] = tc
-        grippers[ prefix + "/" + n if prefix is not None else n] = g
-
-    handles = {}
-    for xml in root.iter('handle'):
-        n = _read_name (xml)
-        h = { "robot":     prefix,
-              "name":      n,
-              "clearance": _read_clearance (xml),
-              "link":      _read_link (xml),
-              "position":  _read_position (xml),
-              "mask":      _read_mask (xml),
-              }
-        handles[ prefix + "/" + n if prefix is not None else n] = h
-
-    contacts = {}
-    for xml in root.iter('contact'):
-        n = _read_name (xml)
-        c = { "robot":  prefix,
-              "name":   n,
-              "link":   _read_link (xml),
-              "points": _read_points (xml),
-              "shapes": _read_shapes (xml),
-              }
-        contacts[ prefix + "/" + n if prefix is not None else n] = c
-
-    return { "grippers": grippers, "handles": handles, "contacts": contacts}
+    res = { "grippers": {}, "handles": {}, "contacts": {} }
+    for xml in root.iter():
+        _read_element (xml, prefix, res)
+    return res
+
+## Parse a SRDF document in one pass, without building the whole tree.
+#
+# The elements are freed as soon as they are read. The elements that are
+# not read (links, collision pairs...) are freed when they are closed.
+# \param source a file name or a file object.
+def _parse_file (source, prefix = None):
+    res = { "grippers": {}, "handles": {}, "contacts": {} }
+    # Depth of the element being parsed and number of enclosing
+    # gripper, handle or contact, whose children must be kept.
+    depth = 0
+    reading = 0
+    root = None
+    for event, xml in ET.iterparse (source, events = ("start", "end")):
+        if event == "start":
+            if root is None: root = xml
+            depth += 1
+            if xml.tag in _readers:
+                reading += 1
+            continue
+        depth -= 1
+        if xml.tag in _readers:
+            reading -= 1
+            _read_element (xml, prefix, res)
+        if reading == 0:
+            if depth == 1:
+                # Remove the children of the root that are closed.
+                del root[:]
+            elif depth > 1:
+                xml.clear()
+    return res
 
 def parse_srdf_string (srdf, prefix = None):
     """
@@ -185,25 +302,126 @@ def parse_srdf_string (srdf, prefix = None):
     root = ET.fromstring (srdf)
     return _parse_tree (root, prefix = prefix)
 
-def parse_srdf (srdf, packageName = None, prefix = None):
+## Paths of the ROS packages, computed once per process.
+_packagePaths = dict()
+_rospack = None
+
+def package_path (packageName):
+    """
+    Path of a ROS package. The result of rospkg.RosPack.get_path is memoized.
+    """
+    global _rospack
+    try:
+        return _packagePaths[packageName]
+    except KeyError:
+        pass
+    if _rospack is None:
+        from rospkg import RosPack
+        _rospack = RosPack()
+    path = _packagePaths[packageName] = _rospack.get_path(packageName)
+    return path
+
+## Directory where the parsed SRDF files are stored. The cache is disabled
+# unless a directory is given, here or with environment variable
+# AGIMUS_SOT_SRDF_CACHE. The values are read with pickle: the directory
+# must only be writable by trusted users.
+cacheDirectory = os.environ.get ("AGIMUS_SOT_SRDF_CACHE", "")
+## The cache.Cache of parsed SRDF files.
+srdfCache = None
+## Increment when the content of the dictionaries returned by parse_srdf
+# changes, so that the cached values are not used anymore.
+formatVersion = 2
+
+def _cache (directory):
+    global srdfCache
+    if srdfCache is None or srdfCache.directory != directory:
+        from .cache import Cache
+        srdfCache = Cache (directory, "srdf_")
+    return srdfCache
+
+def parse_srdf (srdf, packageName = None, prefix = None, cacheDir = None):
     """
     parameters:
     - srdf: path to a SRDF file.
     - packageName: if provided, the filename is considered relative to this ROS package
     - prefix: if provided, the name of the elements will be prepended with
              prefix + "/"
+    - cacheDir: directory where the result is cached. The key is a hash of
+                the content of the file. Defaults to cacheDirectory. If
+                empty, which is the default, the cache is not used.
     """
-    import os
     if packageName is not None:
-        from rospkg import RosPack
-        rospack = RosPack()
-        path = rospack.get_path(packageName)
-        srdfFn = os.path.join(path, srdf)
+        srdfFn = os.path.join(package_path(packageName), srdf)
     else:
         srdfFn = srdf
+    if cacheDir is None:
+        cacheDir = cacheDirectory
+
+    from .timing import startup
+    with startup.phase ("parse_srdf") as p:
+        p["counts"]["files"] = 1
+        if not cacheDir:
+            return _parse_file (srdfFn, prefix=prefix)
+        with open (srdfFn, "rb") as f:
+            content = f.read()
+        import hashlib, io
+        cache = _cache (cacheDir)
+        key = cache.key (formatVersion, hashlib.sha1(content).hexdigest(), prefix)
+        hits = cache.hits
+        res = cache.get (key, lambda: _parse_file (io.BytesIO (content), prefix=prefix))
+        p["counts"]["cached"] = cache.hits - hits
+    return res
+
+def transform_points(M, points):
+    """
+    Apply a rigid transformation to points.
+    - M: a pinocchio.SE3,
+    - points: a Nx3 array, or a list of 3D points.
+    Returns a new Nx3 array.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    return points.dot(M.rotation.T) + M.translation
+
+def transform_xyzquat(M, poses):
+    """
+    Compose a rigid transformation with poses.
+    - M: a pinocchio.SE3,
+    - poses: a Nx7 array, or a list of poses (x, y, z, qx, qy, qz, qw).
+    Returns a new Nx7 array of the poses M * pose, with unit quaternions.
+    """
+    import pinocchio
+    poses = np.asarray(poses, dtype=np.float64).reshape(-1, 7)
+    res = np.empty_like(poses)
+    res[:,:3] = transform_points(M, poses[:,:3])
+    x0, y0, z0, w0 = pinocchio.SE3ToXYZQUAT(M)[3:]
+    x, y, z, w = poses[:,3], poses[:,4], poses[:,5], poses[:,6]
+    res[:,3] = w0*x + x0*w + y0*z - z0*y
+    res[:,4] = w0*y + y0*w + z0*x - x0*z
+    res[:,5] = w0*z + z0*w + x0*y - y0*x
+    res[:,6] = w0*w - x0*x - y0*y - z0*z
+    res[:,3:] /= np.linalg.norm(res[:,3:], axis=1)[:,np.newaxis]
+    return res
+
+## Frame indices by name, per pinocchio.Model
+_frameIndices = dict()
 
-    tree = ET.parse (srdfFn)
-    return _parse_tree (tree.getroot(), prefix=prefix)
+def frame_index_table(model):
+    """
+    Dictionary from the names of the frames of a pinocchio.Model to their
+    indices. It is built once per model and rebuilt if frames are added.
+    """
+    try:
+        m, nframes, table = _frameIndices[id(model)]
+        if m is model and nframes == model.nframes:
+            return table
+    except KeyError:
+        pass
+    table = dict()
+    for i, frame in enumerate(model.frames):
+        # Model.getFrameId returns the first frame with this name.
+        table.setdefault(frame.name, i)
+    _frameIndices[id(model)] = (model, model.nframes, table)
+    return table
 
 def attach_to_link(model, link, gripper=None, handle=None, contact=None):
     """
@@ -216,8 +434,9 @@ def attach_to_link(model, link, gripper=None, handle=None, contact=None):
     if int(gripper is None) + int(handle is None) + int(contact is None) != 2:
         raise ValueError("Exactly one of {gripper, handle, contact} should be provided")
     srdf = ( contact if handle is None else handle ) if gripper is None else gripper
-    oid = model.getFrameId(srdf['link'])
-    nid = model.getFrameId(link)
+    table = frame_index_table(model)
+    oid = table.get(srdf['link'], model.nframes)
+    nid = table.get(link, model.nframes)
     if oid >= model.nframes:
         raise ValueError("Could not find frame '{}'".format(srdf['link']))
     if nid >= model.nframes:
@@ -228,23 +447,63 @@ def attach_to_link(model, link, gripper=None, handle=None, contact=None):
     if of.parent != nf.parent:
         raise RuntimeError("The frames are not attached to the same joint")
     srdf['link'] = nf.name
+    jMnl = nf.placement
+    jMol = of.placement
+    nlMol = jMnl.inverse() * jMol
     if contact is not None:
         # Change srdf['points'] from old link to new link
-        raise NotImplementedError("Need to change srdf['points'] from old link to new link")
-    else:
+        srdf["points"] = transform_points(nlMol, srdf["points"])
+    if "position" in srdf:
         olMf = pinocchio.XYZQUATToSE3(srdf["position"])
-        jMnl = nf.placement
-        jMol = of.placement
-        nlMf = jMnl.inverse() * jMol * olMf
+        nlMf = nlMol * olMf
         srdf["position"] = pinocchio.SE3ToXYZQUAT(nlMf)
 
 def attach_all_to_link(model, link, srdf_content, grippers=True, handles=True, contacts=True):
-    if grippers:
-        for gripper in srdf_content["grippers"].values():
-            attach_to_link(model, link, gripper=gripper)
-    if handles:
-        for handle in srdf_content["handles"].values():
-            attach_to_link(model, link, handle=handle)
-    if contacts:
-        for contact in srdf_content["contacts"].values():
-            attach_to_link(model, link, contact=contact)
+    """
+    Attach the grippers, handles and contacts of srdf_content to a different
+    link. See attach_to_link.
+
+    The elements are grouped by link. The placements of the elements of a
+    group and the points of its contacts are transformed at once.
+    Nothing is modified if an element cannot be attached.
+    """
+    table = frame_index_table(model)
+    nid = table.get(link, model.nframes)
+    if nid >= model.nframes:
+        raise ValueError("Could not find frame '{}'".format(link))
+    nf = model.frames[nid]
+    elements = []
+    if grippers: elements += [ (srdf, False) for srdf in srdf_content["grippers"].values() ]
+    if handles:  elements += [ (srdf, False) for srdf in srdf_content["handles"].values() ]
+    if contacts: elements += [ (srdf, True ) for srdf in srdf_content["contacts"].values() ]
+
+    # For each link, the elements with a position and the contacts.
+    groups = dict()
+    for srdf, isContact in elements:
+        oid = table.get(srdf['link'], model.nframes)
+        if oid >= model.nframes:
+            raise ValueError("Could not find frame '{}'".format(srdf['link']))
+        if oid == nid: continue
+        posed, contactList = groups.setdefault(oid, ([], []))
+        if "position" in srdf: posed.append(srdf)
+        if isContact: contactList.append(srdf)
+    frames = { oid: model.frames[oid] for oid in groups }
+    for of in frames.values():
+        if of.parent != nf.parent:
+            raise RuntimeError("The frames are not attached to the same joint")
+
+    jMnl = nf.placement
+    for oid, (posed, contactList) in groups.items():
+        nlMol = jMnl.inverse() * frames[oid].placement
+        if len(posed) > 0:
+            poses = transform_xyzquat(nlMol, [ srdf["position"] for srdf in posed ])
+            for srdf, pose in zip(posed, poses):
+                srdf["position"] = pose
+                srdf["link"] = nf.name
+        if len(contactList) > 0:
+            points = [ np.asarray(c["points"], dtype=np.float64).reshape(-1, 3) for c in contactList ]
+            sizes = np.cumsum([ len(p) for p in points ])
+            moved = transform_points(nlMol, np.concatenate(points))
+            for c, p in zip(contactList, np.split(moved, sizes[:-1])):
+                c["points"] = p
+                c["link"] = nf.name
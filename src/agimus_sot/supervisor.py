@@ -26,6 +26,8 @@
 
 from __future__ import print_function
 from .task import Task, Posture
+from .action import ActionRecipe
+from .timing import startup
 from dynamic_graph import plug
 from dynamic_graph.sot.core.feature_posture import FeaturePosture
 import sys
@@ -39,6 +41,22 @@ def _lpTasks (sotrobot):
 #
 # Typically, these actions are created via factory.Factory. They can also be added manually.
 class Supervisor(object):
+    ## Initial number of slots of the switch, the events and the profiler.
+    # It doubles when needed. \sa reserveSlots
+    slotCapacity = 64
+    ## Whether the number of slots is fixed. \sa lockSlots
+    slotsLocked = False
+    ## Number of free slots kept by lockSlots for the actions added while
+    # the graph runs. \sa lockSlots
+    slotHeadroom = 64
+    ## Number of actions whose control can be computed in advance at once.
+    # \sa prewarm
+    prewarmSlots = 4
+    ## Number of buckets of the histograms of the profiler.
+    profilerBuckets = 200
+    ## Width of the buckets of the profiler, in seconds.
+    profilerBucketWidth = 1e-5
+
     """
     Steps: P = placement, G = grasp, p = pre-P, g = pre-G
     0. P <-> GP
@@ -61,9 +79,51 @@ class Supervisor(object):
         self.hpTasks = hpTasks if hpTasks is not None else _hpTasks(sotrobot)
         self.lpTasks = lpTasks if lpTasks is not None else _lpTasks(sotrobot)
         self.currentSot = None
+        ## Number of transitions to build in advance when actions are
+        # created lazily. See factory.Factory parameter \c "lazyActions".
+        self.prefetchActions = 0
+        self.successors = dict()
+        ## Transitions that the current mission may run. See setMission.
+        self.mission = None
+        self.missionDepth = 0
+        ## Whether the actions likely to be selected next are computed in
+        # advance. \sa prewarm
+        self.prewarmActions = False
+        ## Index in \c self.prewarmSwitches of the actions computed in
+        # advance, by action name.
+        self.prewarmed = dict()
+        ## Time (in seconds) each queue took to be filled, during the
+        # latest call to waitForQueue.
+        self.queueFillTimes = dict()
         from dynamic_graph.sot.core.switch import SwitchVector
         self.sot_switch = SwitchVector ("sot_supervisor_switch")
-        plug(self.sot_switch.sout, self.sotrobot.device.control)
+        ## Switches whose output is computed by the device after each
+        # period. Their inputs are plugged as those of \c self.sot_switch and
+        # their selection follows it unless an action is computed in
+        # advance. \sa prewarm
+        self.prewarmSwitches = [ SwitchVector ("sot_supervisor_prewarm_switch_" + str(i))
+                for i in range(self.prewarmSlots) ]
+        for switch in self.prewarmSwitches:
+            plug (self.sot_switch.selection, switch.selection)
+        ## Histograms of the computation time of the control, per action.
+        # \sa profile
+        from agimus_sot.sot import ControlProfiler
+        self.profiler = ControlProfiler ("sot_supervisor_profiler")
+        self.profiler.setPeriod (self.sotrobot.device.getTimeStep())
+        self.profiler.setBucketWidth (self.profilerBucketWidth)
+        plug(self.sot_switch.sout, self.profiler.sin)
+        # The profiler reads the selection of the switch, so that both
+        # change during the same period.
+        plug(self.sot_switch.selection, self.profiler.selection)
+        plug(self.profiler.sout, self.sotrobot.device.control)
+        ## Copy of the current control and of the control of another action,
+        # made by the real-time thread. \sa isSotConsistentWithCurrent
+        from agimus_sot.sot import ControlSnapshot
+        self.controlSnapshot = ControlSnapshot ("sot_supervisor_control_snapshot")
+        # The buffers are allocated here, never by the real-time thread.
+        self.controlSnapshot.setSize (self.sotrobot.dynamic.getDimension())
+        plug(self.sot_switch.sout, self.controlSnapshot.current)
+        self.sotrobot.device.after.addSignal (self.controlSnapshot.name + ".trigger")
 
         from agimus_sot.events import Events
         self. done_events = Events ("done" , sotrobot)
@@ -71,6 +131,10 @@ class Supervisor(object):
         self. done_events.setupNormOfControl (sotrobot.device.control, 1e-2)
         self. done_events.setupTime () # For signal self. done_events.timeEllapsedSignal
         self.error_events.setupTime () # For signal self.error_events.timeEllapsedSignal
+        ## Slot of the switch of each action, by action name.
+        self.action_indices = dict()
+        capacity, self.slotCapacity = self.slotCapacity, 0
+        self.reserveSlots (capacity)
 
     def makeInitialSot (self):
         # Create the initial sot (keep)
@@ -85,6 +149,9 @@ class Supervisor(object):
         sot. doneSignal = self.done_events.controlNormSignal
         sot.errorSignal = False
         self.addAction ("", sot)
+        # Registered once: prewarm only changes their selection.
+        for switch in self.prewarmSwitches:
+            self.sotrobot.device.after.addSignal (switch.name + ".sout")
 
     ## Set the robot base pose in the world.
     # \param basePose a list: [x,y,z,r,p,y] or [x,y,z,qx,qy,qz,qw]
@@ -120,6 +187,9 @@ class Supervisor(object):
         print('Supervisor.addSolver is deprecated. Use Supervisor.addAction instead.')
         self.addAction(name, action)
 
+    ## Add an Action
+    # \param action either an action.Action or an action.ActionRecipe.
+    #        In the latter case, the Action is built when first needed.
     def addAction (self, name, action):
         self.actions[name] = action
         self._addSignalToSotSwitch (action)
@@ -132,16 +202,59 @@ class Supervisor(object):
         for targetState, pa_sot in postActionSolvers.items():
             self._addSignalToSotSwitch (pa_sot)
 
+    ## Make sure the switch, the events and the profiler have at least \p n slots.
+    #
+    # The number of signals of each entity is set at once. Call it before
+    # adding many actions. Unused slots are left unplugged.
+    # \p n is rounded up to a multiple of the initial capacity.
+    #
+    # The signals of the switch and of the events are reallocated, which
+    # must not happen while the real-time thread computes them. Once
+    # lockSlots was called, this raises RuntimeError when more slots are
+    # needed than the headroom left by lockSlots.
+    def reserveSlots (self, n):
+        if n <= self.slotCapacity: return
+        if self.slotsLocked:
+            raise RuntimeError ("Cannot resize the switch of the supervisor to {} slots "
+                    "while the graph is running. {} slots were reserved."
+                    .format (n, self.slotCapacity))
+        block = max (1, type(self).slotCapacity)
+        n = block * ((n + block - 1) // block)
+        self.slotCapacity = n
+        self.sot_switch.setSignalNumber(n)
+        for switch in self.prewarmSwitches:
+            switch.setSignalNumber(n)
+        self. done_events.setSignalNumber(n)
+        self.error_events.setSignalNumber(n)
+        self.profiler.setSize (n, self.profilerBuckets)
+
+    ## Fix the number of slots of the switch, the events and the profiler.
+    #
+    # To be called just before starting the dynamic graph. \p headroom free
+    # slots are reserved first, for the actions built lazily and those added
+    # by Factory.regenerate while the graph runs. Afterwards, reserveSlots
+    # refuses to grow them and releaseActions does not shrink them.
+    # \param headroom defaults to slotHeadroom.
+    def lockSlots (self, headroom = None):
+        if self.slotsLocked: return
+        if headroom is None: headroom = self.slotHeadroom
+        self.reserveSlots (len(self.action_indices) + headroom)
+        self.slotsLocked = True
+
     ## This is for internal purpose
     def _addSignalToSotSwitch (self, action):
-        n = self.sot_switch.getSignalNumber()
-        self.sot_switch.setSignalNumber(n+1)
+        if isinstance(action, ActionRecipe) or action.name in self.action_indices:
+            return
+        # Slots are kept contiguous (see _compactSotSwitch).
+        n = len(self.action_indices)
+        if n >= self.slotCapacity:
+            self.reserveSlots (max (2 * self.slotCapacity, n + 1))
         self.action_indices[action.name] = n
         plug (action.control, self.sot_switch.signal("sin" + str(n)))
+        for switch in self.prewarmSwitches:
+            plug (action.control, switch.signal("sin" + str(n)))
 
         def _plug (e, events, n, name):
-            assert events.getSignalNumber() == n, "Wrong number of events."
-            events.setSignalNumber(n+1)
             events.setConditionString(n, name)
             if isinstance(e, (bool,int)): events.conditionSignal(n).value = e
             else: plug (e, events.conditionSignal(n))
@@ -149,6 +262,239 @@ class Supervisor(object):
         _plug (action. doneSignal, self. done_events, n, action.name)
         _plug (action.errorSignal, self.error_events, n, action.name)
 
+    ## Get an Action, building it if it is an action.ActionRecipe.
+    # \param actions one of \c self.actions, \c self.preActions or
+    #        a value of \c self.postActions.
+    def _getAction (self, actions, key):
+        action = actions[key]
+        if isinstance(action, ActionRecipe):
+            action = action()
+            actions[key] = action
+            self._addSignalToSotSwitch (action)
+        return action
+
+    ## Build the actions of the transitions likely to be run after \p transitionName.
+    #
+    # The post-actions of \p transitionName and the pre-actions, actions
+    # and post-actions of at most \p n successors are built.
+    # This is only useful when actions are created lazily.
+    # \param n number of successors. Defaults to \c self.prefetchActions.
+    def prefetch (self, transitionName, n = None):
+        if n is None: n = self.prefetchActions
+        def _postActions (tn):
+            d = self.postActions.get(tn, {})
+            for k in d.keys(): self._getAction (d, k)
+
+        _postActions (transitionName)
+        queue = list(self.successors.get(transitionName, ()))
+        while n > 0 and len(queue) > 0:
+            tn = queue.pop(0)
+            if tn in self.preActions: self._getAction (self.preActions, tn)
+            if tn in self.actions: self._getAction (self.actions, tn)
+            _postActions (tn)
+            queue.extend (self.successors.get(tn, ()))
+            n -= 1
+
+    ## Set the transitions that the current mission may run.
+    #
+    # \param transitionNames names of the transitions,
+    # \param depth number of successors (see \c self.successors) of these
+    #        transitions which may run as well.
+    # \sa releaseActions
+    def setMission (self, transitionNames, depth = 0):
+        self.mission = set(transitionNames)
+        self.missionDepth = depth
+
+    ## Names of the transitions reachable from the current mission.
+    #
+    # The action "" (keeping the current posture) and the current action
+    # are always reachable.
+    def reachableTransitions (self):
+        reachable = set ([ "", self.currentSot ])
+        if self.mission is None:
+            return reachable.union (self.actions.keys())
+        reachable.update (self.mission)
+        queue = list(self.mission)
+        for i in range(self.missionDepth):
+            queue = [ s for tn in queue for s in self.successors.get(tn, ())
+                    if s not in reachable ]
+            reachable.update (queue)
+        return reachable
+
+    ## Delete the actions which are not reachable from the current mission.
+    #
+    # The actions, pre-actions and post-actions of the transitions which
+    # are not reachable are removed. An action is deleted when no
+    # transition refers to it anymore. Its inputs of the switch and of the
+    # events are unplugged, its entities are deleted and the slots of the
+    # remaining actions are compacted, updating \c self.action_indices.
+    # The action currently selected is never deleted.
+    #
+    # The statistics of the profiler are reset since the slots change.
+    # \return a dictionary with keys
+    #         \li \c "transitions": number of transitions removed,
+    #         \li \c "actions": number of actions deleted,
+    #         \li \c "slots": number of slots of the switch reclaimed,
+    #         \li \c "entities": number of entities deleted,
+    #         \li \c "memory": resident memory reclaimed, in bytes, or None.
+    # \sa setMission, reachableTransitions
+    def releaseActions (self):
+        import gc
+        from .tools import residentMemory
+        memory = residentMemory()
+        reachable = self.reachableTransitions()
+        selected = self.sot_switch.selection.value
+
+        # Count the references to each action.
+        def entries ():
+            for d in [ self.actions, self.preActions ] + list(self.postActions.values()):
+                for a in d.values(): yield a
+        refs = dict()
+        for a in entries():
+            refs[id(a)] = refs.get(id(a), 0) + 1
+
+        # Never delete the selected action: it is kept with its transition.
+        selectedNames = set ([ name for name, n in self.action_indices.items()
+            if n == selected ])
+        released = []
+        def release (d, key):
+            if getattr(d[key], "name", None) in selectedNames: return
+            a = d.pop (key)
+            refs[id(a)] -= 1
+            if refs[id(a)] == 0 and not isinstance(a, ActionRecipe) \
+                    and a.name in self.action_indices:
+                released.append (a)
+        removed = [ tn for tn in set(self.actions.keys()).union (self.preActions.keys(),
+            self.postActions.keys()) if tn not in reachable ]
+        for tn in removed:
+            if tn in self.actions: release (self.actions, tn)
+            if tn in self.preActions: release (self.preActions, tn)
+            d = self.postActions.get (tn, {})
+            for k in list(d.keys()): release (d, k)
+            if len(d) == 0: self.postActions.pop (tn, None)
+            self.successors.pop (tn, None)
+        removed = [ tn for tn in removed if tn not in self.actions
+                and tn not in self.preActions and tn not in self.postActions ]
+
+        entities = [ self._releaseAction (a) for a in released ]
+        nActions = len(released)
+        del released[:]
+        if nActions > 0:
+            self._compactSotSwitch ()
+        gc.collect()
+        after = residentMemory()
+        return { "transitions": len(removed),
+                 "actions": nActions,
+                 "slots": nActions,
+                 "entities": sum(entities),
+                 "memory": memory - after if memory is not None and after is not None else None,
+                 }
+
+    ## Unplug an action from the switch and the events and delete its entities.
+    #
+    # The entities of an action whose signals are traced (see Action.traced)
+    # are kept.
+    # \return the number of entities deleted.
+    def _releaseAction (self, action):
+        from .tools import deleteEntity
+        self._stopPrewarm (action.name)
+        n = self.action_indices.pop (action.name)
+        self.sot_switch.signal("sin" + str(n)).unplug()
+        for switch in self.prewarmSwitches:
+            switch.signal("sin" + str(n)).unplug()
+        self. done_events.conditionSignal(n).unplug()
+        self.error_events.conditionSignal(n).unplug()
+        if action.traced: return 0
+        return len([ e for e in action.entities if deleteEntity (e) ])
+
+    ## Move the actions to the lowest slots of the switch.
+    #
+    # An action is plugged to its new slot before the selection is
+    # changed so that the control remains valid at every step.
+    def _compactSotSwitch (self):
+        actions = dict()
+        for d in [ self.actions, self.preActions ] + list(self.postActions.values()):
+            for a in d.values():
+                if not isinstance(a, ActionRecipe): actions[a.name] = a
+        selected = self.sot_switch.selection.value
+        def _plug (e, events, n, name):
+            events.setConditionString(n, name)
+            if isinstance(e, (bool,int)): events.conditionSignal(n).value = e
+            else: plug (e, events.conditionSignal(n))
+
+        for i, (old, name) in enumerate(sorted ([ (n, name)
+            for name, n in self.action_indices.items() ])):
+            if i == old: continue
+            action = actions[name]
+            plug (action.control, self.sot_switch.signal("sin" + str(i)))
+            for switch in self.prewarmSwitches:
+                plug (action.control, switch.signal("sin" + str(i)))
+            _plug (action. doneSignal, self. done_events, i, name)
+            _plug (action.errorSignal, self.error_events, i, name)
+            self.action_indices[name] = i
+            if name in self.prewarmed:
+                self.prewarmSwitches[self.prewarmed[name]].selection.value = i
+            if old == selected:
+                self.  sot_switch.selection.value = i
+                self. done_events.setSelectedSignal(i)
+                self.error_events.setSelectedSignal(i)
+        n = len(self.action_indices)
+        for events in (self.done_events, self.error_events):
+            for i in list(events.switch_string.keys()):
+                if i >= n: del events.switch_string[i]
+        # Shrink the entities, keeping some free slots, unless the graph runs.
+        if not self.slotsLocked:
+            self.slotCapacity = 0
+            self.reserveSlots (max (n, 1))
+        self.profiler.reset()
+
+    ## Compute the control of the actions of a transition before they are selected.
+    #
+    # The control signal of the pre-action, the action and the post-actions of
+    # \p transitionName are computed by the device after each control
+    # period, until an action is selected. The first computation of an
+    # action, which allocates memory and fills the caches of its tasks,
+    # thus happens in the real-time thread before the action is selected.
+    # The actions are built if needed.
+    #
+    # The list of signals of the device is never modified: each action is
+    # selected in one of the \c self.prewarmSwitches, which the device
+    # computes after each period. At most \c prewarmSlots actions are
+    # computed in advance at once. The others are skipped.
+    # \sa prewarmActions, profile
+    def prewarm (self, transitionName):
+        actions = []
+        if transitionName in self.preActions:
+            actions.append (self._getAction (self.preActions, transitionName))
+        if transitionName in self.actions:
+            actions.append (self._getAction (self.actions, transitionName))
+        d = self.postActions.get (transitionName, {})
+        for k in d.keys():
+            actions.append (self._getAction (d, k))
+        self._prewarm (actions)
+        return True, ""
+
+    def _prewarm (self, actions):
+        selected = self.sot_switch.selection.value
+        free = sorted (set(range(len(self.prewarmSwitches)))
+                .difference (self.prewarmed.values()), reverse=True)
+        for a in actions:
+            if a.name in self.prewarmed or self.action_indices[a.name] == selected:
+                continue
+            if len(free) == 0: break
+            i = free.pop()
+            self.prewarmSwitches[i].selection.value = self.action_indices[a.name]
+            self.prewarmed[a.name] = i
+
+    ## The switch of the action goes back to the selection of \c self.sot_switch,
+    # whose control is already computed.
+    def _stopPrewarm (self, name = None):
+        names = list(self.prewarmed.keys()) if name is None else [ name, ]
+        for n in names:
+            if n in self.prewarmed:
+                switch = self.prewarmSwitches[self.prewarmed.pop (n)]
+                plug (self.sot_switch.selection, switch.selection)
+
     def _selectSolver (self, action):
         res, msg = action.runPreactions()
         if not res:
@@ -157,10 +503,53 @@ class Supervisor(object):
         self.  sot_switch.selection.value = n
         self. done_events.setSelectedSignal(n)
         self.error_events.setSelectedSignal(n)
+        self._stopPrewarm ()
         return True, ""
 
     ## \}
 
+    ## Computation time of the control, per action.
+    #
+    # \return a dictionary whose keys are the action names and values
+    #         are dictionaries with keys
+    #         \li \c "count": number of control computations,
+    #         \li \c "p50", \c "p99": median and 99th percentile, in seconds,
+    #         \li \c "max": maximal duration, in seconds,
+    #         \li \c "overruns": number of durations above the period,
+    #         \li \c "first", \c "first_max": latest and maximal duration
+    #             of the first computation after the action was selected.
+    #             Compare them with and without \ref prewarmActions.
+    #
+    # Percentiles are upper bounds with the resolution of the histograms.
+    def profile (self):
+        t = self.sotrobot.device.control.time
+        self.profiler.histograms.recompute (t)
+        self.profiler.statistics.recompute (t)
+        histograms = self.profiler.histograms.value
+        statistics = self.profiler.statistics.value
+        w = self.profilerBucketWidth
+        def percentile (h, q, maxDuration):
+            threshold = q * sum(h)
+            cumulated = 0
+            for i, c in enumerate(h[:-1]):
+                cumulated += c
+                if cumulated >= threshold:
+                    return min ((i+1) * w, maxDuration)
+            return maxDuration
+        res = dict()
+        for name, i in self.action_indices.items():
+            if i >= len(statistics) or statistics[i][0] == 0: continue
+            count, maxDuration, overruns, last, first, firstMax = statistics[i][:6]
+            res[name] = { "count": int(count),
+                    "p50": float(percentile (histograms[i], 0.5, maxDuration)),
+                    "p99": float(percentile (histograms[i], 0.99, maxDuration)),
+                    "max": float(maxDuration),
+                    "overruns": int(overruns),
+                    "first": float(first),
+                    "first_max": float(firstMax),
+                    }
+        return res
+
     def topics (self):
         c = self.hpTasks + self.lpTasks
         for g in self.grasps.values():
@@ -170,16 +559,34 @@ class Supervisor(object):
 
         return c.topics
 
+    ## Plug the topics of the tasks to ROS.
+    #
+    # It can be called again after Factory.regenerate: only the topics and
+    # the signals which are not plugged yet are.
     def plugTopicsToRos (self):
-        from dynamic_graph.ros.ros_queued_subscribe import RosQueuedSubscribe
-        self.rosSubscribe = RosQueuedSubscribe ('ros_queued_subscribe')
-        from dynamic_graph.ros.ros_tf_listener import RosTfListener
-        self.rosTf = RosTfListener ('ros_tf_listener')
-        topics = self.topics()
-
-        for name, topic_info in topics.items():
-            topic_handler = _handlers[topic_info.get("handler","default")]
-            topic_handler (name,topic_info,self.rosSubscribe,self.rosTf)
+        if not hasattr(self, "rosSubscribe"):
+            from dynamic_graph.ros.ros_queued_subscribe import RosQueuedSubscribe
+            self.rosSubscribe = RosQueuedSubscribe ('ros_queued_subscribe')
+            from dynamic_graph.ros.ros_tf_listener import RosTfListener
+            self.rosTf = RosTfListener ('ros_tf_listener')
+            ## Signal getters plugged, per topic name.
+            self.pluggedTopics = dict()
+        with startup.phase ("plugTopicsToRos") as p:
+            topics = self.topics()
+            p["counts"]["topics"] = len(topics)
+
+            for name, topic_info in topics.items():
+                topic_handler = _handlers[topic_info.get("handler","default")]
+                plugged = self.pluggedTopics.get(name, None)
+                if plugged is None:
+                    topic_handler (name,topic_info,self.rosSubscribe,self.rosTf)
+                else:
+                    getters = [ s for s in topic_info['signalGetters'] if s not in plugged ]
+                    if len(getters) == 0: continue
+                    ti = dict(topic_info)
+                    ti['signalGetters'] = getters
+                    topic_handler (name,ti,self.rosSubscribe,self.rosTf,new=False)
+                self.pluggedTopics[name] = list(topic_info['signalGetters'])
 
     def printQueueSize (self):
         for l in self.rosSubscribe.list():
@@ -187,23 +594,44 @@ class Supervisor(object):
 
     ## Check consistency between two Actions.
     #
-    # This is not used anymore because it must be synchronized with the real-time thread.
-    # \todo Re-enable consistency check between two Actions.
-    def isSotConsistentWithCurrent(self, transitionName, thr = 1e-3):
+    # The control of the action of \p transitionName and the current control
+    # are computed during the same period by the real-time thread, which
+    # copies them in \c self.controlSnapshot. This thread waits for the copy
+    # and compares them. No signal computed by the real-time thread is
+    # recomputed here.
+    # \param thr threshold on the norm of the difference,
+    # \param timeout time in seconds to wait for the copy.
+    # \return False if the controls differ or if no copy was made before
+    #         \p timeout. In the latter case, the request is cancelled and
+    #         the action is unplugged from the snapshot.
+    def isSotConsistentWithCurrent(self, transitionName, thr = 1e-3, timeout = 1.):
         if self.currentSot is None or transitionName == self.currentSot:
             return True
-        csot = self.actions[self.currentSot]
-        nsot = self.actions[transitionName]
-        t = self.sotrobot.device.control.time
-        # This is not safe since it would be run concurrently with the
-        # real time thread.
-        csot.control.recompute(t)
-        nsot.control.recompute(t)
+        nsot = self._getAction (self.actions, transitionName)
+        plug (nsot.control, self.controlSnapshot.candidate)
+        self.controlSnapshot.request()
+        from time import sleep, time
+        start = time()
+        while not self.controlSnapshot.isReady():
+            if time() - start > timeout:
+                print ("No snapshot of the controls after {} seconds".format(timeout))
+                # The real-time thread must not read the candidate anymore.
+                self.controlSnapshot.cancel()
+                self.controlSnapshot.candidate.unplug()
+                return False
+            sleep (self.sotrobot.device.getTimeStep())
+        self.controlSnapshot.candidate.unplug()
+        t = self.controlSnapshot.getTime()
+        self.controlSnapshot.snapshot.recompute (t)
         from numpy import array, linalg
-        error = array(nsot.control.value) - array(csot.control.value)
+        snapshot = array(self.controlSnapshot.snapshot.value)
+        if snapshot.shape[1] == 0:
+            print ("Controls of different sizes")
+            return False
+        error = snapshot[1] - snapshot[0]
         n = linalg.norm(error)
         if n > thr:
-            print ("Control not consistent:", linalg.norm(error),'\n', error)
+            print ("Control not consistent:", n,'\n', error)
             return False
         return True
 
@@ -213,22 +641,38 @@ class Supervisor(object):
             print ('{} queue size: {}'.format(s, self.rosSubscribe.queueSize(s)))
             self.rosSubscribe.clearQueue(s)
 
-    ## Wait for the queue to be of a given size.
+    ## Wait for the queues to be of a given size.
     # \param minQueueSize (integer) waits to the queue size of rosSubscribe
     #                     to be greater or equal to \c minQueueSize
     # \param timeout time in seconds after which to return a failure.
     # \return True on success, False on timeout.
+    #
+    # The queues are filled at the same rate by the publisher of HPP. So,
+    # each period, only the size of the first queue which is not large
+    # enough is read. When it is, the next queues are read in the same
+    # period. The time (in seconds) each queue took to be large enough is
+    # stored in \c queueFillTimes.
+    # \sa ros_interface.QueueMonitor which waits without polling.
     def waitForQueue(self, minQueueSize, timeout):
         ts = self.sotrobot.device.getTimeStep()
         to = int(timeout / self.sotrobot.device.getTimeStep())
         from time import sleep
         start_it = self.sotrobot.device.control.time
-        for queue in self.rosSubscribe.list():
-            while self.rosSubscribe.queueSize(queue) < minQueueSize:
-                if self.sotrobot.device.control.time > start_it + to:
-                    return False, "Queue {} has received {} points.".format(queue, self.rosSubscribe.queueSize(queue))
-                sleep(ts)
-        return True, ""
+        self.queueFillTimes = dict()
+        pending = list(self.rosSubscribe.list())
+        while True:
+            it = self.sotrobot.device.control.time
+            while len(pending) > 0:
+                size = self.rosSubscribe.queueSize(pending[0])
+                if size < minQueueSize: break
+                self.queueFillTimes[pending.pop(0)] = (it - start_it) * ts
+            if len(pending) == 0:
+                return True, ""
+            if it > start_it + to:
+                sizes = [ (queue, self.rosSubscribe.queueSize(queue)) for queue in pending ]
+                return False, "\n".join ([ "Queue {} has received {} points.".format(queue, size)
+                    for queue, size in sizes if size < minQueueSize ])
+            sleep(ts)
 
     ## Start reading values received by the RosQueuedSubscribe entity.
     # \param delay (integer) how many periods to wait before reading.
@@ -285,7 +729,7 @@ class Supervisor(object):
                 # reference of posture feature has not been initialized yet
                 self.keep_posture._signalPositionRef().value = \
                     self.sotrobot.dynamic.position.value
-        action = self.actions[transitionName]
+        action = self._getAction (self.actions, transitionName)
 
         # No done events should be triggered before call
         # to readQueue. We expect it to happen with 1e6 milli-seconds
@@ -301,13 +745,18 @@ class Supervisor(object):
         self.currentSot = transitionName
         if hasattr (self, 'ros_publish_state'):
             self.ros_publish_state.signal("transition_name").value = transitionName
+        if self.prefetchActions > 0:
+            self.prefetch (transitionName)
+        if self.prewarmActions:
+            d = self.postActions.get (transitionName, {})
+            self._prewarm ([ self._getAction (d, k) for k in list(d.keys()) ])
         return True, devicetime, ""
 
     # \return success, time boolean, SoT time at which reading starts (invalid if success is False)
     def runPreAction(self, transitionName):
         t = self.sotrobot.device.control.time + 2
         if transitionName in self.preActions.keys():
-            action = self.preActions[transitionName]
+            action = self._getAction (self.preActions, transitionName)
 
             self. done_events.setFutureTime (t)
 
@@ -316,9 +765,13 @@ class Supervisor(object):
                 return False, -1, msg
             print("{0}: Running pre action {1}\n{2}"
                     .format(t, transitionName, action.sot.display()))
+            if self.prewarmActions:
+                self.prewarm (transitionName)
             return True, t - 2, ""
         else:
             print ("No pre action", transitionName)
+            if self.prewarmActions:
+                self.prewarm (transitionName)
             return True, -1, "no pre action"
 
 
@@ -329,7 +782,7 @@ class Supervisor(object):
         if self.currentSot in self.postActions.keys():
             d = self.postActions[self.currentSot]
             if targetStateName in d.keys():
-                action = d[targetStateName]
+                action = self._getAction (d, targetStateName)
 
                 self. done_events.setFutureTime (devicetime + 2)
 
@@ -344,35 +797,76 @@ class Supervisor(object):
         print ("No post action {0} --> {1}".format(self.currentSot, targetStateName))
         return True, -1, "no post action"
 
+    ## Operations accepted by runBatch.
+    batchOperations = ( "prewarm", "runPreAction", "plugSot", "runPostAction",
+            "readQueue", "waitForQueue", "clearQueues", "stopReadingQueue", )
+
+    ## Run several operations in a row.
+    #
+    # \param operations a list of tuples (method name, arguments), where
+    #        the method name must be in \ref batchOperations.
+    # \return a list of results, one per operation that was run.
+    #
+    # The operations are run in order. The execution stops at the first
+    # operation whose result is a tuple starting with False, or which
+    # raises an exception. In the latter case, its result is
+    # (False, error message).
+    #
+    # \code{.py}
+    # supervisor.runBatch ([ ("runPreAction", (transition,)),
+    #                        ("readQueue", (10, 1, duration, 3.)),
+    #                        ("plugSot", (transition, False)), ])
+    # \endcode
+    def runBatch (self, operations):
+        results = []
+        for name, args in operations:
+            if name not in self.batchOperations:
+                results.append ((False, "Operation {} is not allowed in a batch".format(name)))
+                break
+            try:
+                res = getattr(self, name) (*args)
+            except Exception as e:
+                results.append ((False, str(e)))
+                break
+            results.append (res)
+            if isinstance(res, tuple) and len(res) > 0 and res[0] is False:
+                break
+        return results
+
     def getJointList (self):
         return [self.prefix + n for n in self.sotrobot.dynamic.model.names[1:]]
 
     def publishState (self, subsampling = 40):
         if hasattr (self, "ros_publish_state"):
             return
-        from dynamic_graph.ros import RosPublish
-        self.ros_publish_state = RosPublish ("ros_publish_state")
-        self.ros_publish_state.add ("vector", "state", "/agimus/sot/state")
-        self.ros_publish_state.add ("vector", "reference_state", "/agimus/sot/reference_state")
-        self.ros_publish_state.add ("string", "transition_name",
-                                    "/agimus/sot/transition_name")
-        self.ros_publish_state.signal("transition_name").value = ""
-        plug (self.sotrobot.device.state, self.ros_publish_state.signal("state"))
-        plug (self.rosSubscribe.signal("posture"), self.ros_publish_state.signal("reference_state"))
-        self.sotrobot.device.after.addDownsampledSignal ("ros_publish_state.trigger", subsampling)
-
-def _defaultHandler(name,topic_info,rosSubscribe,rosTf):
+        with startup.phase ("publishState"):
+            from dynamic_graph.ros import RosPublish
+            self.ros_publish_state = RosPublish ("ros_publish_state")
+            self.ros_publish_state.add ("vector", "state", "/agimus/sot/state")
+            self.ros_publish_state.add ("vector", "reference_state", "/agimus/sot/reference_state")
+            self.ros_publish_state.add ("string", "transition_name",
+                                        "/agimus/sot/transition_name")
+            self.ros_publish_state.signal("transition_name").value = ""
+            plug (self.sotrobot.device.state, self.ros_publish_state.signal("state"))
+            plug (self.rosSubscribe.signal("posture"), self.ros_publish_state.signal("reference_state"))
+            self.sotrobot.device.after.addDownsampledSignal ("ros_publish_state.trigger", subsampling)
+
+## \param new whether the topic must be added. If False, only the signals
+#              are plugged.
+def _defaultHandler(name,topic_info,rosSubscribe,rosTf,new=True):
     topic = topic_info["topic"]
-    rosSubscribe.add (topic_info["type"], name, topic)
+    if new:
+        rosSubscribe.add (topic_info["type"], name, topic)
     for s in topic_info['signalGetters']:
         from dynamic_graph.signal_base import SignalBase
         plug (rosSubscribe.signal(name), s if isinstance(s, SignalBase) else s())
     print (topic, "plugged to", name, ', ', len(topic_info['signalGetters']), 'times')
 
-def _handleTfListener (name,topic_info,rosSubscribe,rosTf):
+def _handleTfListener (name,topic_info,rosSubscribe,rosTf,new=True):
     from dynamic_graph.signal_base import SignalBase
     signame = topic_info["frame1"] + "_wrt_" + topic_info["frame0"]
-    rosTf.add (topic_info["frame0"], topic_info["frame1"], signame)
+    if new:
+        rosTf.add (topic_info["frame0"], topic_info["frame1"], signame)
     for t in topic_info['signalGetters']:
         if isinstance(t, SignalBase):
             plug (rosTf.signal(signame), t)
@@ -381,24 +875,24 @@ def _handleTfListener (name,topic_info,rosSubscribe,rosTf):
             plug (rosTf.signal(signame+"_available"), t[1])
         else:
             raise TypeError("Expect a signal or tuple of two signals")
-    if "defaultValue" in topic_info:
+    if new and "defaultValue" in topic_info:
         dv = topic_info["defaultValue"]
         if isinstance(dv, SignalBase):
             plug(dv, rosTf.signal(signame+"_failback"))
         else:
             rosTf.signal(signame+"_failback").value = dv
-    if "maxDelay" in topic_info:
+    if new and "maxDelay" in topic_info:
         rosTf.setMaximumDelay (signame, topic_info["maxDelay"])
     print (topic_info["frame1"], "wrt", topic_info["frame0"], "plugged to", signame, ', ', len(topic_info['signalGetters']), 'times')
 
-def _handleHppJoint (name,topic_info,rosSubscribe,rosTf):
+def _handleHppJoint (name,topic_info,rosSubscribe,rosTf,new=True):
     if topic_info["velocity"]: topic = "velocity/op_frame"
     else:                      topic = "op_frame"
     ti = dict(topic_info)
     ti["topic"] = "/hpp/target/" + topic + '/' + topic_info['hppjoint']
-    _defaultHandler (name,ti,rosSubscribe,rosTf)
+    _defaultHandler (name,ti,rosSubscribe,rosTf,new)
 
-def _handleHppCom (name,topic_info,rosSubscribe,rosTf):
+def _handleHppCom (name,topic_info,rosSubscribe,rosTf,new=True):
     if topic_info["velocity"]: topic = "velocity/com"
     else:                      topic = "com"
     ti = dict(topic_info)
@@ -406,7 +900,7 @@ def _handleHppCom (name,topic_info,rosSubscribe,rosTf):
         ti["topic"] = "/hpp/target/" + topic
     else:
         ti["topic"] = "/hpp/target/" + topic + '/' + topic_info['hppcom']
-    _defaultHandler (name,ti,rosSubscribe,rosTf)
+    _defaultHandler (name,ti,rosSubscribe,rosTf,new)
 
 _handlers = {
         "hppjoint": _handleHppJoint,
@@ -25,7 +25,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from .task import Task
-from agimus_sot.tools import transQuatToSE3
+from agimus_sot.tools import placements
 
 ## Represents a gripper or a handle
 class OpFrame(object):
@@ -55,7 +55,9 @@ class OpFrame(object):
             self.name = name
             self.key = name
         self.link = srdf["link"]
-        self.lMf = transQuatToSE3 (srdf["position"])
+        ## Pose of the frame in the link, as a tuple (x, y, z, qx, qy, qz, qw)
+        self.position = tuple(srdf["position"])
+        self.lMf = placements.pose (self.position)
         self.enabled = enabled
         self.controllable = self.robotName == modelName
         if "joints" in srdf:
@@ -78,16 +80,10 @@ class OpFrame(object):
         self.hasVisualTag = False
 
     def _setupParentJoint (self, link, pose, model):
-        frameid = model.getFrameId (link)
-        if frameid < 0 or frameid >= len(model.frames):
-            links = "\n".join([ f.name for f in model.frames ])
-            raise ValueError("Link " + self.link + " not found in\n" + links)
-        frame = model.frames[frameid]
-
+        self.joint, jMf = placements.jointPlacement (model, link, self.position)
         # kept for backward compat
-        self.pose = frame.placement * pose
+        self.pose = jMf
         self.jMf = self.pose
-        self.joint = model.names[frame.parent]
 
     @property
     def fullLink  (self): return self.robotName + "/" + self.link
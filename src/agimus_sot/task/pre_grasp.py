@@ -32,7 +32,8 @@ from . import SotTask, FeaturePose
 from agimus_sot.sot import SafeGainAdaptive
 from .task import Task
 from agimus_sot.tools import _createOpPoint, assertEntityDoesNotExist, \
-    matrixHomoInverse, matrixHomoProduct, entityIfMatrixHomo
+    matrixHomoInverse, matrixHomoProduct, entityIfMatrixHomo, \
+    homoExpressions, Input, placements
 
 ## \brief A pregrasp (and preplace) task.
 # It creates a task to pose of the gripper with respect to the handle.
@@ -109,11 +110,12 @@ class PreGrasp (Task):
         if withMeasurement:
             _createOpPoint (sotrobot, sotrobot.camera_frame)
             linkNameMeas = linkName + self.meas_suffix
-            oMl = matrixHomoProduct(linkNameMeas + "_wrt_world",
-                    sotrobot.dynamic.signal(sotrobot.camera_frame), None,
+            oMl = homoExpressions.product(linkNameMeas + "_wrt_world",
+                    sotrobot.dynamic.signal(sotrobot.camera_frame),
+                    Input("tf:" + linkNameMeas),
                     check=False)
-            if_ = entityIfMatrixHomo (linkNameMeas + "_wrt_world_safe",
-                    condition=None,
+            if_ = homoExpressions.ifEntity (linkNameMeas + "_wrt_world_safe",
+                    condition=Input("tf_available:" + linkNameMeas),
                     value_then=oMl.sout,
                     value_else=sotrobot.dynamic.signal(linkName),
                     check=False)
@@ -141,14 +143,15 @@ class PreGrasp (Task):
 
             # Create default value
             _createOpPoint (sotrobot, sotrobot.camera_frame)
-            oMl = matrixHomoProduct(linkNameMeas + "_wrt_world",
+            oMl = homoExpressions.product(linkNameMeas + "_wrt_world",
                     sotrobot.dynamic.signal(sotrobot.camera_frame),
-                    None,
+                    Input("tf:" + linkNameMeas),
                     check=False,)
             name = linkNameMeas + "wrt_world"
-            if_ = entityIfMatrixHomo (name, condition=None,
+            if_ = homoExpressions.ifEntity (name,
+                    condition=Input("tf_available:" + linkNameMeas),
                     value_then=oMl.sout,
-                    value_else=None,
+                    value_else=Input("hppjoint:" + linkName),
                     check=False)
             self.addTfListenerTopic (linkNameMeas,
                     frame0 = sotrobot.camera_frame,
@@ -167,13 +170,16 @@ class PreGrasp (Task):
     #  Topic \c handle.fullLink must exists.
     def _referenceSignal (self, name, gripper, handle):
         # oMjg^-1 -> HPP joint
-        self.oMjaDes_inv = matrixHomoInverse (name + "_oMjaDes_inv")
+        # These expressions only depend on the gripper and the handle.
+        # They are shared by all the tasks that use them.
+        self.oMjaDes_inv = homoExpressions.inverse (name + "_oMjaDes_inv",
+                Input("hppjoint:" + gripper.fullLink))
         self.addHppJointTopic (gripper.fullLink, signalGetters = [ self.oMjaDes_inv.sin, ],)
         # Plug it to FeaturePose
-        self.faMfbDes = matrixHomoProduct (name + "_faMfbDes",
-            gripper.lMf.inverse(), # jgMg^-1
+        self.faMfbDes = homoExpressions.product (name + "_faMfbDes",
+            placements.inverse (gripper), # jgMg^-1
             self.oMjaDes_inv.sout, # oMjg^-1 -> HPP joint
-            None,                  # oMlh -> HPP joint
+            Input("hppjoint:" + handle.fullLink), # oMlh -> HPP joint
             handle.lMf,            # lhMh
             )
         # oMlh -> HPP joint
@@ -205,12 +211,12 @@ class PreGrasp (Task):
         self._plugRobotLink (sotrobot, self.gripper.link,
                 self.feature.oMja, self.feature.jaJja,
                 withMeasurementOfGripperPos)
-        self.feature.jaMfa.value = self.gripper.lMf.homogeneous
+        self.feature.jaMfa.value = placements.homogeneous (self.gripper)
 
         self.addHppJointTopic (self.handle.fullLink)
         self._plugObjectLink (sotrobot, self.handle.fullLink,
                 self.feature.oMjb, withMeasurementOfObjectPos)
-        self.feature.jbMfb.value = self.handle.lMf.homogeneous
+        self.feature.jbMfb.value = placements.homogeneous (self.handle)
         self.feature.jbJjb.value = np.zeros((6, sotrobot.dynamic.getDimension()))
 
         # Compute desired pose between gripper and handle.
@@ -250,7 +256,7 @@ class PreGrasp (Task):
                 withMeasurementOfGripperPos)
         # Frame A is the gripper frame
         self.feature.jaJja.value = np.zeros((6, sotrobot.dynamic.getDimension()))
-        self.feature.jaMfa.value = self.gripper.lMf.homogeneous
+        self.feature.jaMfa.value = placements.homogeneous (self.gripper)
 
         # Joint B is the other gripper link
         self._plugRobotLink (sotrobot, self.otherGripper.link,
@@ -263,10 +269,8 @@ class PreGrasp (Task):
         method = 3
         if method == 0: # Works
             # jbMfb        = ogMoh * ohMo * oMh
-            self.feature.jbMfb.value = (
-                    self.otherGripper.lMf
-                    * self.otherHandle.lMf.inverse()
-                    * self.handle.lMf).homogeneous
+            self.feature.jbMfb.value = placements.relative (
+                    self.otherGripper, self.otherHandle, self.handle).homogeneous
             self.addHppJointTopic (self.handle.fullLink)
         elif method == 1: # Does not work
             # Above, it is assumed that ogMoh = Id, which must be corrected.
@@ -299,7 +303,7 @@ class PreGrasp (Task):
             # ogMo
             self._defaultValue, signals = \
                     self.makeTfListenerDefaultValue(name+"_defaultValue",
-                            self.otherGripper.lMf * self.otherHandle.lMf.inverse(),
+                            placements.relative (self.otherGripper, self.otherHandle),
                             outputs = self.jbMfb.sin(0))
             self.addTfListenerTopic (
                     self.otherHandle.fullLink + self.meas_suffix + "_wrt_" + self.otherGripper.link + self.meas_suffix,
@@ -310,8 +314,8 @@ class PreGrasp (Task):
 
             self.addHppJointTopic (self.handle.fullLink)
         elif method == 3:
-            self.feature.jbMfb.value = (self.otherGripper.lMf
-                    * self.otherHandle.lMf.inverse() * self.handle.lMf).homogeneous
+            self.feature.jbMfb.value = placements.relative (
+                    self.otherGripper, self.otherHandle, self.handle).homogeneous
             self.addHppJointTopic (self.handle.fullLink)
 
         # Compute desired pose between gripper and handle.
@@ -353,7 +357,7 @@ class PreGrasp (Task):
         self._plugObjectLink (sotrobot, self.gripper.fullLink,
                 self.feature.oMja, withMeasurementOfGripperPos)
         # Frame A is the gripper frame
-        self.feature.jaMfa.value = self.gripper.lMf.homogeneous
+        self.feature.jaMfa.value = placements.homogeneous (self.gripper)
         self.feature.jaJja.value = np.zeros((6, sotrobot.dynamic.getDimension()))
 
         # Joint B is the other gripper link
@@ -392,7 +396,7 @@ class PreGrasp (Task):
                 # We use TF to get the position of the otherHandle wrt to the otherGripper
                 self._defaultValue, signals = \
                         self.makeTfListenerDefaultValue(name+"_defaultValue",
-                                self.otherGripper.lMf * self.otherHandle.lMf.inverse(),
+                                placements.relative (self.otherGripper, self.otherHandle),
                                 outputs = self.jbMfb.sin(0))
                 self.addTfListenerTopic (
                         self.otherHandle.fullLink + self.meas_suffix + "_wrt_" + self.otherGripper.link + self.meas_suffix,
@@ -402,7 +406,7 @@ class PreGrasp (Task):
                         )
             else:
                 ogMo = matrixHomoProduct(name + "_jbMfb_meas",
-                        matrixHomoInverse (self.otherGripper.link + "_inv", sotrobot.dynamic.signal(self.otherGripper.link), check=False).sout,
+                        homoExpressions.inverse (self.otherGripper.link + "_inv", sotrobot.dynamic.signal(self.otherGripper.link), check=False).sout,
                         sotrobot.dynamic.signal(sotrobot.camera_frame),
                         None, # Tf
                         self.handle.lMf,
@@ -410,7 +414,7 @@ class PreGrasp (Task):
                 if_ = entityIfMatrixHomo (name + "_jbMfb_cond",
                         condition=None,
                         value_then=ogMo.sout,
-                        value_else=self.otherGripper.lMf * self.otherHandle.lMf.inverse() * self.handle.lMf,
+                        value_else=placements.relative (self.otherGripper, self.otherHandle, self.handle),
                         check=True)
                 plug(if_.out, self.feature.jbMfb)
                 # We use TF to get the position of the otherHandle wrt to the camera
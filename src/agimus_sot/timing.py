@@ -0,0 +1,139 @@
+# Copyright 2018 CNRS - Airbus SAS
+# Author: Joseph Mirabel
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+## \package timing
+# Measure the duration of the phases of the startup.
+#
+# \code{.py}
+# from agimus_sot.timing import startup
+# with startup.phase ("generate") as p:
+#     factory.generate ()
+#     p["counts"]["actions"] = len(factory.actions)
+# print (startup.report())
+# \endcode
+
+from contextlib import contextmanager
+import threading, time
+
+## Monotonic clock, in seconds.
+# Python 2 has no monotonic clock. The wall clock is used instead.
+now = getattr (time, "monotonic", time.time)
+
+def _entityCount ():
+    try:
+        from dynamic_graph.entity import Entity
+    except ImportError:
+        return None
+    return len(Entity.entities)
+
+## Record the duration of nested phases.
+#
+# Each phase records its start and end times, given by \ref now, and
+# counters. When dynamic-graph can be imported, the number of entities
+# created during the phase is counted.
+#
+# Phases can be recorded by several threads. Each thread nests its own
+# phases. Once \ref stop is called, the phases are still timed but not
+# recorded anymore, so that the services called during the whole life of
+# the process do not make \c phases grow.
+class PhaseTimer(object):
+    def __init__ (self):
+        ## One dictionary per phase, in the order in which they started.
+        self.phases = []
+        ## Whether new phases are added to \c phases. \sa stop
+        self.recording = True
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    ## Names of the phases of the current thread which are not finished.
+    @property
+    def _stack (self):
+        if not hasattr (self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    ## Stop recording new phases, typically at the end of the startup.
+    def stop (self):
+        self.recording = False
+
+    ## Context manager that records a phase.
+    #
+    # Phases can be nested: the name of a sub-phase is prefixed with the
+    # names of the phases that contain it, separated by "/".
+    # \param counts initial counters of the phase.
+    # \return the dictionary of the phase. Counters can be added to its
+    #         key \c "counts".
+    @contextmanager
+    def phase (self, name, **counts):
+        stack = self._stack
+        p = { "name": "/".join (stack + [ name, ]),
+              "start": now(),
+              "counts": dict(counts), }
+        if self.recording:
+            with self._lock:
+                self.phases.append (p)
+        entities = _entityCount()
+        stack.append (name)
+        try:
+            yield p
+        finally:
+            stack.pop()
+            p["end"] = now()
+            p["duration"] = p["end"] - p["start"]
+            if entities is not None:
+                p["counts"]["entities"] = _entityCount() - entities
+
+    ## Add phases recorded elsewhere, for instance in another process.
+    # \param prefix prepended to the names of the phases.
+    def extend (self, phases, prefix = ""):
+        for p in phases:
+            p = dict(p)
+            p["name"] = prefix + p["name"]
+            with self._lock:
+                self.phases.append (p)
+
+    ## Startup report.
+    #
+    # \return a dictionary with keys
+    #         \li \c "phases": the list of phases, sorted by start time,
+    #         \li \c "summary": for each phase name, the number of calls, the
+    #             total duration and the sum of the counters.
+    def report (self):
+        summary = dict()
+        with self._lock:
+            phases = list(self.phases)
+        for p in phases:
+            if "duration" not in p: continue
+            s = summary.setdefault (p["name"], { "calls": 0, "duration": 0., "counts": dict() })
+            s["calls"] += 1
+            s["duration"] += p["duration"]
+            for k, v in p["counts"].items():
+                s["counts"][k] = s["counts"].get(k, 0) + v
+        return { "phases": sorted (phases, key = lambda p: p["start"]),
+                 "summary": summary, }
+
+## Phases of the startup of the process.
+startup = PhaseTimer()
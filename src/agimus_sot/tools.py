@@ -24,6 +24,7 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import numpy as np
 from dynamic_graph import plug
 
 def getTimerType (type):
@@ -39,6 +40,30 @@ def getTimerType (type):
     else:
         raise ValueError ("Unknown type of timer.")
 
+## Delete an entity.
+#
+# The C++ entity is removed from the pool of dynamic-graph and destroyed,
+# and its name can be used again. No signal may be plugged to an output
+# signal of the entity and no periodic call nor tracer may refer to its
+# signals. The Python objects of the entity and of its signals must not be
+# used afterwards.
+# \return whether the entity existed.
+def deleteEntity (name):
+    from dynamic_graph.entity import Entity
+    from agimus_sot.sot import deleteEntity as _deleteEntity
+    deleted = _deleteEntity (name)
+    Entity.entities.pop (name, None)
+    return deleted
+
+## Resident memory of the process, in bytes, or None if unknown.
+def residentMemory ():
+    import os
+    try:
+        with open ("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf ("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
 def filename_escape(value):
     """
     Normalizes string, converts to lowercase, removes non-alpha characters,
@@ -169,3 +194,188 @@ def entityIfMatrixHomo (name, condition, value_then, value_else, check=True):
         else:
             plug (condition, if_.condition)
     return if_
+
+## An operand of an expression which is left unplugged.
+#
+# The caller plugs it afterwards, for instance to a ROS topic. The \c tag
+# identifies the source of the operand: two Input with the same tag are
+# considered equal by HomoExpressionCache.
+class Input(object):
+    def __init__ (self, tag):
+        self.tag = tag
+
+## Hash-consing of matrixHomoProduct, matrixHomoInverse and entityIfMatrixHomo.
+#
+# An expression is identified by the operation and its operands:
+# signals (by name), constants (by value) and Input (by tag).
+# When an entity already computes the same expression, it is returned
+# instead of creating a new one. The name given to the first call is used.
+#
+# \code{.py}
+# from agimus_sot.tools import homoExpressions, Input
+# a = homoExpressions.product ("a", robot.dynamic.signal("camera"), Input("tf:camera/box"))
+# b = homoExpressions.product ("b", robot.dynamic.signal("camera"), Input("tf:camera/box"))
+# assert a is b
+# print (homoExpressions.stats())
+# \endcode
+class HomoExpressionCache(object):
+    def __init__ (self):
+        self.expressions = dict()
+        ## Number of entities created.
+        self.created = 0
+        ## Number of entities which were reused, i.e. not created.
+        self.reused = 0
+
+    def _key (self, operand):
+        from dynamic_graph.signal_base import SignalBase
+        from pinocchio import SE3
+        if isinstance(operand, Input):
+            return ("input", operand.tag)
+        if isinstance(operand, SignalBase):
+            return ("signal", operand.name)
+        if isinstance(operand, SE3):
+            operand = operand.homogeneous
+        if operand is None:
+            return None
+        return ("value", tuple(np.round(np.array(operand), 12).flatten()))
+
+    @staticmethod
+    def _operand (operand):
+        return None if isinstance(operand, Input) else operand
+
+    def _get (self, key, name, make):
+        if key in self.expressions:
+            entName, ent = self.expressions[key]
+            if entityExists (entName):
+                self.reused += 1
+                return ent
+        ent = make ()
+        self.expressions[key] = (name, ent)
+        self.created += 1
+        return ent
+
+    ## \sa matrixHomoProduct
+    def product (self, name, *args, **kwargs):
+        key = ("product",) + tuple([ self._key(a) for a in args ])
+        return self._get (key, name, lambda: matrixHomoProduct (name,
+            *[ self._operand(a) for a in args ], **kwargs))
+
+    ## \sa matrixHomoInverse
+    def inverse (self, name, valueOrSignal, check=True):
+        key = ("inverse", self._key(valueOrSignal))
+        return self._get (key, name, lambda: matrixHomoInverse (name,
+            self._operand(valueOrSignal), check=check))
+
+    ## \sa entityIfMatrixHomo
+    # \return an IfEntity
+    def ifEntity (self, name, condition, value_then, value_else, check=True):
+        if isinstance(condition, bool):
+            kcond = ("value", condition)
+        else:
+            kcond = self._key(condition)
+        key = ("if", kcond, self._key(value_then), self._key(value_else))
+        return self._get (key, name, lambda: entityIfMatrixHomo (name,
+            self._operand(condition), self._operand(value_then),
+            self._operand(value_else), check=check))
+
+    def stats (self):
+        return { "created": self.created, "reused": self.reused }
+
+## The HomoExpressionCache shared by the tasks.
+homoExpressions = HomoExpressionCache()
+
+## Memoization of the constant placements of grippers, handles and contacts.
+#
+# The placements are computed once per model and per frame:
+# \li the pose of a frame in its link, from the position given by the SRDF,
+# \li the pose of a frame in its parent joint,
+# \li the inverse of a pose and the relative poses of pairs of frames.
+#
+# A frame is identified by its key, its link and its position in the link
+# (see task.op_frame.OpFrame).
+# The returned pinocchio.SE3 objects are shared and must not be modified.
+#
+# \code{.py}
+# from agimus_sot.tools import placements
+# jMf = placements.relative (gripper, handle) # gripper.lMf * handle.lMf^-1
+# print (placements.stats())
+# \endcode
+class PlacementCache(object):
+    def __init__ (self):
+        self.placements = dict()
+        ## The models, by id. A reference is kept so that the ids stay unique.
+        self.models = dict()
+        ## Number of placements which were reused, i.e. not computed.
+        self.hits = 0
+        ## Number of placements which were computed.
+        self.misses = 0
+
+    def _get (self, key, make):
+        try:
+            value = self.placements[key]
+            self.hits += 1
+            return value
+        except KeyError:
+            value = make ()
+            self.placements[key] = value
+            self.misses += 1
+            return value
+
+    @staticmethod
+    def _frameKey (frame):
+        return (frame.key, frame.link, frame.position)
+
+    ## Pose of a frame in its link.
+    # \param xyzquat a tuple of 7 floats.
+    def pose (self, xyzquat):
+        xyzquat = tuple(xyzquat)
+        return self._get (("pose", xyzquat),
+                lambda: transQuatToSE3 (np.array(xyzquat)))
+
+    ## Pose of a frame in its parent joint.
+    # \param model a pinocchio.Model
+    # \param link name of the link of the frame
+    # \param xyzquat pose of the frame in the link.
+    # \return the name of the parent joint and the pose of the frame in it.
+    def jointPlacement (self, model, link, xyzquat):
+        self.models[id(model)] = model
+        xyzquat = tuple(xyzquat)
+        def make ():
+            frameid = model.getFrameId (link)
+            if frameid < 0 or frameid >= len(model.frames):
+                links = "\n".join([ f.name for f in model.frames ])
+                raise ValueError("Link " + link + " not found in\n" + links)
+            frame = model.frames[frameid]
+            return model.names[frame.parent], frame.placement * self.pose (xyzquat)
+        return self._get (("joint", id(model), link, xyzquat), make)
+
+    ## Inverse of \c frame.lMf
+    def inverse (self, frame):
+        return self._get (("inverse",) + self._frameKey (frame),
+                lambda: frame.lMf.inverse())
+
+    ## Homogeneous matrix of \c frame.lMf. It must not be modified.
+    def homogeneous (self, frame):
+        return self._get (("homogeneous",) + self._frameKey (frame),
+                lambda: frame.lMf.homogeneous)
+
+    ## Relative pose \f$ a.lMf \times b.lMf^{-1} (\times c.lMf) \f$
+    def relative (self, a, b, c = None):
+        key = ("relative", self._frameKey(a), self._frameKey(b),
+                None if c is None else self._frameKey(c))
+        if c is None:
+            return self._get (key, lambda: a.lMf * self.inverse (b))
+        return self._get (key, lambda: self.relative (a, b) * c.lMf)
+
+    ## Remove all the placements.
+    def clear (self):
+        self.placements.clear()
+        self.models.clear()
+
+    def stats (self):
+        total = self.hits + self.misses
+        return { "hits": self.hits, "misses": self.misses,
+                "hitRate": float(self.hits) / total if total > 0 else 0. }
+
+## The PlacementCache shared by the frames and the tasks.
+placements = PlacementCache()
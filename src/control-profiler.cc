@@ -0,0 +1,188 @@
+// Copyright 2021 CNRS - Airbus SAS
+// Author: Florent Lamiraux
+//
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are
+// met:
+
+// 1. Redistributions of source code must retain the above copyright
+// notice, this list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright
+// notice, this list of conditions and the following disclaimer in the
+// documentation and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+// "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+// LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+// A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+// HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+// SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+// LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+// DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+// THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+// (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#include <time.h>
+
+#include <dynamic-graph/factory.h>
+#include "control-profiler.hh"
+
+using namespace dynamicgraph::agimus;
+DYNAMICGRAPH_FACTORY_ENTITY_PLUGIN(ControlProfiler, "ControlProfiler");
+
+namespace {
+  double elapsed (const timespec& start, const timespec& stop)
+  {
+    return (double)(stop.tv_sec - start.tv_sec)
+      + 1e-9 * (double)(stop.tv_nsec - start.tv_nsec);
+  }
+}
+
+void ControlProfiler::display(std::ostream& os) const
+{
+  os << "Control Profiler " << getName();
+}
+
+void ControlProfiler::addCommands()
+{
+  using namespace dynamicgraph::command;
+  std::string docstring;
+  docstring = "    \n"
+    "    Allocate the histograms\n"
+    "    \n"
+    "      Input: number of actions, number of buckets\n"
+    "    \n"
+    "        Recorded values are kept when possible.\n";
+  addCommand("setSize", makeCommandVoid2(*this, &ControlProfiler::setSize,
+					 docstring));
+  docstring = "    \n"
+    "    Set the width of a bucket, in seconds\n";
+  addCommand("setBucketWidth", makeCommandVoid1(*this,
+        &ControlProfiler::setBucketWidth, docstring));
+  docstring = "    \n"
+    "    Set the period of the control, in seconds\n"
+    "    \n"
+    "        Durations above the period are counted as overruns.\n";
+  addCommand("setPeriod", makeCommandVoid1(*this,
+        &ControlProfiler::setPeriod, docstring));
+  docstring = "    \n"
+    "    Clear the histograms and statistics\n";
+  addCommand("reset", makeCommandVoid0(*this, &ControlProfiler::reset,
+					 docstring));
+}
+
+ControlProfiler::ControlProfiler(const std::string& name) :
+  Entity(name),
+  sinSIN(0x0, "ControlProfiler("+name+")::input(vector)::sin"),
+  selectionSIN(0x0, "ControlProfiler("+name+")::input(int)::selection"),
+  soutSOUT(boost::bind(&ControlProfiler::computeOutput, this, _1, _2),
+      sinSIN << selectionSIN,
+      "ControlProfiler("+name+")::output(vector)::sout"),
+  histogramsSOUT(boost::bind(&ControlProfiler::getHistograms, this, _1, _2),
+      sotNOSIGNAL,
+      "ControlProfiler("+name+")::output(matrix)::histograms"),
+  statisticsSOUT(boost::bind(&ControlProfiler::getStatistics, this, _1, _2),
+      sotNOSIGNAL,
+      "ControlProfiler("+name+")::output(matrix)::statistics"),
+  bucketWidth_ (1e-5),
+  period_ (1e-3),
+  lastSelection_ (-1)
+{
+  addCommands();
+  selectionSIN.setConstant(0);
+  histogramsSOUT.setDependencyType(TimeDependency<int>::ALWAYS_READY);
+  statisticsSOUT.setDependencyType(TimeDependency<int>::ALWAYS_READY);
+  Entity::signalRegistration(sinSIN << selectionSIN << soutSOUT);
+  Entity::signalRegistration(histogramsSOUT << statisticsSOUT);
+  setSize(64, 200);
+}
+
+void ControlProfiler::setSize(const int& nbActions, const int& nbBuckets)
+{
+  // Allocate before locking. The previous matrices are freed after the
+  // lock is released, when h and s go out of scope.
+  Matrix h (Matrix::Zero(nbActions, nbBuckets)),
+         s (Matrix::Zero(nbActions, NB_STATISTICS));
+  std::lock_guard<std::mutex> lock(mutex_);
+  Matrix::Index r = std::min(histograms_.rows(), h.rows());
+  if (histograms_.cols() == h.cols()) {
+    h.topRows(r) = histograms_.topRows(r);
+    s.topRows(r) = statistics_.topRows(r);
+  }
+  histograms_.swap(h);
+  statistics_.swap(s);
+}
+
+void ControlProfiler::setBucketWidth(const double& width)
+{
+  std::lock_guard<std::mutex> lock(mutex_);
+  bucketWidth_ = width;
+  histograms_.setZero();
+  statistics_.setZero();
+}
+
+void ControlProfiler::setPeriod(const double& period)
+{
+  std::lock_guard<std::mutex> lock(mutex_);
+  period_ = period;
+}
+
+void ControlProfiler::reset()
+{
+  std::lock_guard<std::mutex> lock(mutex_);
+  histograms_.setZero();
+  statistics_.setZero();
+}
+
+void ControlProfiler::record(const int& row, const double& duration)
+{
+  if (row < 0 || row >= histograms_.rows()) return;
+  Matrix::Index bucket = std::min((Matrix::Index)(duration / bucketWidth_),
+      histograms_.cols() - 1);
+  histograms_(row, bucket) += 1;
+  statistics_(row, COUNT) += 1;
+  statistics_(row, MAX) = std::max(statistics_(row, MAX), duration);
+  if (duration > period_) statistics_(row, OVERRUNS) += 1;
+  statistics_(row, LAST) = duration;
+}
+
+dynamicgraph::Vector& ControlProfiler::computeOutput(Vector& res, int t)
+{
+  timespec start, stop;
+  clock_gettime(CLOCK_MONOTONIC, &start);
+  const Vector& control = sinSIN(t);
+  clock_gettime(CLOCK_MONOTONIC, &stop);
+  res = control;
+  const int& selection = selectionSIN(t);
+  double duration = elapsed(start, stop);
+  // Never wait for another thread: the sample is dropped when the
+  // histograms are being read or resized.
+  std::unique_lock<std::mutex> lock(mutex_, std::try_to_lock);
+  if (!lock.owns_lock()) return res;
+  record(selection, duration);
+  if (selection != lastSelection_) {
+    lastSelection_ = selection;
+    if (selection >= 0 && selection < statistics_.rows()) {
+      statistics_(selection, FIRST) = duration;
+      statistics_(selection, FIRST_MAX) =
+        std::max(statistics_(selection, FIRST_MAX), duration);
+    }
+  }
+  return res;
+}
+
+dynamicgraph::Matrix& ControlProfiler::getHistograms(Matrix& res, int)
+{
+  std::lock_guard<std::mutex> lock(mutex_);
+  res = histograms_;
+  return res;
+}
+
+dynamicgraph::Matrix& ControlProfiler::getStatistics(Matrix& res, int)
+{
+  std::lock_guard<std::mutex> lock(mutex_);
+  res = statistics_;
+  return res;
+}
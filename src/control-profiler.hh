@@ -0,0 +1,120 @@
+// Copyright 2021 CNRS - Airbus SAS
+// Author: Florent Lamiraux
+//
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are
+// met:
+
+// 1. Redistributions of source code must retain the above copyright
+// notice, this list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright
+// notice, this list of conditions and the following disclaimer in the
+// documentation and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+// "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+// LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+// A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+// HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+// SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+// LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+// DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+// THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+// (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#ifndef AGIMUS_SOT_CONTROL_PROFILER_HH
+#define AGIMUS_SOT_CONTROL_PROFILER_HH
+
+#include <mutex>
+
+#include <dynamic-graph/all-commands.h>
+#include <dynamic-graph/entity.h>
+#include <dynamic-graph/linear-algebra.h>
+#include <dynamic-graph/signal.h>
+#include <dynamic-graph/signal-ptr.h>
+#include <dynamic-graph/signal-time-dependent.h>
+
+#include <agimus/sot/config.hh>
+
+namespace dynamicgraph {
+namespace agimus {
+
+/// Profile the computation time of the control, per action.
+///
+/// This entity is inserted between the switch of the supervisor and the
+/// device. Computing signal sout computes signal sin. The time spent is
+/// recorded in the histogram of the action currently selected.
+///
+/// The histograms are preallocated by command setSize, so that nothing is
+/// allocated in the real-time thread. The commands and the outputs
+/// histograms and statistics lock a mutex. The real-time thread only tries
+/// to lock it and drops the sample when it is taken: it never waits for
+/// another thread and never sees a matrix being resized. Durations are in
+/// seconds. Bucket i
+/// counts the durations in [ i*width, (i+1)*width [ and the last bucket
+/// counts the larger durations.
+///
+/// The input signals are
+/// \li sin: the control,
+/// \li selection: the index of the selected action.
+///
+/// The output signals are
+/// \li sout: a copy of sin,
+/// \li histograms: one row per action, one column per bucket,
+/// \li statistics: one row per action. The columns are the number of
+///     samples, the maximal duration, the number of durations above the
+///     period, the last duration and the latest and maximal durations of
+///     the first cycle after the action was selected.
+class AGIMUS_SOT_DLLAPI ControlProfiler : public Entity
+{
+ public:
+  static const std::string CLASS_NAME;
+  virtual void display(std::ostream &os) const;
+  virtual const std::string &getClassName(void) const { return CLASS_NAME; }
+
+  /// Constructor
+  ControlProfiler(const std::string& name);
+
+  enum Statistics {
+    COUNT = 0,
+    MAX,
+    OVERRUNS,
+    LAST,
+    /// Duration of the latest first cycle after a change of selection.
+    FIRST,
+    /// Maximal duration of the first cycle after a change of selection.
+    FIRST_MAX,
+    NB_STATISTICS
+  };
+
+  // Signals
+  SignalPtr<Vector, int> sinSIN;
+  SignalPtr<int, int> selectionSIN;
+
+  SignalTimeDependent<Vector, int> soutSOUT;
+  SignalTimeDependent<Matrix, int> histogramsSOUT;
+  SignalTimeDependent<Matrix, int> statisticsSOUT;
+
+ private:
+  void addCommands();
+  Vector& computeOutput(Vector& res, int t);
+  Matrix& getHistograms(Matrix& res, int t);
+  Matrix& getStatistics(Matrix& res, int t);
+
+  void setSize(const int& nbActions, const int& nbBuckets);
+  void setBucketWidth(const double& width);
+  void setPeriod(const double& period);
+  void reset();
+  void record(const int& row, const double& duration);
+
+  /// Protects histograms_, statistics_, bucketWidth_ and period_.
+  std::mutex mutex_;
+  Matrix histograms_, statistics_;
+  double bucketWidth_, period_;
+  int lastSelection_;
+}; // class ControlProfiler
+} // namespace agimus
+} // namespace dynamicgraph
+#endif // AGIMUS_SOT_CONTROL_PROFILER_HH
@@ -0,0 +1,175 @@
+// Copyright 2021 CNRS - Airbus SAS
+// Author: Florent Lamiraux
+//
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are
+// met:
+
+// 1. Redistributions of source code must retain the above copyright
+// notice, this list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright
+// notice, this list of conditions and the following disclaimer in the
+// documentation and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+// "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+// LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+// A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+// HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+// SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+// LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+// DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+// THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+// (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#include <thread>
+
+#include <dynamic-graph/factory.h>
+#include "control-snapshot.hh"
+
+using namespace dynamicgraph::agimus;
+DYNAMICGRAPH_FACTORY_ENTITY_PLUGIN(ControlSnapshot, "ControlSnapshot");
+
+void ControlSnapshot::display(std::ostream& os) const
+{
+  os << "Control Snapshot " << getName();
+}
+
+void ControlSnapshot::addCommands()
+{
+  using namespace dynamicgraph::command;
+  std::string docstring;
+  docstring = "    \n"
+    "    Allocate the buffers\n"
+    "    \n"
+    "      Input: size of the controls\n"
+    "    \n"
+    "        Must not be called while a snapshot is requested.\n";
+  addCommand("setSize", makeCommandVoid1(*this, &ControlSnapshot::setSize,
+					 docstring));
+  docstring = "    \n"
+    "    Request a snapshot at the next computation of signal trigger\n";
+  addCommand("request", makeCommandVoid0(*this, &ControlSnapshot::request,
+					 docstring));
+  docstring = "    \n"
+    "    Cancel the requested snapshot\n"
+    "    \n"
+    "        When it returns, the real-time thread does not read the inputs\n"
+    "        anymore, which can thus be unplugged.\n";
+  addCommand("cancel", makeCommandVoid0(*this, &ControlSnapshot::cancel,
+					 docstring));
+  docstring = "    \n"
+    "    Whether the requested snapshot is available\n";
+  addCommand("isReady", makeCommandReturnType0(*this,
+        &ControlSnapshot::isReady, docstring));
+  docstring = "    \n"
+    "    Time of the latest snapshot\n";
+  addCommand("getTime", makeCommandReturnType0(*this,
+        &ControlSnapshot::getTime, docstring));
+}
+
+ControlSnapshot::ControlSnapshot(const std::string& name) :
+  Entity(name),
+  currentSIN(0x0, "ControlSnapshot("+name+")::input(vector)::current"),
+  candidateSIN(0x0, "ControlSnapshot("+name+")::input(vector)::candidate"),
+  triggerSOUT(boost::bind(&ControlSnapshot::trigger, this, _1, _2),
+      sotNOSIGNAL,
+      "ControlSnapshot("+name+")::output(int)::trigger"),
+  snapshotSOUT(boost::bind(&ControlSnapshot::getSnapshot, this, _1, _2),
+      sotNOSIGNAL,
+      "ControlSnapshot("+name+")::output(matrix)::snapshot"),
+  published_ (0),
+  sequence_ (0),
+  requested_ (false),
+  ready_ (false),
+  busy_ (false),
+  mismatch_ (false),
+  time_ (-1)
+{
+  addCommands();
+  snapshotSOUT.setDependencyType(TimeDependency<int>::ALWAYS_READY);
+  Entity::signalRegistration(currentSIN << candidateSIN);
+  Entity::signalRegistration(triggerSOUT << snapshotSOUT);
+}
+
+void ControlSnapshot::setSize(const int& size)
+{
+  buffers_[0] = Matrix::Zero(2, size);
+  buffers_[1] = Matrix::Zero(2, size);
+}
+
+void ControlSnapshot::request()
+{
+  ready_ = false;
+  requested_ = true;
+}
+
+void ControlSnapshot::cancel()
+{
+  requested_ = false;
+  // Wait until the real-time thread does not read the inputs anymore.
+  while (busy_) std::this_thread::yield();
+}
+
+bool ControlSnapshot::isReady()
+{
+  return ready_;
+}
+
+int ControlSnapshot::getTime()
+{
+  return time_;
+}
+
+int& ControlSnapshot::trigger(int& res, int t)
+{
+  res = 0;
+  if (!requested_) return res;
+  // Tell cancel that the inputs are being read, then check the request
+  // again: either cancel sees busy_ or this thread sees the cancellation.
+  busy_ = true;
+  if (!requested_) {
+    busy_ = false;
+    return res;
+  }
+  const Vector& current = currentSIN(t);
+  const Vector& candidate = candidateSIN(t);
+  Matrix& buffer = buffers_[1 - published_.load(std::memory_order_relaxed)];
+  // The buffers are allocated by setSize, outside of the real-time thread.
+  // A control of another size is only flagged.
+  bool mismatch = (current.size() != buffer.cols()
+      || candidate.size() != buffer.cols());
+  if (!mismatch) {
+    buffer.row(0) = current;
+    buffer.row(1) = candidate;
+  }
+  sequence_.fetch_add(1, std::memory_order_acq_rel);
+  mismatch_.store(mismatch, std::memory_order_release);
+  published_.store(1 - published_.load(std::memory_order_relaxed),
+      std::memory_order_release);
+  sequence_.fetch_add(1, std::memory_order_acq_rel);
+  time_ = t;
+  requested_ = false;
+  ready_ = true;
+  busy_ = false;
+  res = 1;
+  return res;
+}
+
+dynamicgraph::Matrix& ControlSnapshot::getSnapshot(Matrix& res, int)
+{
+  // Copy the published buffer and retry if it changed meanwhile.
+  unsigned int before, after;
+  do {
+    before = sequence_.load(std::memory_order_acquire);
+    if (mismatch_.load(std::memory_order_acquire))
+      // Leave the snapshot empty to signal the mismatch.
+      res.resize(2, 0);
+    else
+      res = buffers_[published_.load(std::memory_order_acquire)];
+    after = sequence_.load(std::memory_order_acquire);
+  } while (before != after || (before & 1u));
+  return res;
+}
@@ -0,0 +1,111 @@
+// Copyright 2021 CNRS - Airbus SAS
+// Author: Florent Lamiraux
+//
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are
+// met:
+
+// 1. Redistributions of source code must retain the above copyright
+// notice, this list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright
+// notice, this list of conditions and the following disclaimer in the
+// documentation and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+// "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+// LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+// A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+// HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+// SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+// LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+// DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+// THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+// (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#ifndef AGIMUS_SOT_CONTROL_SNAPSHOT_HH
+#define AGIMUS_SOT_CONTROL_SNAPSHOT_HH
+
+#include <atomic>
+
+#include <dynamic-graph/all-commands.h>
+#include <dynamic-graph/entity.h>
+#include <dynamic-graph/linear-algebra.h>
+#include <dynamic-graph/signal.h>
+#include <dynamic-graph/signal-ptr.h>
+#include <dynamic-graph/signal-time-dependent.h>
+
+#include <agimus/sot/config.hh>
+
+namespace dynamicgraph {
+namespace agimus {
+
+/// Copy two controls, computed by the real-time thread, for another thread.
+///
+/// Signal trigger must be computed at each period of the control, for
+/// instance by adding it to the signals computed after the device. When a
+/// snapshot was requested (command request), the next computation of
+/// trigger reads signals current and candidate and copies them in a double
+/// buffer. No lock is taken in the real-time thread.
+///
+/// Another thread waits until command isReady returns true and reads
+/// signal snapshot, which only copies the buffer. It never computes the
+/// inputs. If it stops waiting, command cancel withdraws the request.
+///
+/// The buffers are allocated by command setSize. The real-time thread never
+/// resizes them: when current or candidate does not have this size, the
+/// snapshot is flagged and signal snapshot is a matrix with no column.
+///
+/// The input signals are
+/// \li current: the control sent to the robot,
+/// \li candidate: the control of another action.
+///
+/// The output signals are
+/// \li trigger: to be computed at each period,
+/// \li snapshot: a matrix whose rows are the latest snapshot of current
+///     and candidate.
+class AGIMUS_SOT_DLLAPI ControlSnapshot : public Entity
+{
+ public:
+  static const std::string CLASS_NAME;
+  virtual void display(std::ostream &os) const;
+  virtual const std::string &getClassName(void) const { return CLASS_NAME; }
+
+  /// Constructor
+  ControlSnapshot(const std::string& name);
+
+  // Signals
+  SignalPtr<Vector, int> currentSIN;
+  SignalPtr<Vector, int> candidateSIN;
+
+  SignalTimeDependent<int, int> triggerSOUT;
+  SignalTimeDependent<Matrix, int> snapshotSOUT;
+
+ private:
+  void addCommands();
+  int& trigger(int& res, int t);
+  Matrix& getSnapshot(Matrix& res, int t);
+
+  void setSize(const int& size);
+  void request();
+  void cancel();
+  bool isReady();
+  int getTime();
+
+  /// Two buffers of two rows. The real-time thread writes in the one which
+  /// is not published.
+  Matrix buffers_[2];
+  std::atomic<int> published_;
+  /// Incremented before and after each write.
+  std::atomic<unsigned int> sequence_;
+  std::atomic<bool> requested_, ready_;
+  /// Whether the real-time thread reads the inputs. \sa cancel
+  std::atomic<bool> busy_;
+  /// Whether the size of the controls differs from the size of the buffers.
+  std::atomic<bool> mismatch_;
+  std::atomic<int> time_;
+}; // class ControlSnapshot
+} // namespace agimus
+} // namespace dynamicgraph
+#endif // AGIMUS_SOT_CONTROL_SNAPSHOT_HH
@@ -1,19 +1,41 @@
+#include <dynamic-graph/pool.h>
+
 #include "dynamic-graph/python/module.hh"
 
 #include "time.hh"
 #include "contact-admittance.hh"
+#include "control-profiler.hh"
+#include "control-snapshot.hh"
 #include "gain-adaptive.hh"
 #include "holonomic-constraint.hh"
 #include "object-localization.hh"
 
 namespace dg = dynamicgraph;
 
+/// Remove an entity from the pool and destroy it.
+/// \return whether the entity existed.
+bool deleteEntity(const std::string& name)
+{
+  dg::PoolStorage* pool = dg::PoolStorage::getInstance();
+  if (!pool->existEntity(name)) return false;
+  dg::Entity* entity = &pool->getEntity(name);
+  pool->deregisterEntity(name);
+  delete entity;
+  return true;
+}
+
 BOOST_PYTHON_MODULE(wrap)
 {
   bp::import("dynamic_graph");
   dg::python::exposeEntity<dg::agimus::Time<int> >();
   dg::python::exposeEntity<dg::agimus::ContactAdmittance>();
+  dg::python::exposeEntity<dg::agimus::ControlProfiler>();
+  dg::python::exposeEntity<dg::agimus::ControlSnapshot>();
   dg::python::exposeEntity<dg::agimus::SafeGainAdaptive>();
   dg::python::exposeEntity<dg::agimus::HolonomicConstraint>();
   dg::python::exposeEntity<dg::agimus::ObjectLocalization>();
+
+  bp::def("deleteEntity", &deleteEntity,
+      "Remove an entity from the pool and destroy it. "
+      "Return whether the entity existed.");
 }
@@ -0,0 +1,168 @@
+from __future__ import print_function
+
+## Benchmark of the generation of the graph of constraints.
+#
+# For each configuration (number of grippers, objects and handles per
+# object), synthetic SRDF information is built and factory.Factory generates
+# the actions on top of the stand-in of dynamic-graph (see
+# dynamic_graph_stub.py). Each configuration runs in its own process so that
+# the peak memory and the entity count are not polluted by the others.
+#
+# Usage:
+# \code
+# python tests/benchmark_factory.py --grippers 1 2 3 --objects 1 2 --handles 2 \
+#     --parameter lazyActions=True --output report.json
+# \endcode
+#
+# The report is a JSON list with one dictionary per configuration.
+# hpp-manipulation-corba (for the graph enumeration) and pinocchio must be
+# installed.
+
+import argparse, ast, json, os, subprocess, sys, time
+
+def makeModel (nGrippers):
+    import pinocchio
+    model = pinocchio.Model()
+    root = model.addJoint (0, pinocchio.JointModelFreeFlyer(),
+            pinocchio.SE3.Identity(), "root_joint")
+    model.addFrame (pinocchio.Frame ("base_link", root, 0,
+        pinocchio.SE3.Identity(), pinocchio.FrameType.BODY))
+    for i in range(nGrippers):
+        j = model.addJoint (root, pinocchio.JointModelRZ(),
+                pinocchio.SE3.Identity(), "g{}_joint".format(i))
+        model.addFrame (pinocchio.Frame ("g{}_link".format(i), j, 0,
+            pinocchio.SE3.Identity(), pinocchio.FrameType.BODY))
+    return model
+
+## SRDF information, as returned by srdf_parser.parse_srdf
+def makeSrdf (nGrippers, nObjects, nHandles):
+    grippers = { "robot/g{}".format(i): {
+        "robot": "robot", "name": "g{}".format(i), "clearance": 0.,
+        "link": "g{}_link".format(i), "position": (0,0,0,0,0,0,1),
+        "joints": ("g{}_joint".format(i),) } for i in range(nGrippers) }
+    handles = dict()
+    contacts = dict()
+    for j in range(nObjects):
+        o = "obj{}".format(j)
+        for k in range(nHandles):
+            handles[o + "/h{}".format(k)] = {
+                    "robot": o, "name": "h{}".format(k), "clearance": 0.,
+                    "link": "base_link", "position": (0.1*k,0,0,0,0,0,1),
+                    "mask": (True,)*6 }
+        contacts[o + "/bottom"] = { "robot": o, "name": "bottom",
+                "link": "base_link", "points": [(0,0,0)], "shapes": [[0]] }
+    contacts["table/top"] = { "robot": "table", "name": "top",
+            "link": "base_link", "points": [(0,0,0)], "shapes": [[0]] }
+    return grippers, handles, contacts
+
+def run (nGrippers, nObjects, nHandles, parameters):
+    import dynamic_graph_stub
+    dynamic_graph_stub.install()
+    from dynamic_graph_stub import Entity, Robot
+    from agimus_sot import Supervisor
+    from agimus_sot.factory import Factory, Affordance
+    from hpp.corbaserver.manipulation import Rule
+
+    srdfGrippers, srdfHandles, srdfContacts = makeSrdf (nGrippers, nObjects, nHandles)
+    objects = [ "obj{}".format(j) for j in range(nObjects) ]
+    robot = Robot ("robot", makeModel (nGrippers))
+
+    start = time.time()
+    nEntities = len(Entity.entities)
+    supervisor = Supervisor (robot)
+    factory = Factory (supervisor)
+    factory.parameters["period"] = robot.getTimeStep()
+    factory.parameters.update (parameters)
+    factory.setGrippers (sorted(srdfGrippers.keys()))
+    factory.setObjects (objects,
+            [ [ o + "/h{}".format(k) for k in range(nHandles) ] for o in objects ],
+            [ [ o + "/bottom" ] for o in objects ])
+    factory.environmentContacts (["table/top"])
+    factory.setRules ([ Rule ([".*"]*nGrippers, [".*"]*nGrippers, True) ])
+    factory.setupFrames (srdfGrippers, srdfHandles, robot)
+    factory.setupContactFrames (srdfContacts)
+    refs = { "angle_open": (0,), "angle_close": (-0.5,), "torque": (-0.05,) }
+    for g in srdfGrippers:
+        factory.addAffordance (Affordance (g, None, "position", "position", refs))
+        for h in srdfHandles:
+            factory.addAffordance (Affordance (g, h, "position", "position", refs))
+    setup = time.time()
+
+    # Silence the messages printed while building the tasks.
+    stdout = sys.stdout
+    sys.stdout = open (os.devnull, "w")
+    try:
+        factory.generate ()
+        supervisor.makeInitialSot ()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    end = time.time()
+
+    import resource
+    return { "grippers": nGrippers,
+             "objects": nObjects,
+             "handles": nHandles,
+             "parameters": parameters,
+             "setup_time": setup - start,
+             "generate_time": end - setup,
+             # kilobytes on Linux
+             "peak_memory": resource.getrusage (resource.RUSAGE_SELF).ru_maxrss,
+             "entities": len(Entity.entities) - nEntities,
+             "actions": len(supervisor.actions),
+             "pre_actions": len(supervisor.preActions),
+             "post_actions": sum ([ len(d) for d in supervisor.postActions.values() ]),
+             "switch_slots": len(supervisor.action_indices),
+             "states": len(factory.plan["states"]),
+             "transitions": len(factory.plan["transitions"]),
+             }
+
+def parseParameter (s):
+    name, value = s.split ("=", 1)
+    try:
+        value = ast.literal_eval (value)
+    except (ValueError, SyntaxError):
+        pass
+    return name, value
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser (description = "Benchmark of factory.Factory.generate")
+    parser.add_argument ("--grippers", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument ("--objects", type=int, nargs="+", default=[1, 2])
+    parser.add_argument ("--handles", type=int, nargs="+", default=[1, 2],
+            help="number of handles per object")
+    parser.add_argument ("--parameter", action="append", default=[],
+            help="a Factory parameter, as name=value")
+    parser.add_argument ("--output", default=None,
+            help="file where the JSON report is written. Defaults to the standard output.")
+    parser.add_argument ("--single", action="store_true",
+            help="run only the first configuration in this process")
+    args = parser.parse_args ()
+    parameters = dict ([ parseParameter(p) for p in args.parameter ])
+
+    if args.single:
+        print (json.dumps (run (args.grippers[0], args.objects[0], args.handles[0], parameters)))
+        sys.exit (0)
+
+    here = os.path.dirname (os.path.abspath (__file__))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join ([ here, os.path.join (here, "..", "src") ]
+            + ([ env["PYTHONPATH"] ] if "PYTHONPATH" in env else []))
+    report = []
+    for g in args.grippers:
+        for o in args.objects:
+            for h in args.handles:
+                cmd = [ sys.executable, os.path.abspath (__file__), "--single",
+                        "--grippers", str(g), "--objects", str(o), "--handles", str(h) ] \
+                    + [ a for p in args.parameter for a in ("--parameter", p) ]
+                out = subprocess.check_output (cmd, env=env)
+                res = json.loads (out.decode().strip().splitlines()[-1])
+                print ("{grippers} grippers, {objects} objects, {handles} handles: "
+                        "{generate_time:.2f} s, {entities} entities, {actions} actions"
+                        .format(**res), file=sys.stderr)
+                report.append (res)
+    if args.output is None:
+        print (json.dumps (report, indent=2))
+    else:
+        with open (args.output, "w") as f:
+            json.dump (report, f, indent=2)
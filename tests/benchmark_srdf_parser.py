@@ -0,0 +1,271 @@
+from __future__ import print_function
+
+## Benchmark of the SRDF parser.
+#
+# A generated SRDF file is parsed by a copy of the original parser
+# ("baseline", below) and by srdf_parser._parse_file ("stream"), on top of
+# the stand-in of dynamic-graph (see dynamic_graph_stub.py). Both must
+# return the same dictionaries; the stream parser only lowers the peak memory.
+#
+# Usage:
+# \code
+# python tests/benchmark_srdf_parser.py --handles 1000 5000 --points 100 \
+#     --output report.json
+# \endcode
+
+import argparse, json, os, shutil, sys, tempfile, time
+
+## \name Reference parser
+# Copy of srdf_parser before it read the elements while parsing. It must
+# not be modified: it is the reference of the benchmark.
+# \{
+
+def _baseline_read_name (xml):
+    return str(xml.attrib["name"])
+
+def _baseline_read_clearance (xml):
+    return float(xml.attrib.get('clearance', 0))
+
+def _baseline_read_mask (xml):
+    masksTag = xml.findall('mask')
+    if len(masksTag) > 1:
+        raise ValueError ("Handle needs at most one tag mask")
+    elif len(masksTag) == 1:
+        mask = [ bool(v) for v in masksTag[0].text.split() ]
+    else:
+        mask = (True, ) * 6
+    if len(mask) != 6:
+        raise ValueError ("Tag mask must contain 6 booleans")
+    return tuple (mask)
+
+def _baseline_read_joints (xml):
+    jointTags = xml.findall('joint')
+    return tuple ( [ jt.attrib["name"] for jt in jointTags ] )
+
+def _baseline_read_position (xml):
+    positionsTag = xml.findall('position')
+    if len(positionsTag) != 1:
+        raise ValueError ("Gripper needs exactly one tag position")
+    try:
+        xyz_wxyz = [ float(x) for x in positionsTag[0].text.split() ]
+    except AttributeError:
+        xyz_wxyz = []
+        pass
+    if len(xyz_wxyz) > 0:
+        if len(xyz_wxyz) != 7:
+            raise ValueError ("The text of tag position should contain 7 floats: x y z qw qx qy qz.\nCurrent value: " + positionsTag[0].text)
+        xyz_xyzw = xyz_wxyz[0:3] + xyz_wxyz[4:7] + xyz_wxyz[3:4]
+    else: # No text provided. Try to read attributes xyz, wxyz, xyzw and rpy
+        def get_attribute(att, expected_size):
+            val = attribs[att].split()
+            if len(val) != expected_size:
+                raise ValueError ("The attribute {} of tag position should contain {} floats\nCurrent value: {}"
+                        .format (att, expected_size, attribs[att]))
+            return [ float(v) for v in val ]
+
+        attribs = positionsTag[0].attrib
+        if "xyz" in attribs:
+            xyz_xyzw = get_attribute("xyz", 3)
+        else:
+            xyz_xyzw = [ 0., 0., 0., ]
+
+        if int("xyzw" in attribs) + int("wxyz" in attribs) + int("rpy" in attribs) > 1:
+            raise ValueError ("Tag position must have only one of rpy, wxyz, xyzw")
+        if "xyzw" in attribs:
+            xyz_xyzw += get_attribute("xyzw", 4)
+        elif "wxyz" in attribs:
+            w, x, y, z = get_attribute("wxyz", 4)
+            xyz_xyzw += [x, y, z, w]
+        elif "rpy" in attribs:
+            from math import cos, sin, sqrt
+            R, P, Y = get_attribute("rpy", 3)
+            x = sin(R/2.) * cos(P/2.) * cos(Y/2.) - cos(R/2.) * sin(P/2.) * sin(Y/2.)
+            y = cos(R/2.) * sin(P/2.) * cos(Y/2.) + sin(R/2.) * cos(P/2.) * sin(Y/2.)
+            z = cos(R/2.) * cos(P/2.) * sin(Y/2.) - sin(R/2.) * sin(P/2.) * cos(Y/2.)
+            w = cos(R/2.) * cos(P/2.) * cos(Y/2.) + sin(R/2.) * sin(P/2.) * sin(Y/2.)
+            assert abs(x**2+y**2+z**2+w**2 - 1) < 1e-6
+            xyz_xyzw += [x, y, z, w]
+        else:
+            xyz_xyzw += [0., 0., 0., 1.]
+    assert len(xyz_xyzw) == 7
+    return tuple (xyz_xyzw)
+
+def _baseline_read_link (xml):
+    linksTag = xml.findall('link')
+    if len(linksTag) != 1:
+        raise ValueError ("Gripper needs exactly one tag link")
+    return str(linksTag[0].attrib['name'])
+
+def _baseline_read_points (xml):
+    pointsTag = xml.findall('point')
+    if len(pointsTag) != 1:
+        raise ValueError ("Contact needs exactly one tag point")
+    vals = pointsTag[0].text.split()
+    if len(vals) % 3 != 0:
+        raise ValueError ("point tag must contain 3*N floating point numbers. Current size is " + str(len(vals)) + ".")
+    return [ tuple([ float(v) for v in vals[i:i+3]]) for i in range(0,len(vals),3) ]
+
+def _baseline_read_shapes (xml):
+    shapesTag = xml.findall('shape')
+    if len(shapesTag) != 1:
+        raise ValueError ("Contact needs exactly one tag point")
+    indices = [ int(v) for v in shapesTag[0].text.split() ]
+    shapes = list()
+    i = 0
+    while i < len(indices):
+        N = indices[i]
+        shapes.append(indices[i+1:i+1+N])
+        i += N+1
+    return shapes
+
+# Torque constants should not appear in gripper tag.
+# There should be one value for each actuated joint.
+def _baseline_read_torque_constant (xml):
+    tcTags = xml.findall('torque_constant')
+    if len(tcTags) > 1:
+        raise ValueError ("Gripper needs at most one tag torque_constant")
+    elif len(tcTags) == 1:
+        return float(tcTags[0].attrib['value'])
+    else:
+        return None
+
+def _baseline_parse_tree (root, prefix = None):
+    grippers = {}
+    for xml in root.iter('gripper'):
+        n = _baseline_read_name (xml)
+        g = { "robot":     prefix,
+              "name":      n,
+              "clearance": _baseline_read_clearance (xml),
+              "link":      _baseline_read_link (xml),
+              "position":  _baseline_read_position (xml),
+              "joints":    _baseline_read_joints (xml),
+              }
+        tc = _baseline_read_torque_constant (xml)
+        if tc is not None: g["torque_constant"] = tc
+        grippers[ prefix + "/" + n if prefix is not None else n] = g
+
+    handles = {}
+    for xml in root.iter('handle'):
+        n = _baseline_read_name (xml)
+        h = { "robot":     prefix,
+              "name":      n,
+              "clearance": _baseline_read_clearance (xml),
+              "link":      _baseline_read_link (xml),
+              "position":  _baseline_read_position (xml),
+              "mask":      _baseline_read_mask (xml),
+              }
+        handles[ prefix + "/" + n if prefix is not None else n] = h
+
+    contacts = {}
+    for xml in root.iter('contact'):
+        n = _baseline_read_name (xml)
+        c = { "robot":  prefix,
+              "name":   n,
+              "link":   _baseline_read_link (xml),
+              "points": _baseline_read_points (xml),
+              "shapes": _baseline_read_shapes (xml),
+              }
+        contacts[ prefix + "/" + n if prefix is not None else n] = c
+
+    return { "grippers": grippers, "handles": handles, "contacts": contacts}
+
+## \}
+
+def makeSrdf (f, nHandles, nContacts, nPoints, nCollisions):
+    f.write ('<?xml version="1.0" ?>\n<robot name="generated">\n')
+    for i in range(nCollisions):
+        f.write ('  <disable_collisions link1="link_{0}" link2="link_{1}" reason="Never"/>\n'
+                .format (i, i+1))
+    f.write ('  <gripper name="gripper" clearance="0.05">\n'
+             '    <position> 0 0 0.1  1 0 0 0 </position>\n'
+             '    <link name="link_0"/>\n'
+             '    <joint name="finger_joint"/>\n'
+             '  </gripper>\n')
+    for i in range(nHandles):
+        f.write ('  <handle name="handle_{0}" clearance="0.05">\n'
+                 '    <position xyz="{1} 0 0" rpy="0 0 {2}"/>\n'
+                 '    <link name="link_{0}"/>\n'
+                 '    <mask>1 1 1 1 1 0</mask>\n'
+                 '  </handle>\n'.format (i, 0.01*i, 0.001*i))
+    for i in range(nContacts):
+        f.write ('  <contact name="contact_{0}">\n'
+                 '    <link name="link_{0}"/>\n'
+                 '    <point>{1}</point>\n'
+                 '    <shape>{2} {3}</shape>\n'
+                 '  </contact>\n'.format (i,
+                     " ".join ([ "{0} {1} 0.1".format(0.1*j, 0.2*j) for j in range(nPoints) ]),
+                     nPoints, " ".join ([ str(j) for j in range(nPoints) ])))
+    f.write ('</robot>\n')
+
+def peakMemory (function):
+    try:
+        import tracemalloc
+    except ImportError:
+        return function(), None
+    tracemalloc.start()
+    try:
+        res = function()
+        return res, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run (fn, repeat):
+    import xml.etree.ElementTree as ET
+    from agimus_sot.srdf_parser import _parse_file
+    methods = { "baseline": lambda: _baseline_parse_tree (ET.parse (fn).getroot(), prefix="obj"),
+                "stream":   lambda: _parse_file (fn, prefix="obj"), }
+    results = dict()
+    report = dict()
+    for name, method in methods.items():
+        durations = []
+        for i in range(repeat):
+            start = time.time()
+            method ()
+            durations.append (time.time() - start)
+        results[name], memory = peakMemory (method)
+        report[name] = { "time": min(durations), "peak_memory": memory }
+    from agimus_sot.cache import canonical
+    if canonical (results["baseline"]) != canonical (results["stream"]):
+        raise RuntimeError ("The parsers do not return the same dictionaries.")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser (description = "Benchmark of srdf_parser")
+    parser.add_argument ("--handles", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument ("--contacts", type=int, default=100)
+    parser.add_argument ("--points", type=int, default=100,
+            help="number of points per contact")
+    parser.add_argument ("--collisions", type=int, default=1000,
+            help="number of disable_collisions tags")
+    parser.add_argument ("--repeat", type=int, default=3)
+    parser.add_argument ("--output", default=None,
+            help="file where the JSON report is written. Defaults to the standard output.")
+    args = parser.parse_args ()
+
+    here = os.path.dirname (os.path.abspath (__file__))
+    sys.path[:0] = [ here, os.path.join (here, "..", "src") ]
+    import dynamic_graph_stub
+    dynamic_graph_stub.install()
+
+    directory = tempfile.mkdtemp ()
+    report = []
+    try:
+        for h in args.handles:
+            fn = os.path.join (directory, "generated_{0}.srdf".format(h))
+            with open (fn, "w") as f:
+                makeSrdf (f, h, args.contacts, args.points, args.collisions)
+            res = run (fn, args.repeat)
+            res.update ({ "handles": h, "contacts": args.contacts,
+                "points": args.points, "collisions": args.collisions,
+                "size": os.path.getsize (fn) })
+            print ("{0} handles: baseline {1:.3f} s, {2} B, stream {3:.3f} s, {4} B"
+                    .format (h, res["baseline"]["time"], res["baseline"]["peak_memory"],
+                        res["stream"]["time"], res["stream"]["peak_memory"]), file=sys.stderr)
+            report.append (res)
+    finally:
+        shutil.rmtree (directory)
+    if args.output is None:
+        print (json.dumps (report, indent=2))
+    else:
+        with open (args.output, "w") as f:
+            json.dump (report, f, indent=2)
@@ -0,0 +1,107 @@
+from __future__ import print_function
+
+import os, pickle, shutil, tempfile, unittest
+from agimus_sot.cache import Cache, canonical
+
+class TestAgimusCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_canonical(self):
+        a = { "b": [1, 2], "a": (3, { "y": 1., "x": None }) }
+        b = dict()
+        b["a"] = [3, { "x": None, "y": 1. }]
+        b["b"] = (1, 2)
+        # Neither the order of the keys nor the type of the sequences matter.
+        self.assertEqual(canonical(a), canonical(b))
+        self.assertEqual(canonical(set([3, 1, 2])), canonical(frozenset([2, 3, 1])))
+        self.assertNotEqual(canonical(a), canonical({ "b": [2, 1], "a": (3, { "y": 1., "x": None }) }))
+        self.assertNotEqual(canonical([1]), canonical([1.5]))
+        # Strings read from JSON are unicode with Python 2.
+        name = u"h\u00e9"
+        native = name.encode("utf-8") if str is bytes else name
+        self.assertEqual(canonical({ u"name": name }), canonical({ "name": native }))
+        self.assertEqual(canonical([u"a", "b"]), canonical(["a", u"b"]))
+
+        import numpy as np
+        self.assertEqual(canonical(np.array([[1., 2.], [3., 4.]])),
+                canonical([[1., 2.], [3., 4.]]))
+
+        class Frame(object):
+            cacheKeyFields = ("name",)
+            def __init__(self, name): self.name, self.entity = name, object()
+        self.assertEqual(canonical(Frame("a")), canonical(Frame("a")))
+        self.assertNotEqual(canonical(Frame("a")), canonical(Frame("b")))
+
+        # Objects must list the attributes of their key.
+        class Other(object):
+            def __init__(self, name): self.name = name
+        self.assertRaises(TypeError, canonical, [ Other("a") ])
+
+    def test_key(self):
+        cache = Cache(self.directory)
+        self.assertEqual(cache.key({ "a": 1, "b": 2 }, [1, 2]),
+                cache.key({ "b": 2, "a": 1 }, (1, 2)))
+        self.assertNotEqual(cache.key(1, 2), cache.key(2, 1))
+        # The key does not depend on the directory and is a file name.
+        self.assertEqual(cache.key(1), Cache(os.path.join(self.directory, "other")).key(1))
+        self.assertNotIn(os.sep, cache.key("a/b"))
+
+    def test_hit_and_miss(self):
+        calls = []
+        def compute():
+            calls.append(None)
+            return { "value": len(calls) }
+
+        cache = Cache(os.path.join(self.directory, "sub"), "test_")
+        key = cache.key("hit")
+        self.assertEqual(cache.get(key, compute), { "value": 1 })
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertTrue(os.path.isfile(os.path.join(self.directory, "sub", "test_" + key + ".pickle")))
+
+        self.assertEqual(cache.get(key, compute), { "value": 1 })
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(len(calls), 1)
+
+        # Another instance reads the same files.
+        other = Cache(os.path.join(self.directory, "sub"), "test_")
+        self.assertEqual(other.get(key, compute), { "value": 1 })
+        self.assertEqual(other.hits, 1)
+
+        self.assertEqual(cache.get(cache.key("miss"), compute), { "value": 2 })
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+
+    def test_corrupt_file(self):
+        cache = Cache(self.directory)
+        key = cache.key("corrupt")
+        cache.get(key, lambda: [1, 2, 3])
+        with open(cache._path(key), "wb") as f:
+            f.write(b"not a pickle")
+        self.assertEqual(cache.load(key), (False, None))
+        # The value is computed again and the file is replaced.
+        self.assertEqual(cache.get(key, lambda: [4, 5]), [4, 5])
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.load(key), (True, [4, 5]))
+
+        # An empty file.
+        with open(cache._path(key), "wb") as f:
+            pass
+        self.assertEqual(cache.load(key), (False, None))
+        self.assertFalse(os.path.exists(cache._path(key)))
+
+        # A pickle of a value which is not a pair.
+        cache.store(key, None)
+        with open(cache._path(key), "wb") as f:
+            pickle.dump(3, f)
+        self.assertEqual(cache.load(key), (False, None))
+        self.assertFalse(os.path.exists(cache._path(key)))
+
+if __name__ == '__main__':
+    unittest.main()
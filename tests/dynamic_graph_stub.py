@@ -0,0 +1,186 @@
+from __future__ import print_function
+
+## Stand-in for the dynamic-graph entity layer.
+#
+# It provides, in pure Python, the modules of dynamic-graph, sot-core,
+# dynamic_graph_bridge and agimus_sot.sot that are used when building a
+# graph of constraints. Entities are only recorded: nothing is computed.
+# This is enough to measure the cost of the Python side of
+# factory.Factory and to count the entities it creates.
+#
+# It is only meant for benchmark_factory.py. Call install() before
+# importing agimus_sot.
+
+import copy, sys, types
+
+class SignalBase(object):
+    def __init__ (self, entity, name):
+        self.entity = entity
+        self.shortName = name
+        self.name = entity.name + "." + name
+        self._value = None
+        self.plugged = None
+
+    @property
+    def value (self):
+        if self.plugged is not None: return self.plugged.value
+        return copy.copy (self._value)
+    @value.setter
+    def value (self, v):
+        # As SignalPtr::setConstant, setting a value unplugs the signal.
+        self._value = v
+        self.plugged = None
+
+    def __call__ (self, *args):
+        # Entity helpers such as Multiply_of_matrixHomo.sin(i)
+        if len(args) == 1 and isinstance(args[0], int):
+            return self.entity.signal(self.shortName + str(args[0]))
+        self.entity.commands.append ((self.shortName, args))
+
+    def isPlugged (self): return self.plugged is not None
+    def getPlugged (self): return self.plugged
+    def unplug (self): self.plugged = None
+    def recompute (self, t): pass
+
+class Entity(object):
+    entities = dict()
+
+    def __init__ (self, name):
+        object.__setattr__ (self, "name", name)
+        object.__setattr__ (self, "_signals", dict())
+        object.__setattr__ (self, "commands", list())
+        object.__setattr__ (self, "_signalNumber", 0)
+        Entity.entities[name] = self
+
+    def signal (self, name):
+        if name not in self._signals:
+            self._signals[name] = SignalBase (self, name)
+        return self._signals[name]
+
+    def hasSignal (self, name): return name in self._signals
+    def signals (self): return list(self._signals.values())
+    def setSignalNumber (self, n): object.__setattr__ (self, "_signalNumber", n)
+    def getSignalNumber (self): return self._signalNumber
+    def display (self): return self.name
+
+    def __getattr__ (self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.signal (name)
+
+class VerbosityLevel(object):
+    VERBOSITY_ALL = 0
+    VERBOSITY_NONE = 8
+
+class PeriodicCall(object):
+    def __init__ (self):
+        self.signals = []
+    def addSignal (self, name): self.signals.append(name)
+    def addDownsampledSignal (self, name, n): self.signals.append(name)
+    def rmSignal (self, name):
+        if name in self.signals: self.signals.remove(name)
+
+class RosQueuedSubscribe(Entity):
+    def __init__ (self, name):
+        super(RosQueuedSubscribe, self).__init__ (name)
+        object.__setattr__ (self, "_queues", dict())
+    def add (self, type, name, topic): self._queues[name] = 0
+    def list (self): return list(self._queues.keys())
+    def queueSize (self, name): return self._queues[name]
+    def clearQueue (self, name): self._queues[name] = 0
+    def readQueue (self, t): pass
+
+def deleteEntity (name):
+    return name in Entity.entities
+
+def plug (signalOut, signalIn):
+    signalIn.plugged = signalOut
+
+def setGain (gain, values): pass
+
+class _EntityModule(types.ModuleType):
+    """ A module whose unknown attributes are Entity classes. """
+    def __getattr__ (self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        cls = type(name, (Entity,), {})
+        setattr (self, name, cls)
+        return cls
+
+_entityModules = (
+        "dynamic_graph.sot",
+        "dynamic_graph.sot.core",
+        "dynamic_graph.sot.core.sot",
+        "dynamic_graph.sot.core.switch",
+        "dynamic_graph.sot.core.operator",
+        "dynamic_graph.sot.core.event",
+        "dynamic_graph.sot.core.latch",
+        "dynamic_graph.sot.core.task",
+        "dynamic_graph.sot.core.gain_adaptive",
+        "dynamic_graph.sot.core.feature_pose",
+        "dynamic_graph.sot.core.feature_posture",
+        "dynamic_graph.sot.core.integrator_euler",
+        "dynamic_graph.sot.core.meta_tasks",
+        "dynamic_graph.sot.core.meta_tasks_kine",
+        "dynamic_graph.sot.core.timer",
+        "dynamic_graph.sot.tools",
+        "dynamic_graph.sot.tools.quaternion",
+        "dynamic_graph.tracer_real_time",
+        "dynamic_graph.ros",
+        "dynamic_graph.ros.ros_queued_subscribe",
+        "dynamic_graph.ros.ros_tf_listener",
+        )
+
+## Names of the entities defined in agimus_sot.sot.wrap
+agimusEntities = [ "Time", "ContactAdmittance", "ControlProfiler", "ControlSnapshot", "SafeGainAdaptive",
+        "HolonomicConstraint", "ObjectLocalization", ]
+
+def install ():
+    """ Register the stand-in modules in sys.modules. """
+    if "dynamic_graph" in sys.modules:
+        return
+    dg = _EntityModule ("dynamic_graph")
+    dg.plug = plug
+    sys.modules["dynamic_graph"] = dg
+    entity = types.ModuleType ("dynamic_graph.entity")
+    entity.Entity = Entity
+    entity.VerbosityLevel = VerbosityLevel
+    sys.modules["dynamic_graph.entity"] = entity
+    signal_base = types.ModuleType ("dynamic_graph.signal_base")
+    signal_base.SignalBase = SignalBase
+    sys.modules["dynamic_graph.signal_base"] = signal_base
+    for name in _entityModules:
+        sys.modules[name] = _EntityModule (name)
+    sys.modules["dynamic_graph.sot.core.meta_tasks"].setGain = setGain
+    sys.modules["dynamic_graph.ros.ros_queued_subscribe"].RosQueuedSubscribe = RosQueuedSubscribe
+    wrap = _EntityModule ("agimus_sot.sot.wrap")
+    wrap.__all__ = list(agimusEntities) + [ "deleteEntity", ]
+    for n in agimusEntities:
+        getattr (wrap, n)
+    wrap.deleteEntity = deleteEntity
+    sys.modules["agimus_sot.sot.wrap"] = wrap
+
+## A robot whose entities are stand-ins.
+#
+# \param model a pinocchio.Model
+class Robot(object):
+    def __init__ (self, name, model, timeStep = 0.001):
+        self.name = name
+        self.timeStep = timeStep
+        self.camera_frame = "camera_frame"
+        self.dynamic = Entity (name + "_dynamic")
+        object.__setattr__ (self.dynamic, "model", model)
+        object.__setattr__ (self.dynamic, "getDimension", lambda: model.nv)
+        object.__setattr__ (self.dynamic, "createOpPoint",
+                lambda sig, frame: self.dynamic.signal(sig))
+        self.device = Entity (name + "_device")
+        object.__setattr__ (self.device, "after", PeriodicCall())
+        object.__setattr__ (self.device, "getTimeStep", lambda: timeStep)
+        self.device.control.time = 0
+        import numpy as np
+        self.dynamic.position.value = np.zeros(model.nq)
+        self.device.state.value = np.zeros(model.nq)
+
+    def getActuatedJoints (self): return range(6, self.dynamic.getDimension())
+
+    def getTimeStep (self): return self.timeStep
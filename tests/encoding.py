@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import unittest
+from agimus_sot.encoding import encode, decode
+
+class TestAgimusEncoding(unittest.TestCase):
+
+    values = [ None, True, False, 0, -3, 1.5, 1e-12, "", "transition",
+            [], [ 1, "a", None ], { "a": [ 1., 2. ], "b": { "c": False } },
+            [ [ True, 12, "" ], [ False, -1, "no pre action" ] ], ]
+
+    def test_round_trip(self):
+        for v in self.values:
+            self.assertEqual(decode(encode(v)), v)
+        # Tuples are decoded as lists.
+        self.assertEqual(decode(encode((1, (2, 3)))), [1, [2, 3]])
+
+    def test_unicode(self):
+        for v in [ u"hé", { u"état": [ u"→", u"a\nb\"c'" ] } ]:
+            self.assertEqual(decode(encode(v)), v)
+            self.assertEqual(decode(repr(encode(v))), v)
+        # The encoding is ASCII, so that it can be sent by service run_command.
+        encode(u"é").encode("ascii")
+
+    ## Service run_command returns the representation of the value.
+    def test_representation(self):
+        for v in self.values:
+            self.assertEqual(decode(repr(encode(v))), v)
+        # With Python 2, the representation of a unicode string.
+        self.assertEqual(decode("u'[1,\"a\"]'"), [1, "a"])
+
+    def test_no_evaluation(self):
+        # Only JSON and string literals are accepted.
+        self.assertRaises(ValueError, decode, "__import__('os').getcwd()")
+        self.assertRaises(ValueError, decode, "'a' + 'b'")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+from __future__ import print_function
+
+import pickle, unittest
+from agimus_sot.graph_plan import GraphPlanner, makePlan
+
+def makePlanner():
+    grippers = [ "robot/left", "robot/right" ]
+    return GraphPlanner (grippers, [ "box", "cup" ],
+            [ [ "box/handle1", "box/handle2" ], [ "cup/handle" ] ],
+            [ [ "box/bottom" ], [ "cup/bottom" ] ], [ "table/top" ],
+            { g: True for g in grippers }, { g: "robot" for g in grippers })
+
+class TestAgimusGraphPlan(unittest.TestCase):
+
+    def test_plan(self):
+        plan = makePlan (makePlanner())
+        self.assertGreater(len(plan["states"]), 1)
+        self.assertGreater(len(plan["transitions"]), 0)
+        # No state is planned twice.
+        grasps = [ s["grasps"] for s in plan["states"] ]
+        self.assertEqual(len(grasps), len(set(grasps)))
+        for t in plan["transitions"]:
+            self.assertIn(t["from"], grasps)
+            self.assertIn(t["to"], grasps)
+            for n, a, tasks, done in t["actions"]:
+                self.assertEqual(a, "sot_" + n)
+                self.assertEqual(tasks[0], ("hp",))
+                self.assertEqual(tasks[-1], ("lp",))
+            for n, successors in t["successors"].items():
+                for s in successors:
+                    self.assertIn(s, [ a[0] for a in t["actions"] ])
+
+    ## The plan only contains plain Python objects.
+    def test_pickle(self):
+        plan = makePlan (makePlanner())
+        self.assertEqual(pickle.loads (pickle.dumps (plan)), plan)
+
+    ## makePlan gives the plans of GraphPlanner.planState and planTransition.
+    def test_same_plan(self):
+        plan = makePlan (makePlanner())
+        self.assertEqual(plan, makePlan (makePlanner()))
+        planner = makePlanner()
+        for s in plan["states"]:
+            self.assertEqual(planner.planState (s["grasps"], s["priority"]), s)
+        for t in plan["transitions"]:
+            self.assertEqual(planner.planTransition (t["from"], t["to"], t["ig"]), t)
+
+    def test_description(self):
+        planner = makePlanner()
+        other = GraphPlanner (*planner.description())
+        self.assertEqual(makePlan (planner), makePlan (other))
+
+if __name__ == '__main__':
+    unittest.main()
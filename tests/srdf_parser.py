@@ -1,7 +1,7 @@
 from __future__ import print_function
 
 import unittest
-from agimus_sot.srdf_parser import parse_srdf_string
+from agimus_sot.srdf_parser import parse_srdf_string, parse_srdf
 
 class TestAgimusParser(unittest.TestCase):
   def test_parser(self):
@@ -72,5 +72,95 @@ class TestAgimusParser(unittest.TestCase):
         self.assertIn("points", c)
         self.assertIn("shapes", c)
 
+    bottom = content["contacts"]["bottom_surface"]
+    self.assertEqual(bottom["points"].shape, (4, 3))
+    self.assertEqual(len(bottom["shapes"]), 1)
+    self.assertEqual(bottom["shapes"][0].tolist(), [0, 1, 2, 3])
+    self.assertEqual(bottom["shapes"], [[0, 1, 2, 3]])
+    self.assertNotEqual(bottom["shapes"], [[0, 1, 3, 2]])
+    self.assertNotEqual(bottom["shapes"], [[0, 1, 2]])
+
+  def test_attach_contact(self):
+    import numpy as np
+    import pinocchio
+    from agimus_sot.srdf_parser import attach_to_link, ContactShapes
+    model = pinocchio.Model()
+    M = pinocchio.SE3.Random()
+    model.addFrame (pinocchio.Frame ("link_a", 0, 0, pinocchio.SE3.Identity(), pinocchio.FrameType.BODY))
+    model.addFrame (pinocchio.Frame ("link_b", 0, 0, M, pinocchio.FrameType.BODY))
+    points = np.array ([ [0., 0., 0.], [1., 2., 3.] ])
+    contact = { "link": "link_a", "points": points,
+            "shapes": ContactShapes.fromList ([[0, 1]]) }
+    attach_to_link (model, "link_b", contact = contact)
+    self.assertEqual(contact["link"], "link_b")
+    for p, q in zip (points, contact["points"]):
+        np.testing.assert_almost_equal (M.act (q), p)
+
+  def test_attach_all(self):
+    import copy
+    import numpy as np
+    import pinocchio
+    from agimus_sot.srdf_parser import attach_to_link, attach_all_to_link
+    model = pinocchio.Model()
+    for name in [ "link_a", "link_b", "link_c" ]:
+        model.addFrame (pinocchio.Frame (name, 0, 0, pinocchio.SE3.Random(), pinocchio.FrameType.BODY))
+    def pose ():
+        return tuple (pinocchio.SE3ToXYZQUAT (pinocchio.SE3.Random()))
+    content = {
+        "grippers": { "g": { "link": "link_a", "position": pose() } },
+        "handles": { "h" + str(i): { "link": "link_" + "abc"[i%3], "position": pose() }
+            for i in range(6) },
+        "contacts": { "c" + str(i): { "link": "link_" + "abc"[i%3],
+            "points": np.random.rand (i+1, 3) } for i in range(4) },
+        }
+    expected = copy.deepcopy (content)
+    for kind in [ "gripper", "handle", "contact" ]:
+        for srdf in expected[kind+"s"].values():
+            attach_to_link (model, "link_b", **{ kind: srdf })
+    attach_all_to_link (model, "link_b", content)
+    for kind in [ "grippers", "handles", "contacts" ]:
+        for n, srdf in content[kind].items():
+            self.assertEqual(srdf["link"], "link_b")
+            if "position" in srdf:
+                self.assertTrue(pinocchio.XYZQUATToSE3 (srdf["position"]).isApprox (
+                    pinocchio.XYZQUATToSE3 (expected[kind][n]["position"])))
+            if "points" in srdf:
+                np.testing.assert_almost_equal (srdf["points"], expected[kind][n]["points"])
+
+  def test_cache(self):
+    import os, shutil, tempfile
+    from agimus_sot import srdf_parser
+    srdf = """<robot name="box">
+      <handle name="handle" clearance="0.05">
+        <position> 0 0 0.1  1 0 0 0 </position>
+        <link name="base_link"/>
+      </handle>
+    </robot>
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(directory, "box.srdf")
+        with open(fn, "w") as f:
+            f.write(srdf)
+        # The cache is disabled unless a directory is given.
+        if not os.environ.get("AGIMUS_SOT_SRDF_CACHE"):
+            self.assertEqual(srdf_parser.cacheDirectory, "")
+            parse_srdf (fn, prefix = "box")
+            self.assertIsNone(srdf_parser.srdfCache)
+        cacheDir = os.path.join(directory, "cache")
+        content = parse_srdf (fn, prefix = "box", cacheDir = cacheDir)
+        self.assertEqual(content, parse_srdf_string (srdf, prefix = "box"))
+        self.assertEqual(content, parse_srdf (fn, prefix = "box", cacheDir = cacheDir))
+        self.assertEqual(srdf_parser.srdfCache.hits, 1)
+
+        # Modifying the file invalidates the cached value.
+        with open(fn, "w") as f:
+            f.write(srdf.replace("0.05", "0.1"))
+        content = parse_srdf (fn, prefix = "box", cacheDir = cacheDir)
+        self.assertEqual(content["handles"]["box/handle"]["clearance"], 0.1)
+        self.assertEqual(srdf_parser.srdfCache.hits, 1)
+    finally:
+        shutil.rmtree(directory)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,81 @@
+from __future__ import print_function
+
+import threading, unittest
+from agimus_sot.timing import PhaseTimer
+
+class TestAgimusTiming(unittest.TestCase):
+
+    def test_nesting(self):
+        timer = PhaseTimer()
+        with timer.phase ("generate", states = 2) as p:
+            with timer.phase ("plan"):
+                pass
+            for i in range(3):
+                with timer.phase ("transitions") as t:
+                    t["counts"]["actions"] = i
+            p["counts"]["states"] += 1
+        self.assertEqual([ p["name"] for p in timer.phases ],
+                [ "generate", "generate/plan" ] + [ "generate/transitions", ] * 3)
+        generate = timer.phases[0]
+        self.assertEqual(generate["counts"]["states"], 3)
+        for p in timer.phases:
+            self.assertEqual(p["duration"], p["end"] - p["start"])
+            self.assertGreaterEqual(p["start"], generate["start"])
+            self.assertLessEqual(p["end"], generate["end"])
+
+    def test_report(self):
+        timer = PhaseTimer()
+        for i in range(2):
+            with timer.phase ("chunk", lines = 10):
+                pass
+        timer.extend ([ { "name": "parse_srdf", "start": 0., "end": 1.,
+            "duration": 1., "counts": { "files": 1 } }, ], "sot/")
+        report = timer.report()
+        self.assertEqual(report["phases"][0]["name"], "sot/parse_srdf")
+        summary = report["summary"]
+        self.assertEqual(summary["chunk"]["calls"], 2)
+        self.assertEqual(summary["chunk"]["counts"]["lines"], 20)
+        self.assertEqual(summary["sot/parse_srdf"]["duration"], 1.)
+
+    ## A phase that raises is still closed.
+    def test_exception(self):
+        timer = PhaseTimer()
+        def fail():
+            with timer.phase ("fail"):
+                raise RuntimeError ("failure")
+        self.assertRaises(RuntimeError, fail)
+        with timer.phase ("next"):
+            pass
+        self.assertIn("duration", timer.phases[0])
+        self.assertEqual(timer.phases[1]["name"], "next")
+
+    def test_threads(self):
+        timer = PhaseTimer()
+        barrier = threading.Event()
+        def run(i):
+            with timer.phase ("thread" + str(i)):
+                barrier.wait (1.)
+                with timer.phase ("inner"):
+                    pass
+        threads = [ threading.Thread (target = run, args = (i,)) for i in range(4) ]
+        for t in threads: t.start()
+        barrier.set()
+        for t in threads: t.join()
+        # Each thread nests its own phases.
+        self.assertEqual(sorted ([ p["name"] for p in timer.phases ]),
+                sorted ([ n for i in range(4)
+                    for n in ("thread" + str(i), "thread" + str(i) + "/inner") ]))
+
+    def test_stop(self):
+        timer = PhaseTimer()
+        with timer.phase ("startup"):
+            pass
+        timer.stop()
+        with timer.phase ("publishState") as p:
+            pass
+        # The phase is still timed but not recorded.
+        self.assertIn("duration", p)
+        self.assertEqual([ p["name"] for p in timer.phases ], [ "startup", ])
+
+if __name__ == '__main__':
+    unittest.main()
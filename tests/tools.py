@@ -3,7 +3,8 @@ from __future__ import print_function
 import unittest
 import numpy as np
 from agimus_sot.tools import entityExists, assertEntityDoesNotExist, matrixHomoProduct, \
-        matrixHomoInverse, entityIfMatrixHomo, plugMatrixHomo, se3ToTuple
+        matrixHomoInverse, entityIfMatrixHomo, plugMatrixHomo, se3ToTuple, \
+        HomoExpressionCache, Input, PlacementCache
 
 class TestAgimusTools(unittest.TestCase):
 
@@ -48,5 +49,44 @@ class TestAgimusTools(unittest.TestCase):
         if_.out.recompute(1)
         np.testing.assert_almost_equal(if_.out.value, M0.homogeneous)
 
+    def test_homo_expression_cache(self):
+        import pinocchio
+        M0 = pinocchio.SE3.Random()
+        cache = HomoExpressionCache()
+        inv = cache.inverse("test_hec_inv", Input("a"))
+        self.assertIs(inv, cache.inverse("test_hec_inv_2", Input("a")))
+        self.assertFalse(entityExists("test_hec_inv_2"))
+
+        a = cache.product("test_hec_a", inv.sout, Input("b"), M0)
+        self.assertIs(a, cache.product("test_hec_a_2", inv.sout, Input("b"), M0))
+        b = cache.product("test_hec_b", inv.sout, Input("c"), M0)
+        self.assertIsNot(a, b)
+
+        if_ = cache.ifEntity("test_hec_if", Input("d"), a.sout, M0)
+        self.assertIs(if_, cache.ifEntity("test_hec_if_2", Input("d"), a.sout, M0))
+        self.assertEqual(cache.stats(), { "created": 4, "reused": 3 })
+
+    def test_placement_cache(self):
+        import pinocchio
+        class Frame(object):
+            def __init__ (self, key, position):
+                self.key, self.link, self.position = key, "link", position
+                self.lMf = cache.pose (position)
+        cache = PlacementCache()
+        a = Frame ("a", (0.1, 0, 0, 0, 0, 0, 1))
+        b = Frame ("b", (0, 0.2, 0, 0, 0, 0, 1))
+        self.assertIs(a.lMf, cache.pose ([0.1, 0, 0, 0, 0, 0, 1]))
+        aMb = cache.relative (a, b)
+        self.assertIs(aMb, cache.relative (a, b))
+        np.testing.assert_almost_equal(aMb.homogeneous,
+                (a.lMf * b.lMf.inverse()).homogeneous)
+        np.testing.assert_almost_equal(cache.relative (a, b, a).homogeneous,
+                (a.lMf * b.lMf.inverse() * a.lMf).homogeneous)
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 5)
+        self.assertIs(cache.homogeneous (a), cache.homogeneous (a))
+        np.testing.assert_almost_equal(cache.homogeneous (b), b.lMf.homogeneous)
+
 if __name__ == '__main__':
     unittest.main()